@@ -0,0 +1,104 @@
+"""
+Runs DE and CMA-ES on the same drag objective with the same evaluation budget and compares how many fitness
+evaluations each needs to reach a given drag coefficient.
+
+By default the built-in panel solver stands in for XFOIL (opt(..., solver='panel')), so the benchmark runs anywhere;
+pass --xfoil to use an XFOIL executable instead, or --xfoil fake for the deterministic fake XFOIL (fake_xfoil.py).
+
+Example:
+    python -m benchmarks.compare_optimizers --budget 2400 --seeds 0 1 2 --json optimizers.json
+"""
+
+from pyoptfoil.algorithms.base import create_optimizer
+from pyoptfoil.opt import opt
+from .run_benchmarks import fake_xfoil_executable
+import numpy as np
+import argparse
+import contextlib
+import io
+import json
+import shutil
+import tempfile
+import time
+
+C_BOUNDS = {'gamma_le': (0.0001, 0.5), 'x_c': [0.3, 0.6], 'y_c': [0.00, 0.1], 'k_c': [-1, -0.01], 'z_te': [0.0, 0.00],
+            'alpha_te': [0.0001, 0.5]}
+T_BOUNDS = {'r_le': [-0.04, -0.001], 'x_t': [0.15, 0.4], 'y_t': [0.1, 0.2], 'k_t': [-1, 0.1], 'dz_te': [0.0, 0.001],
+            'beta_te': [0.001, 0.3]}
+BOUNDS = {**T_BOUNDS, **C_BOUNDS}
+
+
+def evaluations_to(history, target_cd):
+    # number of evaluations after which the best drag coefficient first reached target_cd
+    best = np.maximum.accumulate(history.fitnesses)
+    reached = np.flatnonzero(-best <= target_cd)
+    return int(reached[0]) + 1 if len(reached) else None
+
+
+def run(name, options, seed, args):
+    optimizer = create_optimizer(name, BOUNDS, seed=seed, param_method='BP3333', **options)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        opt(optimizer, args.cl, args.re, 0, (-1, 5, 0.5), xfoil_path=args.xfoil or 'xfoil',
+            solver='xfoil' if args.xfoil else 'panel', n_workers=args.workers)
+    return optimizer, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--budget', type=int, default=2400, help='fitness evaluations per run')
+    parser.add_argument('--seeds', type=int, nargs='+', default=[0, 1, 2])
+    parser.add_argument('--de-pop', type=int, default=40)
+    parser.add_argument('--cmaes-pop', type=int, default=12)
+    parser.add_argument('--cl', type=float, default=0.6)
+    parser.add_argument('--re', type=float, default=5e5)
+    parser.add_argument('--xfoil', default=None, help="XFOIL executable, or 'fake' (panel solver stand-in if omitted)")
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--target-cd', type=float, default=None,
+                        help='drag coefficient to reach (defaults to 1%% above the worst final result)')
+    parser.add_argument('--json', default=None, help='path of a JSON file for the results')
+    args = parser.parse_args()
+
+    workdir = None
+    if args.xfoil == 'fake':
+        workdir = tempfile.mkdtemp(prefix='pyoptfoil_bench_')
+        args.xfoil = fake_xfoil_executable(workdir)
+
+    results = []
+    for seed in args.seeds:
+        de, de_time = run('de', {'pop_size': args.de_pop, 'n_generations': args.budget // args.de_pop, 'f': 0.85,
+                                 'cr': 1}, seed, args)
+        cmaes, cmaes_time = run('cmaes', {'pop_size': args.cmaes_pop, 'n_generations': args.budget // args.cmaes_pop},
+                                seed, args)
+        results.append({'seed': seed, 'de': (de, de_time), 'cmaes': (cmaes, cmaes_time)})
+
+    target_cd = args.target_cd
+    if target_cd is None:
+        target_cd = 1.01 * max(-r[k][0].best_individual.fitness for r in results for k in ('de', 'cmaes'))
+
+    rows = []
+    for r in results:
+        for name in ('de', 'cmaes'):
+            optimizer, elapsed = r[name]
+            rows.append({'engine': name, 'seed': r['seed'], 'evaluations': optimizer.n_evaluations,
+                         'best_cd': float(-optimizer.best_individual.fitness),
+                         'evaluations_to_target': evaluations_to(optimizer.history, target_cd),
+                         'failures': optimizer.history.failure_counts(), 'time': elapsed})
+
+    print('target Cd: {:.5f}'.format(target_cd))
+    print('{:>6} {:>4} {:>11} {:>9} {:>11} {:>8}'.format('engine', 'seed', 'evaluations', 'best Cd', 'to target',
+                                                        'time'))
+    for row in rows:
+        print('{engine:>6} {seed:>4} {evaluations:>11} {best_cd:>9.5f} {to_target:>11} {time:>7.1f}s'.format(
+            to_target=str(row['evaluations_to_target']), **row))
+
+    if args.json is not None:
+        with open(args.json, 'w') as f:
+            json.dump({'target_cd': target_cd, 'runs': rows}, f, indent=2)
+
+    if workdir is not None:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+"""
+Deterministic stand-in for the XFOIL executable, for benchmarks and for running the optimisers on machines without
+XFOIL.
+
+It reads XFOIL commands from stdin and understands the subset sent by pyoptfoil.utils.xfoil_tools (load, pane, ppar,
+oper, v/re, m, iter, init, pacc, aseq, alfa, cl, plop, quit). Unrecognised commands are echoed back the way XFOIL
+reports them, so XfoilSession can use the same synchronisation marker. Polar files are written in XFOIL 6.99's layout,
+with alpha, CL, CD, CDp, CM and transition columns.
+
+The aerodynamics are a cheap closed-form model of the geometry in the loaded coordinate file:
+- lift from thin aerofoil theory, with a Prandtl-Glauert correction;
+- drag from a flat-plate skin friction form factor plus a quadratic drag bucket;
+- a stall incidence beyond which points fail to converge.
+Results depend only on the inputs, so repeated runs give identical polars. Shapes with crossing surfaces, or thicker
+than 30% of the chord, fail to converge at every point.
+
+Set FAKE_XFOIL_DELAY to a number of seconds to add that much solve time to every operating point.
+
+Usage (as the executable given to pyoptfoil): python fake_xfoil.py
+"""
+
+import numpy as np
+import os
+import sys
+import time
+
+HEADER = """
+       XFOIL         Version 6.99
+
+ Calculated polar for: {name}
+
+ 1 1 Reynolds number fixed          Mach number fixed
+
+ xtrf =   1.000 (top)        1.000 (bottom)
+ Mach = {m:7.3f}     Re = {re:9.3f} e 6     Ncrit =   9.000
+
+   alpha    CL        CD       CDp       CM     Top_Xtr  Bot_Xtr
+  ------ -------- --------- --------- -------- -------- --------
+"""
+
+
+class Geometry:
+    def __init__(self, path):
+        with open(path) as f:
+            self.name = f.readline().strip()
+        xy = np.loadtxt(path, skiprows=1, ndmin=2)
+
+        # coordinates run from the trailing edge over one surface to the leading edge and back over the other
+        le = int(np.argmin(xy[:, 0]))
+        x = np.linspace(0, 1, 201)
+        branches = (xy[le::-1], xy[le:])
+        surfaces = [np.interp(x, *branch[np.argsort(branch[:, 0], kind='stable')].T) for branch in branches]
+        lower, upper = sorted(surfaces, key=np.mean)
+
+        self.valid = bool(np.all(upper[1:-1] >= lower[1:-1])) and np.ptp(xy[:, 0]) > 0
+        self.thickness = float(np.max(upper - lower))
+        camber = (upper + lower) / 2
+        self.camber = float(camber[np.argmax(np.abs(camber))])
+        self.camber_position = float(x[np.argmax(np.abs(camber))])
+
+
+def operating_point(geometry, alpha, re, m):
+    # closed-form model of one converged point; returns None beyond the stall incidence
+    t, h = geometry.thickness, geometry.camber
+    beta = np.sqrt(1 - min(m, 0.9) ** 2)
+    alpha_l0 = -np.degrees(2 * h) * (1 + 0.8 * (geometry.camber_position - 0.4))
+    cl_alpha = 2 * np.pi * (1 + 0.77 * t) * 0.93 / beta
+
+    alpha_stall = 10 + 40 * t + 150 * abs(h)
+    if not geometry.valid or t > 0.3 or abs(alpha - alpha_l0) > alpha_stall:
+        return None
+
+    cl = cl_alpha * np.radians(alpha - alpha_l0)
+    cl -= 0.04 * np.sign(cl) * max(0.0, abs(alpha - alpha_l0) - 0.7 * alpha_stall) ** 2
+
+    cf = 0.074 * re ** -0.2
+    cd0 = 2 * cf * (1 + 2 * t + 60 * t ** 4)
+    cl_opt = 10 * h + 0.2
+    cd = cd0 + 0.006 * (cl - cl_opt) ** 2 / (1 + 5 * t) + 0.002 * max(0.0, abs(cl - cl_opt) - 0.6) ** 2
+    cdp = cd * min(0.9, 0.25 + 0.04 * abs(alpha))
+    cmm = -np.pi / 2 * h * (1 + 0.5 * geometry.camber_position) / beta
+    top_xtr = float(np.clip(0.55 - 0.06 * alpha, 0.01, 1.0))
+    bot_xtr = float(np.clip(0.65 + 0.06 * alpha, 0.01, 1.0))
+
+    return alpha, cl, cd, cdp, cmm, top_xtr, bot_xtr
+
+
+class FakeXfoil:
+    def __init__(self, stdin, stdout):
+        self.stdin = stdin
+        self.stdout = stdout
+        self.delay = float(os.environ.get('FAKE_XFOIL_DELAY', 0))
+        self.geometry = None
+        self.re = 0.0
+        self.m = 0.0
+        self.polar = None
+
+    def readline(self):
+        line = self.stdin.readline()
+        if not line:
+            raise EOFError
+        return line.strip()
+
+    def write(self, text):
+        self.stdout.write(text + '\n')
+        self.stdout.flush()
+
+    def solve(self, alpha):
+        if self.delay:
+            time.sleep(self.delay)
+        point = operating_point(self.geometry, alpha, self.re, self.m) if self.geometry is not None else None
+        if point is None:
+            self.write(' VISCAL:  Convergence failed')
+        elif self.polar is not None:
+            with open(self.polar, 'a') as f:
+                f.write('{:8.3f}{:9.4f}{:10.5f}{:10.5f}{:9.4f}{:9.4f}{:9.4f}\n'.format(*point))
+
+        return point
+
+    def target(self, cl):
+        # prescribed-Cl solve: the incidence is found by bisection on the model lift curve
+        lo, hi = -30.0, 30.0
+        for _ in range(60):
+            mid = (lo + hi) / 2
+            point = operating_point(self.geometry, mid, self.re, self.m) if self.geometry is not None else None
+            if point is None or point[1] > cl:
+                hi = mid
+            else:
+                lo = mid
+        point = operating_point(self.geometry, lo, self.re, self.m) if self.geometry is not None else None
+        if point is None or abs(point[1] - cl) > 1e-4:
+            self.write(' VISCAL:  Convergence failed')
+            return
+        self.solve(lo)
+
+    def toggle_polar(self):
+        if self.polar is not None:
+            self.polar = None
+            return
+
+        self.polar = self.readline()
+        self.readline()
+        if not os.path.exists(self.polar) or os.path.getsize(self.polar) == 0:
+            name = self.geometry.name if self.geometry is not None else ''
+            with open(self.polar, 'w') as f:
+                f.write(HEADER.format(name=name, m=self.m, re=self.re / 1e6))
+
+    def run(self):
+        while True:
+            command = self.readline().lower()
+
+            if command == 'quit':
+                return
+            elif command == 'load':
+                path = self.readline()
+                try:
+                    self.geometry = Geometry(path)
+                except (OSError, ValueError, IndexError):
+                    self.geometry = None
+                    self.write(' File OPEN error.  Nonexistent file:  ' + path)
+            elif command in ('v', 'visc', 're'):
+                self.re = float(self.readline())
+            elif command in ('m', 'mach'):
+                self.m = float(self.readline())
+            elif command in ('iter', 'n'):
+                self.readline()
+            elif command == 'pacc':
+                self.toggle_polar()
+            elif command == 'aseq':
+                start, stop, step = (float(self.readline()) for _ in range(3))
+                for alpha in np.arange(start, stop + step / 2, step):
+                    self.solve(round(float(alpha), 6))
+            elif command == 'alfa':
+                self.solve(float(self.readline()))
+            elif command == 'cl':
+                self.target(float(self.readline()))
+            elif command in ('', 'plop', 'g', 'pane', 'ppar', 'oper', 'init'):
+                pass
+            else:
+                self.write(' {} command not recognized.  Type a "?" for a list'.format(command.upper()[:4]))
+
+
+def main():
+    try:
+        FakeXfoil(sys.stdin, sys.stdout).run()
+    except EOFError:
+        pass
+
+
+if __name__ == '__main__':
+    main()
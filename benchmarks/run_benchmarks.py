@@ -0,0 +1,274 @@
+"""
+Times the geometry, DE operator, fit and XFOIL I/O paths of pyoptfoil and writes the results as JSON, optionally
+comparing them with an earlier results file to flag regressions.
+
+The XFOIL cases run against the deterministic fake XFOIL in this directory (fake_xfoil.py), so the suite needs no XFOIL
+binary; pass --xfoil to time a real executable instead.
+
+Examples:
+    python -m benchmarks.run_benchmarks --json baseline.json
+    python -m benchmarks.run_benchmarks --json new.json --compare baseline.json --tolerance 0.15
+    python -m benchmarks.run_benchmarks --filter xfoil --repeats 10
+"""
+
+from pyoptfoil.aerofoil import Aerofoil
+from pyoptfoil.algorithms.base import sample_feasible
+from pyoptfoil.algorithms.de import DE
+from pyoptfoil.fit import fit
+from pyoptfoil.parameterizations.bezier_parsec import BP3333, BP3333Batch
+from pyoptfoil.utils.xfoil_tools import write_dat, run_xfoil, run_xfoil_sweeps, read_out, XfoilSession
+import numpy as np
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+C_BOUNDS = {'gamma_le': (0.0001, 0.5), 'x_c': [0.3, 0.6], 'y_c': [0.00, 0.1], 'k_c': [-1, -0.01], 'z_te': [0.0, 0.00],
+            'alpha_te': [0.0001, 0.5]}
+T_BOUNDS = {'r_le': [-0.04, -0.001], 'x_t': [0.15, 0.4], 'y_t': [0.05, 0.2], 'k_t': [-1, 0.1], 'dz_te': [0.0, 0.001],
+            'beta_te': [0.001, 0.3]}
+BOUNDS = {**T_BOUNDS, **C_BOUNDS}
+
+# NACA 2412 coordinates, the target of the fit cases
+X_U = np.array([1., 0.95, 0.9, 0.8, 0.7, 0.6, 0.5, 0.4, 0.3, 0.25, 0.2, 0.15, 0.1, 0.075, 0.05, 0.025, 0.0125, 0])
+Y_U = np.array([0.0013, 0.0114, 0.0208, 0.0375, 0.0518, 0.0636, 0.0724, 0.078, 0.0788, 0.0767, 0.0726, 0.0661, 0.0563,
+                0.0496, 0.0413, 0.0299, 0.0215, 0.])
+X_L = np.array([0., 0.0125, 0.025, 0.05, 0.075, 0.1, 0.15, 0.2, 0.25, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 1.])
+Y_L = np.array([0., -0.0165, -0.0227, -0.0301, -0.0346, -0.0375, -0.041, -0.0423, -0.0422, -0.0412, -0.038, -0.0334,
+                -0.0276, -0.0214, -0.015, -0.0082, -0.0048, -0.0013])
+
+ALPHA_RANGE = (-2, 8, 0.5)
+CONDITIONS = ((ALPHA_RANGE, 5e5, 0), (ALPHA_RANGE, 1e6, 0), (ALPHA_RANGE, 2e6, 0.2))
+
+
+def fake_xfoil_executable(directory: str):
+
+    """
+    Writes a launcher for fake_xfoil.py (a shell script, or a batch file on Windows) to the given directory and returns
+    its path, which can be passed to pyoptfoil wherever an XFOIL executable path is expected.
+    """
+
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_xfoil.py')
+    if os.name == 'nt':
+        path = os.path.join(directory, 'fake_xfoil.bat')
+        with open(path, 'w') as f:
+            f.write('@"{}" "{}" %*\n'.format(sys.executable, script))
+    else:
+        path = os.path.join(directory, 'fake_xfoil')
+        with open(path, 'w') as f:
+            f.write('#!/bin/sh\nexec "{}" "{}" "$@"\n'.format(sys.executable, script))
+        os.chmod(path, 0o755)
+
+    return path
+
+
+def measure(func, repeats: int):
+    # wall-clock durations of repeated calls of func
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+
+    return durations
+
+
+def positions(n: int, seed: int = 0):
+    # feasible BP3333 parameter vectors, the same on every run
+    return sample_feasible(BOUNDS, 'BP3333', n, np.random.default_rng(seed))[0]
+
+
+def geometry_cases(args):
+    vectors = positions(200)
+    params = [dict(zip(BOUNDS, vector)) for vector in vectors]
+    shapes = [BP3333('bench', p) for p in params]
+    batch = positions(2000)
+
+    yield 'geometry.bp3333_construct', len(params), lambda: [BP3333('bench', p) for p in params]
+    yield 'geometry.bp3333_xy', len(shapes), lambda: [shape.xy() for shape in shapes]
+    # Aerofoil builds its coordinates on first use, so the full cost includes the coordinates() call
+    yield 'geometry.aerofoil', len(params), lambda: [Aerofoil('bench', 'BP3333', p).coordinates() for p in params]
+    yield 'geometry.aerofoil_construct', len(params), lambda: [Aerofoil('bench', 'BP3333', p) for p in params]
+    yield 'geometry.batch_xy', len(batch), lambda: BP3333Batch(batch, list(BOUNDS)).xy()
+
+
+def de_cases(args):
+    for pop_size in (20, 100):
+        optimizer = DE(BOUNDS, pop_size, 2, 'BP3333', 0.85, 0.9, seed=0)
+        optimizer.positions[:] = positions(pop_size)
+        optimizer.fitnesses[:] = -np.arange(pop_size, dtype=float)
+
+        def generation(optimizer=optimizer):
+            f, cr = optimizer.sample_parameters(np.arange(optimizer.pop_size))
+            v_trial = optimizer.crossover(optimizer.mutate(f), cr)
+            optimizer.selection(v_trial.copy(), None, optimizer.fitnesses - 1)
+
+        yield 'de.mutate.pop{}'.format(pop_size), 1, optimizer.mutate
+        yield 'de.crossover.pop{}'.format(pop_size), 1, lambda optimizer=optimizer: optimizer.crossover(
+            optimizer.positions)
+        yield 'de.generation.pop{}'.format(pop_size), 1, generation
+
+    # repair of the trials of one generation against the BP3333 constraints
+    for repair in ('bisect', 'resample'):
+        optimizer = DE(BOUNDS, 100, 2, 'BP3333', 0.85, 0.9, seed=0, repair=repair)
+        optimizer.positions[:] = positions(100)
+        optimizer.fitnesses[:] = -np.arange(100, dtype=float)
+        v_trial = optimizer.crossover(optimizer.mutate())
+
+        yield 'de.repair.{}.pop100'.format(repair), 1, lambda optimizer=optimizer, v_trial=v_trial: \
+            optimizer.repair_trials(v_trial)
+
+
+def fit_cases(args):
+    def run(vectorized):
+        optimizer = DE(BOUNDS, 20, 10, 'BP3333', 0.85, 0.9, seed=0)
+        with contextlib.redirect_stdout(io.StringIO()):
+            fit(optimizer, X_U, Y_U, X_L, Y_L, vectorized=vectorized)
+
+    yield 'fit.serial', 200, lambda: run(False)
+    yield 'fit.vectorized', 200, lambda: run(True)
+
+
+def xfoil_cases(args):
+    workdir = tempfile.mkdtemp(prefix='pyoptfoil_bench_')
+    xfoil_path = args.xfoil or fake_xfoil_executable(workdir)
+    aerofoil = Aerofoil('bench', 'BP3333', dict(zip(BOUNDS, positions(1)[0])))
+    datfile = os.path.join(workdir, 'xfoil.dat')
+    polar = os.path.join(workdir, 'xfoil.out')
+
+    def solve():
+        if os.path.exists(polar):
+            os.remove(polar)
+        run_xfoil(xfoil_path, 'xfoil.dat', ALPHA_RANGE, 5e5, 0, 100)
+
+    def loop():
+        write_dat(aerofoil, datfile)
+        solve()
+        read_out(polar)
+
+    def sweeps():
+        write_dat(aerofoil, datfile)
+        polar_paths = ['xfoil_{}.out'.format(i) for i in range(len(CONDITIONS))]
+        for path in polar_paths:
+            if os.path.exists(os.path.join(workdir, path)):
+                os.remove(os.path.join(workdir, path))
+        run_xfoil_sweeps(xfoil_path, 'xfoil.dat', [condition + (path,) for condition, path in
+                                                   zip(CONDITIONS, polar_paths)], 100)
+        for path in polar_paths:
+            read_out(os.path.join(workdir, path))
+
+    session = XfoilSession(xfoil_path)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        write_dat(aerofoil, datfile)
+        solve()
+        yield 'xfoil.write_dat', 1, lambda: write_dat(aerofoil, datfile)
+        yield 'xfoil.read_out', 1, lambda: read_out(polar)
+        yield 'xfoil.run_xfoil', 1, solve
+        yield 'xfoil.loop', 1, loop
+        yield 'xfoil.sweeps.{}_conditions'.format(len(CONDITIONS)), len(CONDITIONS), sweeps
+        session.run(aerofoil, ALPHA_RANGE, 5e5, 0, 100)
+        yield 'xfoil.session', 1, lambda: session.run(aerofoil, ALPHA_RANGE, 5e5, 0, 100)
+    finally:
+        session.close()
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+GROUPS = {'geometry': geometry_cases, 'de': de_cases, 'fit': fit_cases, 'xfoil': xfoil_cases}
+
+
+def metadata(args):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+
+    return {'commit': commit, 'python': platform.python_version(), 'numpy': np.__version__,
+            'platform': platform.platform(), 'processor': platform.processor(),
+            'xfoil': args.xfoil or 'fake', 'repeats': args.repeats,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def run(args):
+    results = {}
+    for group, cases in GROUPS.items():
+        if args.filter and not any(group.startswith(f) or f.startswith(group) for f in args.filter):
+            continue
+        for name, items, func in cases(args):
+            if args.filter and not any(name.startswith(f) for f in args.filter):
+                continue
+            func()  # warm-up
+            durations = measure(func, args.repeats)
+            results[name] = {'median': float(np.median(durations)), 'min': float(np.min(durations)),
+                             'mean': float(np.mean(durations)), 'std': float(np.std(durations)),
+                             'repeats': len(durations), 'items': items,
+                             'per_item': float(np.median(durations)) / items}
+            print('{:<32} {:>12.6f} s {:>12.3e} s/item'.format(name, results[name]['median'],
+                                                              results[name]['per_item']))
+
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float):
+
+    """
+    Prints the ratio of every median time to the baseline and returns the names of the cases which are slower than the
+    baseline by more than the tolerance (a fraction).
+    """
+
+    regressions = []
+    print('\n{:<32} {:>12} {:>12} {:>8}'.format('case', 'baseline', 'current', 'ratio'))
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result['median'] / baseline[name]['median']
+        flag = ''
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+            flag = ' slower'
+        elif ratio < 1 / (1 + tolerance):
+            flag = ' faster'
+        print('{:<32} {:>12.6f} {:>12.6f} {:>8.2f}{}'.format(name, baseline[name]['median'], result['median'], ratio,
+                                                             flag))
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeats', type=int, default=5, help='timed repeats of every case')
+    parser.add_argument('--filter', nargs='+', default=None, help='only run cases whose names start with these')
+    parser.add_argument('--xfoil', default=None, help='XFOIL executable (the fake XFOIL if omitted)')
+    parser.add_argument('--json', default=None, help='path of a JSON file for the results')
+    parser.add_argument('--compare', default=None, help='JSON results file to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='slowdown relative to the baseline reported as a regression')
+    args = parser.parse_args()
+
+    output = {'metadata': metadata(args), 'results': run(args)}
+
+    if args.json is not None:
+        with open(args.json, 'w') as f:
+            json.dump(output, f, indent=2)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(output['results'], baseline, args.tolerance)
+        if regressions:
+            print('\nRegressions: ' + ', '.join(regressions))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
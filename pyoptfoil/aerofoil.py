@@ -1,12 +1,28 @@
 from .parameterizations.bezier_parsec import BP3333
+from .parameterizations.bezier_curves import SPACINGS
+from .utils.timing import timings
+
+# parametrisation class of each param_method
+PARAMETERIZATIONS = {'BP3333': BP3333}
+
+# number of coordinate points per bezier curve (each surface is made of two curves)
+DEFAULT_POINTS = 100
 
 
 class Aerofoil:
-    def __init__(self, name: str, param_method: str, params: dict):
+    __slots__ = ('name', 'position', 'param_method', 'n_points', 'spacing', 'fitness', 'breakdown',
+                 '_parameterization', '_coordinates')
+
+    def __init__(self, name: str, param_method: str, params: dict, n_points: int = DEFAULT_POINTS,
+                 spacing: str = 'uniform'):
 
         """
         Class containing information about an individual aerofoil.
 
+        The parametrisation object and the coordinates are only computed when they are first used, and then cached, so
+        individuals which are never analysed (or only checked for constraint violations) cost little more than their
+        parameter dict.
+
         Parameters
         ----------
         name : str
@@ -16,21 +32,83 @@ class Aerofoil:
         params : dict
             Contains parameters defining location in search space. To be used with parametrisation method to determine
             aerofoil coordinates.
+        n_points : int
+            Number of coordinate points per bezier curve; each surface is made of two curves.
+        spacing : str
+            Spacing of the coordinate points along each curve: 'uniform' in the bezier parameter, or 'cosine', which
+            clusters them at the ends of the curves (including the leading and trailing edges).
         """
 
+        if param_method not in PARAMETERIZATIONS:
+            raise ValueError("Invalid parameterization method")
+        if spacing not in SPACINGS:
+            raise ValueError("Invalid spacing")
+
         self.name = name
         self.position = params
+        self.param_method = param_method
+        self.n_points = n_points
+        self.spacing = spacing
+        self.fitness = None
+        self.breakdown = None
+        self._parameterization = None
+        self._coordinates = None
 
-        if param_method is 'BP3333':
-            self.parameterization = BP3333(self.name, self.position)
-        else:
-            raise ValueError("Invalid parameterization method")
+    @property
+    def parameterization(self):
 
-        if not self.parameterization.constraint_violation:
-            x_u, y_u, x_l, y_l = self.parameterization.xy()
-            self.x_u = x_u
-            self.y_u = y_u
-            self.x_l = x_l
-            self.y_l = y_l
+        """Parametrisation object of the aerofoil (e.g. BP3333), built on first use."""
 
-        self.fitness = None
+        if self._parameterization is None:
+            with timings.stage('geometry'):
+                self._parameterization = PARAMETERIZATIONS[self.param_method](self.name, self.position)
+
+        return self._parameterization
+
+    def coordinates(self):
+
+        """
+        Returns the x_u, y_u, x_l, y_l coordinate arrays, computed on first use. Raises AttributeError if the aerofoil
+        violates the constraints of its parametrisation, as it then has no coordinates.
+        """
+
+        if self._coordinates is None:
+            if self.parameterization.constraint_violation:
+                raise AttributeError("Aerofoil {} violates the parametrisation constraints".format(self.name))
+            with timings.stage('geometry'):
+                self._coordinates = self.parameterization.xy(self.n_points, self.spacing)
+
+        return self._coordinates
+
+    # coordinate arrays, see coordinates
+    @property
+    def x_u(self):
+        return self.coordinates()[0]
+
+    @property
+    def y_u(self):
+        return self.coordinates()[1]
+
+    @property
+    def x_l(self):
+        return self.coordinates()[2]
+
+    @property
+    def y_l(self):
+        return self.coordinates()[3]
+
+    def resampled(self, n_points: int = DEFAULT_POINTS, spacing: str = 'uniform'):
+
+        """
+        Returns the aerofoil with coordinates at another resolution or spacing. The copy shares the parametrisation
+        object, and the aerofoil itself is returned if nothing changes.
+        """
+
+        if (n_points, spacing) == (self.n_points, self.spacing):
+            return self
+
+        aerofoil = Aerofoil(self.name, self.param_method, self.position, n_points, spacing)
+        aerofoil.fitness = self.fitness
+        aerofoil._parameterization = self._parameterization
+
+        return aerofoil
@@ -0,0 +1,181 @@
+from ..parameterizations.bezier_parsec import BP3333Batch
+from ..utils.timing import timings
+import numpy as np
+from scipy.stats import qmc
+
+OPTIMIZERS = {}
+
+# batched constraint checks of each parametrisation method, used to screen sampled parameter vectors
+BATCH_PARAMETERIZATIONS = {'BP3333': BP3333Batch}
+
+
+def register_optimizer(name: str):
+
+    """Class decorator which registers an optimizer engine under the given name (see create_optimizer)."""
+
+    def register(cls):
+        OPTIMIZERS[name] = cls
+        return cls
+
+    return register
+
+
+def create_optimizer(name: str, *args, **kwargs):
+
+    """Creates the optimizer engine registered under the given name (e.g. 'de' or 'cmaes') with the given arguments."""
+
+    from . import de, cmaes  # registers the built-in engines
+
+    if name not in OPTIMIZERS:
+        raise ValueError("Invalid optimizer")
+
+    return OPTIMIZERS[name](*args, **kwargs)
+
+
+def sample_feasible(bounds: dict, param_method: str, n: int, rng: np.random.Generator, sampler: str = 'random',
+                    block_size: int = None, max_blocks: int = 1000):
+
+    """
+    Draws parameter vectors which meet the constraints of the parametrisation. Candidates are drawn in blocks and each
+    whole block is screened as array operations; feasible candidates are kept in order until n have been found.
+
+    Parameters
+    ----------
+    bounds : dict
+        Lower and upper bounds of parameters in the search space.
+    param_method : str
+        Parametrisation method.
+    n : int
+        Number of parameter vectors.
+    rng : numpy Generator
+        Random number generator.
+    sampler : str
+        'random' (uniform), 'sobol' (scrambled Sobol sequence) or 'lhs' (Latin hypercube).
+    block_size : int
+        Number of candidates drawn at a time. Defaults to the next power of two of at least 4 * n.
+    max_blocks : int
+        Number of blocks drawn before giving up if n feasible candidates have still not been found.
+
+    Returns
+    -------
+    (n, n_params) array of parameter vectors and the fraction of candidates which were feasible.
+    """
+
+    if param_method not in BATCH_PARAMETERIZATIONS:
+        raise ValueError("Invalid parameterization method")
+    if sampler not in ('random', 'sobol', 'lhs'):
+        raise ValueError("Invalid sampler")
+
+    keys = list(bounds.keys())
+    bounds_arr = np.array(list(bounds.values()), dtype=float)
+    lb, ub = bounds_arr[:, 0], bounds_arr[:, 1]
+
+    if block_size is None:
+        block_size = 2 ** int(np.ceil(np.log2(max(4 * n, 64))))
+
+    if sampler == 'sobol':
+        engine = qmc.Sobol(len(keys), seed=rng)
+    elif sampler == 'lhs':
+        engine = qmc.LatinHypercube(len(keys), seed=rng)
+
+    accepted = []
+    n_accepted = 0
+    n_feasible = 0
+    n_drawn = 0
+    while n_accepted < n:
+        if n_drawn >= max_blocks * block_size:
+            raise RuntimeError("No feasible initial population found within the given bounds")
+
+        if sampler == 'random':
+            # same draws, in the same order, as one rng.uniform(lb, ub) call per candidate
+            block = rng.uniform(lb, ub, (block_size, len(keys)))
+        else:
+            block = lb + engine.random(block_size) * (ub - lb)
+
+        with timings.stage('initial_screening'):
+            feasible = block[BATCH_PARAMETERIZATIONS[param_method](block, keys).feasible]
+        accepted.append(feasible[:n - n_accepted])
+        n_accepted += len(accepted[-1])
+        n_feasible += len(feasible)
+        n_drawn += block_size
+
+    return np.vstack(accepted), n_feasible / n_drawn
+
+
+class Optimizer:
+
+    """
+    Base class of the optimizer engines accepted by opt and fit. An engine provides:
+
+    * bounds, param_method, pop_size and n_generations, as given to its constructor;
+    * optimize(func, evaluator=None, callback=None), which runs the whole optimisation with a fitness function of one
+      Aerofoil, evaluating batches of individuals with the evaluator;
+    * optimize_batch(func, callback=None) (optional), which runs it with a vectorised fitness function of an
+      (n, n_params) array of parameter vectors (used by fit in its vectorized mode);
+    * best_individual, best_fitness_history, best_row_history, n_evaluations and history (see
+      algorithms.history.History), kept up to date while the run goes on;
+    * positions, lb and ub, the parameter vectors of the current population and the bounds as arrays;
+    * stopping (see algorithms.stopping.EarlyStopping), checked with stopped at the end of every generation, and
+      stop_reason.
+
+    New engines are made available by name with register_optimizer.
+    """
+
+    def optimize(self, func, evaluator=None, callback=None):
+
+        """Runs the entire optimisation process with the given fitness function."""
+
+        raise NotImplementedError
+
+    @property
+    def best_individual_history(self):
+
+        """
+        Best individual of every generation, rebuilt from the history. Consecutive generations with the same best
+        individual share one object.
+        """
+
+        individuals = []
+        for i, row in enumerate(self.best_row_history):
+            if row is not None and i > 0 and row == self.best_row_history[i - 1]:
+                individuals.append(individuals[-1])
+            else:
+                individuals.append(None if row is None else self.history.individual(row))
+
+        return individuals
+
+    def stopped(self):
+
+        """
+        Checks the stopping rules of the optimizer at the end of a generation and stores the reason in stop_reason.
+        Returns True if the run should end there.
+        """
+
+        if getattr(self, 'stopping', None) is None:
+            return False
+
+        self.stop_reason = self.stopping.check(self)
+        if self.stop_reason is not None:
+            print('Stopping early: {}'.format(self.stop_reason))
+
+        return self.stop_reason is not None
+
+    def report(self, gen, n_replaced, callback=None, **info):
+
+        """
+        Builds the summary of a completed generation and passes it to the callback. When timings are enabled the
+        summary also contains the stage timings and events of the generation (see utils.timing).
+        """
+
+        if callback is None and not timings.enabled:
+            return
+
+        summary = {'generation': gen, 'best_fitness': float(self.best_individual.fitness), 'n_replaced': n_replaced,
+                   'n_evaluations': self.n_evaluations, **info}
+        if getattr(self, 'stop_reason', None) is not None:
+            summary['stop_reason'] = self.stop_reason
+        if timings.enabled:
+            summary = timings.lap(**summary)
+
+        if callback is not None:
+            callback(summary)
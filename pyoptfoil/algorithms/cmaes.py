@@ -0,0 +1,234 @@
+from ..aerofoil import Aerofoil
+from .base import Optimizer, register_optimizer, sample_feasible
+from .history import History
+from .stopping import EarlyStopping
+from ..utils.evaluators import SerialEvaluator
+from ..utils.timing import timings
+import numpy as np
+
+
+@register_optimizer('cmaes')
+class CMAES(Optimizer):
+    def __init__(self, bounds: dict, pop_size: int, n_generations: int, param_method: str, sigma: float = 0.2,
+                 seed: int = None, history_path: str = None, sampler: str = 'random', stopping: EarlyStopping = None):
+
+        """
+        CMA-ES (Covariance Matrix Adaptation Evolution Strategy) class, with weighted recombination of the best half of
+        each generation.
+
+        The search runs in coordinates normalised to the bounds; parameters with equal bounds are held fixed. All
+        candidates of a generation are sampled in one step and evaluated together, so their evaluation can be spread
+        across worker processes. Candidates outside the bounds are clipped to them, and the clipped vectors are used to
+        update the distribution. The mean is started from the best half of a feasible sample (see
+        base.sample_feasible), which is evaluated as generation 0.
+
+        Parameters
+        ----------
+        bounds : dict
+            Lower and upper bounds of parameters in the search space. View docstring of relevant parametrization class
+            for required keys.
+        pop_size : int
+            Number of candidates per generation (4 + 3 ln(n_params) is the usual choice for CMA-ES).
+        n_generations : int
+            Total number of generations in the optimisation process.
+        param_method : str
+            Parametrisation method.
+        sigma : float
+            Initial step size, as a fraction of the range of each parameter.
+        seed : int
+            Seed for the random number generator, for reproducible runs.
+        history_path : str
+            Directory to which the record of every evaluation is streamed as memory-mapped files. The record is held
+            in memory if None.
+        sampler : str
+            Sampling of generation 0: 'random' (uniform), 'sobol' (scrambled Sobol sequence) or 'lhs' (Latin
+            hypercube).
+        stopping : EarlyStopping
+            Stopping rules checked at the end of every generation (see algorithms.stopping). The run always lasts
+            n_generations if None.
+        """
+
+        bounds_arr = np.array(list(bounds.values()), dtype=float)
+        self.lb = bounds_arr[:, 0]
+        self.ub = bounds_arr[:, 1]
+        self.active = self.ub > self.lb
+        n = int(self.active.sum())
+
+        self.bounds = bounds
+        self.pop_size = pop_size
+        self.n_generations = n_generations
+        self.param_method = param_method
+        self.sigma = sigma
+        self.rng = np.random.default_rng(seed)
+        self.history_path = history_path
+        self.sampler = sampler
+        self.acceptance_rate = None
+        self.stopping = stopping
+        self.stop_reason = None
+
+        # strategy parameters (Hansen, The CMA Evolution Strategy: A Tutorial)
+        mu = self.pop_size // 2
+        weights = np.log(mu + 0.5) - np.log(np.arange(1, mu + 1))
+        self.weights = weights / weights.sum()
+        self.mueff = 1 / np.sum(self.weights ** 2)
+        self.cc = (4 + self.mueff / n) / (n + 4 + 2 * self.mueff / n)
+        self.cs = (self.mueff + 2) / (n + self.mueff + 5)
+        self.c1 = 2 / ((n + 1.3) ** 2 + self.mueff)
+        self.cmu = min(1 - self.c1, 2 * (self.mueff - 2 + 1 / self.mueff) / ((n + 2) ** 2 + self.mueff))
+        self.damps = 1 + 2 * max(0, np.sqrt((self.mueff - 1) / (n + 1)) - 1) + self.cs
+        self.chi_n = np.sqrt(n) * (1 - 1 / (4 * n) + 1 / (21 * n ** 2))
+
+        # distribution state, in normalised coordinates of the active parameters
+        self.mean = None
+        self.c = np.eye(n)
+        self.pc = np.zeros(n)
+        self.ps = np.zeros(n)
+
+        self.best_individual = None
+        self.population = []
+        self.positions = np.empty((self.pop_size, len(bounds)))
+        self.fitnesses = np.full(self.pop_size, -np.inf)
+        self.best_fitness_history = [None]
+        self.best_row_history = [None]
+        self.best_row = None
+        self.history = None
+        self.n_evaluations = 0
+
+    def ask(self):
+
+        """
+        Samples the candidates of the next generation. Returns the parameter vectors, clipped to the bounds, and their
+        normalised active coordinates.
+        """
+
+        eigenvalues, b = np.linalg.eigh(self.c)
+        d = np.sqrt(np.maximum(eigenvalues, 1e-20))
+
+        z = self.rng.standard_normal((self.pop_size, len(d)))
+        y = np.clip(self.mean + self.sigma * (z * d) @ b.T, 0, 1)
+
+        positions = np.tile(self.lb, (self.pop_size, 1))
+        positions[:, self.active] = self.lb[self.active] + y * (self.ub - self.lb)[self.active]
+
+        return positions, y
+
+    def tell(self, y: np.ndarray, fitnesses: np.ndarray, gen: int):
+
+        """Updates the mean, evolution paths, covariance matrix and step size with an evaluated generation."""
+
+        n = len(self.mean)
+        order = np.argsort(-fitnesses, kind='stable')
+        selected = y[order[:len(self.weights)]]
+
+        eigenvalues, b = np.linalg.eigh(self.c)
+        inv_sqrt_c = b @ np.diag(1 / np.sqrt(np.maximum(eigenvalues, 1e-20))) @ b.T
+
+        old_mean = self.mean
+        self.mean = self.weights @ selected
+        step = (self.mean - old_mean) / self.sigma
+
+        self.ps = (1 - self.cs) * self.ps + np.sqrt(self.cs * (2 - self.cs) * self.mueff) * inv_sqrt_c @ step
+        hsig = (np.linalg.norm(self.ps) / np.sqrt(1 - (1 - self.cs) ** (2 * gen)) / self.chi_n) < 1.4 + 2 / (n + 1)
+        self.pc = (1 - self.cc) * self.pc + hsig * np.sqrt(self.cc * (2 - self.cc) * self.mueff) * step
+
+        artmp = (selected - old_mean) / self.sigma
+        self.c = ((1 - self.c1 - self.cmu) * self.c
+                  + self.c1 * (np.outer(self.pc, self.pc) + (1 - hsig) * self.cc * (2 - self.cc) * self.c)
+                  + self.cmu * (artmp.T * self.weights) @ artmp)
+        self.c = (self.c + self.c.T) / 2
+
+        self.sigma *= np.exp((self.cs / self.damps) * (np.linalg.norm(self.ps) / self.chi_n - 1))
+
+    def _record(self, positions, fitnesses, gen):
+        # records a generation in the history and keeps the best individual up to date
+        self.positions[:] = positions
+        self.fitnesses[:] = fitnesses
+        self.n_evaluations += len(fitnesses)
+
+        rows = self.history.append(positions, fitnesses, gen)
+        best_idx = np.argmax(fitnesses)
+        if self.best_individual is None or fitnesses[best_idx] > self.best_individual.fitness:
+            self.best_row = rows[best_idx]
+            self.best_individual = self.history.individual(self.best_row)
+
+        if gen == 0:
+            self.best_fitness_history[0] = self.best_individual.fitness
+            self.best_row_history[0] = self.best_row
+        else:
+            self.best_fitness_history.append(self.best_individual.fitness)
+            self.best_row_history.append(self.best_row)
+        self.history.flush()
+
+    def _run(self, evaluate, callback):
+        # evaluate is called with the parameter vectors of a generation and returns their fitnesses
+        self.history = History(list(self.bounds.keys()), self.param_method, self.pop_size * self.n_generations,
+                               self.history_path)
+        if self.stopping is not None:
+            self.stopping.start()
+
+        positions, self.acceptance_rate = sample_feasible(self.bounds, self.param_method, self.pop_size, self.rng,
+                                                          self.sampler)
+        print('Evaluating Gen 0')
+        fitnesses = np.asarray(evaluate(positions), dtype=float)
+        self._record(positions, fitnesses, 0)
+
+        # the distribution starts at the weighted mean of the best half of the initial sample
+        y = ((positions - self.lb) / np.where(self.active, self.ub - self.lb, 1))[:, self.active]
+        order = np.argsort(-fitnesses, kind='stable')
+        self.mean = self.weights @ y[order[:len(self.weights)]]
+        self.report(0, self.pop_size, callback, sigma=self.sigma)
+
+        for gen in range(1, self.n_generations):
+            print('Evaluating Gen {}'.format(gen))
+
+            positions, y = self.ask()
+            fitnesses = np.asarray(evaluate(positions), dtype=float)
+            self._record(positions, fitnesses, gen)
+            self.tell(y, fitnesses, gen)
+
+            stop = self.stopped()
+            self.report(gen, self.pop_size, callback, sigma=float(self.sigma))
+            if stop:
+                break
+
+    def optimize(self, func, evaluator=None, callback=None):
+
+        """
+        Runs the entire optimisation process with the given fitness function.
+
+        Parameters
+        ----------
+        func : function
+            Function used for evaluating fitness.
+        evaluator : SerialEvaluator or ParallelEvaluator
+            Object used to evaluate the fitness of each generation. Defaults to a SerialEvaluator.
+        callback : function
+            Called with a summary dict (see report) at the end of every generation.
+        """
+
+        if evaluator is None:
+            evaluator = SerialEvaluator()
+
+        def evaluate(positions):
+            self.population = [Aerofoil('Candidate No. ' + str(i), self.param_method, dict(zip(self.bounds, position)))
+                               for i, position in enumerate(positions)]
+            fitnesses = evaluator.evaluate(func, self.population)
+            for individual, fitness in zip(self.population, fitnesses):
+                individual.fitness = fitness
+            return fitnesses
+
+        self._run(evaluate, callback)
+
+    def optimize_batch(self, func, callback=None):
+
+        """
+        Runs the optimisation process with a vectorised fitness function, which is called with the (n, n_params) array
+        of parameter vectors of a whole generation and returns their fitnesses as an array. No Aerofoil objects are
+        created for the candidates.
+        """
+
+        def evaluate(positions):
+            with timings.stage('fitness'):
+                return func(positions)
+
+        self._run(evaluate, callback)
@@ -1,16 +1,35 @@
 from ..aerofoil import Aerofoil
+from .base import Optimizer, register_optimizer, sample_feasible, BATCH_PARAMETERIZATIONS
+from .history import History, failure_codes
+from .stopping import EarlyStopping
+from ..utils.evaluators import SerialEvaluator
+from ..utils.timing import timings
 import numpy as np
-import copy
-import random
-import sys
+import json
+import os
 
 
-class DE:
-    def __init__(self, bounds: dict, pop_size: int, n_generations: int, param_method: str, f: float, cr: float):
+def _improvement(trial_fitnesses, target_fitnesses):
+    # fitness gain of each trial over its target; a gain over a failure sentinel is not a measure of quality and is inf
+    with np.errstate(invalid='ignore'):
+        return np.where(failure_codes(target_fitnesses) == 0, trial_fitnesses - target_fitnesses, np.inf)
+
+
+@register_optimizer('de')
+class DE(Optimizer):
+    def __init__(self, bounds: dict, pop_size: int, n_generations: int, param_method: str, f: float, cr: float,
+                 seed: int = None, history_path: str = None, sampler: str = 'random', adaptation: str = None,
+                 stopping: EarlyStopping = None, initial_positions: np.ndarray = None, repair: str = None,
+                 repair_steps: int = 8):
 
         """
         DE (Differential Evolution) class.
 
+        The population is held as a (pop_size, n_params) array of parameter vectors together with a vector of their
+        fitnesses. The donor and trial vectors of a whole generation are generated in a single batched step, and
+        Aerofoil objects are only created to evaluate fitness. Every evaluation of a run is recorded in history (see
+        algorithms.history.History), from which the best individual of each generation is rebuilt on demand.
+
         Parameters
         ----------
         bounds : dict
@@ -23,9 +42,34 @@ class DE:
         param_method : str
             Parametrisation method.
         f : float
-            Differential weight/mutation factor
+            Differential weight/mutation factor (initial value if adaptation is used)
         cr : float
-            Crossover probability
+            Crossover probability (initial value if adaptation is used)
+        seed : int
+            Seed for the random number generator, for reproducible runs.
+        history_path : str
+            Directory to which the record of every evaluation is streamed as memory-mapped files. The record is held
+            in memory if None.
+        sampler : str
+            Sampling of the initial population: 'random' (uniform), 'sobol' (scrambled Sobol sequence) or 'lhs' (Latin
+            hypercube). Candidates are drawn in blocks and screened against the parametrisation constraints together.
+        adaptation : str
+            Self-adaptive control of f and cr, which are then drawn per trial (see sample_parameters):
+            'jde' (Brest et al., 2006) or 'shade' (success-history adaptation, Tanabe & Fukunaga, 2013). f and cr are
+            fixed if None.
+        stopping : EarlyStopping
+            Stopping rules checked at the end of every generation (see algorithms.stopping). The run always lasts
+            n_generations if None.
+        initial_positions : np.ndarray
+            (n, n_params) parameter vectors placed in the initial population ahead of the sampled ones, e.g. the best
+            results of earlier runs at nearby conditions (see campaign). Vectors outside the bounds or violating the
+            parametrisation constraints are skipped, and at most pop_size are used.
+        repair : str
+            Repair of trials which violate the parametrisation constraints, applied between crossover and selection
+            (see repair_trials): 'bisect' (towards the target) or 'resample' (the offending genes). Infeasible trials
+            are left as they are, and get a fitness of -inf, if None.
+        repair_steps : int
+            Number of bisection steps, or of redraws, made to repair a trial.
         """
 
         self.bounds = bounds
@@ -34,11 +78,48 @@ class DE:
         self.param_method = param_method
         self.f = f
         self.cr = cr
+        self.rng = np.random.default_rng(seed)
+        if sampler not in ('random', 'sobol', 'lhs'):
+            raise ValueError("Invalid sampler")
+        self.sampler = sampler
+        self.acceptance_rate = None
+        self.stopping = stopping
+        self.stop_reason = None
+        self.initial_positions = initial_positions
+        self.n_seeded = 0
+
+        if repair not in (None, 'bisect', 'resample'):
+            raise ValueError("Invalid repair")
+        self.repair = repair
+        self.repair_steps = repair_steps
+        # trials made, found infeasible and repaired since the last generation summary (see repair_trials)
+        self._repair_counts = np.zeros(3, dtype=int)
+
+        # per-individual f and cr (jDE), or the success-history memories and the successes of the current generation
+        # (SHADE), whose memory size is pop_size
+        if adaptation not in (None, 'jde', 'shade'):
+            raise ValueError("Invalid adaptation")
+        self.adaptation = adaptation
+        self.f_i = np.full(pop_size, float(f))
+        self.cr_i = np.full(pop_size, float(cr))
+        self.memory_f = np.full(pop_size, float(f))
+        self.memory_cr = np.full(pop_size, float(cr))
+        self.memory_idx = 0
+        self._successes = []
 
         self.best_individual = None
         self.population = []
+        self.positions = np.empty((pop_size, len(bounds)))
+        self.fitnesses = np.full(pop_size, -np.inf)
         self.best_fitness_history = [None]
-        self.best_individual_history = [None]
+        self.n_evaluations = 0
+
+        # history rows of the population members, of the best individual and of the best individual of each generation
+        self.history_path = history_path
+        self.history = None
+        self.rows = np.full(pop_size, -1)
+        self.best_row = None
+        self.best_row_history = [None]
 
         bounds_arr = np.array(list(self.bounds.values()))
         self.lb = bounds_arr[:, 0]
@@ -48,118 +129,656 @@ class DE:
 
         """Generates an individual Aerofoil object with parameters randomly selected from given bounds."""
 
-        params_values = np.random.uniform(self.lb, self.ub)
+        params_values = self.rng.uniform(self.lb, self.ub)
         params = dict(zip(self.bounds.keys(), params_values))
 
         individual = Aerofoil(name, self.param_method, params)
 
         return individual
 
-    def initialise_population(self):
+    def initialise_population(self, block_size: int = None, max_blocks: int = 1000):
 
-        """Generates the initial population."""
+        """
+        Generates the initial population. Candidate parameter vectors are drawn in blocks (see sampler) and the whole
+        block is screened against the parametrisation constraints as array operations. Feasible candidates are kept in
+        order until the population is full, and Aerofoil objects are only built for them. The fraction of feasible
+        candidates is stored in acceptance_rate. Feasible initial_positions, if given, take the first places of the
+        population and their number is stored in n_seeded.
 
-        for i in range(self.pop_size):
-            name = 'Population Member No. ' + str(i)
+        Parameters
+        ----------
+        block_size : int
+            Number of candidates drawn at a time. Defaults to the next power of two of at least 4 * pop_size.
+        max_blocks : int
+            Number of blocks drawn before giving up if the population can still not be filled.
+        """
 
-            individual = self.generate_individual(name)
-            while individual.parameterization.constraint_violation:
-                # ensures all members of the initial population meet constraints
-                individual = self.generate_individual(name)
+        seeds = self._seeds()
+        self.n_seeded = len(seeds)
+        self.positions[:self.n_seeded] = seeds
 
-            self.population.append(individual)
+        if self.n_seeded < self.pop_size:
+            positions, self.acceptance_rate = sample_feasible(self.bounds, self.param_method,
+                                                              self.pop_size - self.n_seeded, self.rng, self.sampler,
+                                                              block_size, max_blocks)
+            self.positions[self.n_seeded:] = positions
+            print('Initial population acceptance rate: {:.1%}'.format(self.acceptance_rate))
+        if self.n_seeded:
+            print('Initial population members seeded: {}'.format(self.n_seeded))
+
+        self.population = [Aerofoil('Population Member No. ' + str(i), self.param_method,
+                                    dict(zip(self.bounds, position))) for i, position in enumerate(self.positions)]
+
+    def _seeds(self):
+        # the feasible initial_positions within the bounds, in the given order
+        if self.initial_positions is None:
+            return np.empty((0, len(self.bounds)))
+
+        seeds = np.asarray(self.initial_positions, dtype=float).reshape(-1, len(self.bounds))
+        seeds = seeds[np.all((seeds >= self.lb) & (seeds <= self.ub), axis=1)]
+        if len(seeds):
+            seeds = seeds[BATCH_PARAMETERIZATIONS[self.param_method](seeds, list(self.bounds)).feasible]
 
-    def evaluate_population(self, func):
+        return seeds[:self.pop_size]
+
+    def evaluate_population(self, func, evaluator=None):
 
         """Evaluates fitness of every individual in the population with the given fitness function."""
 
+        if evaluator is None:
+            evaluator = SerialEvaluator()
+
         print('Evaluating Gen 0')
 
-        for individual in self.population:
-            sys.stdout.write(individual.name + '\r')
+        self._population_evaluated(evaluator.evaluate(func, self.population))
+
+    def _population_evaluated(self, fitnesses):
+        # starts the history and the best individual records once the initial population has been evaluated
+        self.fitnesses[:] = fitnesses
+        self.n_evaluations += self.pop_size
+
+        for individual, fitness in zip(self.population, self.fitnesses):
+            individual.fitness = fitness
+
+        self.history = History(list(self.bounds.keys()), self.param_method, self.pop_size * self.n_generations,
+                               self.history_path)
+        self.rows[:] = self.history.append(self.positions, self.fitnesses, 0)
+
+        best_idx = np.argmax(self.fitnesses)
+        self.best_individual = self.population[best_idx]
+        self.best_row = self.rows[best_idx]
+        self.best_fitness_history[0] = self.best_individual.fitness
+        self.best_row_history[0] = self.best_row
+        self.history.flush()
+
+    def sample_parameters(self, idx: np.ndarray):
+
+        """
+        Returns f and cr for new trials of the given targets. They are the fixed f and cr without adaptation. With
+        'jde', each is redrawn with probability 0.1 (f from U(0.1, 1), cr from U(0, 1)) and otherwise inherited from the
+        target. With 'shade', they are drawn around a random entry of the success-history memories (f from a Cauchy
+        distribution, cr from a normal distribution, both with scale 0.1).
+        """
+
+        n = len(idx)
+        if self.adaptation is None:
+            return np.full(n, self.f), np.full(n, self.cr)
+
+        if self.adaptation == 'jde':
+            f = np.where(self.rng.random(n) < 0.1, 0.1 + 0.9 * self.rng.random(n), self.f_i[idx])
+            cr = np.where(self.rng.random(n) < 0.1, self.rng.random(n), self.cr_i[idx])
+            return f, cr
+
+        r = self.rng.integers(0, len(self.memory_f), n)
+        cr = np.clip(self.rng.normal(self.memory_cr[r], 0.1), 0, 1)
+        f = self.memory_f[r] + 0.1 * self.rng.standard_cauchy(n)
+        while np.any(f <= 0):
+            redraw = f <= 0
+            f[redraw] = self.memory_f[r[redraw]] + 0.1 * self.rng.standard_cauchy(int(redraw.sum()))
+
+        return np.minimum(f, 1), cr
+
+    def adapt(self, idx: np.ndarray, f: np.ndarray, cr: np.ndarray, replaced: np.ndarray, improvement: np.ndarray):
+
+        """
+        Records the f and cr of the trials of the given targets which replaced their target. With 'jde' the targets take
+        on the f and cr of their successful trials; with 'shade' the successes are kept, weighted by their fitness
+        improvement, until update_memory is called at the end of the generation.
+        """
+
+        if self.adaptation == 'jde':
+            self.f_i[idx[replaced]] = f[replaced]
+            self.cr_i[idx[replaced]] = cr[replaced]
+        elif self.adaptation == 'shade' and np.any(replaced):
+            self._successes.append((f[replaced], cr[replaced], improvement[replaced]))
+
+    def update_memory(self):
+
+        """
+        Stores the weighted Lehmer mean of the successful f and the weighted mean of the successful cr of the
+        generation in the next entry of the SHADE memories. The memories are left unchanged if no trial succeeded.
+        """
 
-            individual.fitness = func(individual)
-            if self.best_individual is None or individual.fitness > self.best_individual.fitness:
-                self.best_individual = copy.deepcopy(individual)
-                self.best_fitness_history[0] = self.best_individual.fitness
-                self.best_individual_history[0] = self.best_individual
+        if self.adaptation != 'shade' or not self._successes:
+            return
 
-    def mutate(self, idx):
+        f, cr, improvement = (np.concatenate(values) for values in zip(*self._successes))
+        self._successes = []
 
-        """Mutation step of the differential evolution algorithm. (DE/rand-to-best/1 scheme)."""
+        # replacing a failure sentinel counts as the largest finite improvement, or 1 if there is none
+        finite = np.isfinite(improvement)
+        improvement = np.where(finite, improvement, improvement[finite].max() if finite.any() else 1)
+        weights = improvement / improvement.sum() if improvement.sum() > 0 else np.full(len(f), 1 / len(f))
 
-        pot_index = [i for i in range(self.pop_size) if i != idx]
-        random_index = random.sample(pot_index, 2)
+        self.memory_f[self.memory_idx] = np.sum(weights * f ** 2) / np.sum(weights * f)
+        self.memory_cr[self.memory_idx] = np.sum(weights * cr)
+        self.memory_idx = (self.memory_idx + 1) % len(self.memory_f)
 
-        x0 = self.population[idx]
-        x1 = self.population[random_index[0]]
-        x2 = self.population[random_index[1]]
+    def mutate(self, f: np.ndarray = None):
 
-        v_donor = np.fromiter(x0.position.values(), float)
-        v_donor += self.f * (np.fromiter(self.best_individual.position.values(), float) - v_donor)
-        v_donor += self.f * (np.fromiter(x1.position.values(), float) - np.fromiter(x2.position.values(), float))
+        """
+        Mutation step of the differential evolution algorithm (DE/rand-to-best/1 scheme). Returns the donor vectors of
+        the whole population, clipped to the bounds. f is the fixed f if None, otherwise one value per target.
+        """
 
-        for i in range(len(v_donor)):
-            if v_donor[i] < self.lb[i]:
-                v_donor[i] = self.lb[i]
-            elif v_donor[i] > self.ub[i]:
-                v_donor[i] = self.ub[i]
+        f = self.f if f is None else np.asarray(f)[:, None]
 
-        return v_donor
+        n = self.pop_size
+        idx = np.arange(n)
 
-    def crossover(self, idx, v_donor):
+        # two distinct random indices per target, both different from the target itself
+        r1 = self.rng.integers(0, n - 1, n)
+        r1 += r1 >= idx
+        r2 = self.rng.integers(0, n - 2, n)
+        r2 += r2 >= np.minimum(idx, r1)
+        r2 += r2 >= np.maximum(idx, r1)
+
+        x0 = self.positions
+        best = self.positions[np.argmax(self.fitnesses)]
+
+        v_donor = x0 + f * (best - x0) + f * (self.positions[r1] - self.positions[r2])
+
+        return np.clip(v_donor, self.lb, self.ub)
+
+    def crossover(self, v_donor, cr: np.ndarray = None):
+
+        """
+        Crossover step of the differential evolution algorithm (binary crossover) for the whole population. cr is the
+        fixed cr if None, otherwise one value per target.
+        """
 
-        """Crossover step of the differential evolution algorithm (binary crossover)."""
+        cr = self.cr if cr is None else np.asarray(cr)[:, None]
+        mask = self.rng.random(v_donor.shape) < cr
 
-        v_trial = copy.deepcopy(list(self.population[idx].position.values()))
-        for k in range(len(v_donor)):
-            if np.random.random() < self.cr:
-                v_trial[k] = v_donor[k]
+        return np.where(mask, v_donor, self.positions)
+
+    def repair_trials(self, v_trial, idx: np.ndarray = None):
+
+        """
+        Repair step between crossover and selection. Trials which violate the parametrisation constraints are moved back
+        into the feasible region and the repaired trial vectors are returned. idx holds the targets of the trials (the
+        whole population if None).
+
+        With 'bisect', the segment from the target (which is always feasible) to the trial is bisected repair_steps
+        times for the feasible point closest to the trial. With 'resample', the genes which the trial took from the
+        donor and which enter a violated constraint are redrawn within the bounds, up to repair_steps times. Trials
+        which are still infeasible are returned unchanged. The trials are returned as they are if repair is None.
+        """
+
+        if self.repair is None:
+            return v_trial
+
+        idx = np.arange(self.pop_size) if idx is None else np.asarray(idx)
+        batch = BATCH_PARAMETERIZATIONS[self.param_method]
+        keys = list(self.bounds)
+
+        with timings.stage('repair'):
+            bad = np.flatnonzero(~batch(v_trial, keys).feasible)
+            self._repair_counts[:2] += len(v_trial), len(bad)
+            if not len(bad):
+                return v_trial
+
+            v_trial = v_trial.copy()
+            x0 = self.positions[idx[bad]]
+            v = v_trial[bad]
+
+            if self.repair == 'bisect':
+                lo = np.zeros(len(bad))
+                hi = np.ones(len(bad))
+                for _ in range(self.repair_steps):
+                    mid = (lo + hi) / 2
+                    feasible = batch(x0 + mid[:, None] * (v - x0), keys).feasible
+                    lo = np.where(feasible, mid, lo)
+                    hi = np.where(feasible, hi, mid)
+                repaired = lo > 0
+                v = x0 + lo[:, None] * (v - x0)
+            else:
+                repaired = np.zeros(len(bad), dtype=bool)
+                violated = batch(v, keys).violated(keys)
+                for _ in range(self.repair_steps):
+                    todo = np.flatnonzero(~repaired)
+                    redraw = violated[todo] & (v[todo] != x0[todo])
+                    v[todo] = np.where(redraw, self.rng.uniform(self.lb, self.ub, v[todo].shape), v[todo])
+                    shapes = batch(v[todo], keys)
+                    repaired[todo] = shapes.feasible
+                    violated[todo] = shapes.violated(keys)
+                    if repaired.all():
+                        break
+
+            v_trial[bad[repaired]] = v[repaired]
+            self._repair_counts[2] += int(repaired.sum())
 
         return v_trial
 
-    def selection(self, idx, v_trial, func):
+    def _repair_info(self):
+        # fractions of the trials made since the last summary which were infeasible and which were repaired
+        n_trials, n_infeasible, n_repaired = self._repair_counts
+        self._repair_counts[:] = 0
+        if not n_trials:
+            return {}
+
+        return {'infeasible_rate': float(n_infeasible / n_trials), 'repair_rate': float(n_repaired / n_trials)}
+
+    def trial_vector(self, idx, f: float = None, cr: float = None):
+
+        """
+        Mutation and crossover for a single target, using the current state of the population. f and cr default to
+        the fixed f and cr.
+        """
+
+        f = self.f if f is None else f
+        cr = self.cr if cr is None else cr
+        r1, r2 = self.rng.choice(np.delete(np.arange(self.pop_size), idx), 2, replace=False)
+
+        x0 = self.positions[idx]
+        best = self.positions[np.argmax(self.fitnesses)]
+
+        v_donor = x0 + f * (best - x0) + f * (self.positions[r1] - self.positions[r2])
+        v_donor = np.clip(v_donor, self.lb, self.ub)
+
+        return np.where(self.rng.random(len(x0)) < cr, v_donor, x0)
 
-        """Selection step of the differential evolution algorithm."""
+    def trial_individual(self, idx, v_trial):
 
-        target_individual = self.population[idx]
+        """Creates the Aerofoil object for a trial vector, named after the target individual it competes against."""
 
         trial_params = dict(zip(self.bounds.keys(), v_trial))
-        trial_individual = Aerofoil(target_individual.name, self.param_method, trial_params)
 
-        trial_individual.fitness = func(trial_individual)
+        return Aerofoil(self.population[idx].name, self.param_method, trial_params)
 
-        replaced = False
-        if trial_individual.fitness > target_individual.fitness:
-            self.population[idx] = trial_individual
-            replaced = True
+    def selection(self, v_trial, trials: list, trial_fitnesses: np.ndarray):
+
+        """
+        Selection step of the differential evolution algorithm. Replaces every target with its trial if the trial is
+        fitter and returns a boolean mask of the replaced individuals. Only positions and fitnesses are updated if
+        trials is None.
+        """
+
+        replaced = trial_fitnesses > self.fitnesses
+
+        self.positions[replaced] = v_trial[replaced]
+        self.fitnesses[replaced] = trial_fitnesses[replaced]
+        if trials is not None:
+            for idx in np.flatnonzero(replaced):
+                self.population[idx] = trials[idx]
 
         return replaced
 
-    def optimize(self, func):
+    def save_checkpoint(self, path: str, gen: int, surrogate=None, fidelity=None):
+
+        """
+        Saves the state of the run after the given completed generation to a NumPy .npz file: population positions and
+        fitnesses, best fitness and best history row of every generation, evaluation count, the state of the random
+        number generator, the adapted f and cr (see adaptation) and the history (only its size if it is memory-mapped),
+        plus the state of the surrogate and fidelity objects, if given. No Aerofoil objects are stored; they are rebuilt
+        from the parameter vectors by load_checkpoint. The file is replaced atomically, so an interrupted save leaves
+        the previous checkpoint intact.
+        """
+
+        state = {'generation': gen, 'names': np.array(list(self.bounds.keys())), 'positions': self.positions,
+                 'fitnesses': self.fitnesses, 'best_fitness_history': np.array(self.best_fitness_history, dtype=float),
+                 'rows': self.rows, 'best_row': self.best_row, 'best_row_history': np.array(self.best_row_history),
+                 'n_evaluations': self.n_evaluations, 'rng_state': np.array(json.dumps(self.rng.bit_generator.state)),
+                 'f_i': self.f_i, 'cr_i': self.cr_i, 'memory_f': self.memory_f, 'memory_cr': self.memory_cr,
+                 'memory_idx': self.memory_idx}
+        for prefix, obj in (('history_', self.history), ('surrogate_', surrogate), ('fidelity_', fidelity)):
+            if obj is not None:
+                state.update({prefix + key: value for key, value in obj.state().items()})
+
+        with open(path + '.tmp', 'wb') as f:
+            np.savez(f, **state)
+        os.replace(path + '.tmp', path)
+
+    def load_checkpoint(self, path: str, surrogate=None, fidelity=None):
+
+        """
+        Restores the state of a run saved by save_checkpoint (and the state of the surrogate and fidelity objects, if
+        given) and returns the last completed generation.
+        """
+
+        with np.load(path) as state:
+            if list(state['names']) != list(self.bounds.keys()):
+                raise ValueError("Checkpoint parameters do not match the bounds of this optimizer")
+
+            gen = int(state['generation'])
+            self.positions = state['positions'].copy()
+            self.fitnesses = state['fitnesses'].copy()
+            self.best_fitness_history = list(state['best_fitness_history'])
+            self.n_evaluations = int(state['n_evaluations'])
+            self.rng.bit_generator.state = json.loads(str(state['rng_state']))
+            self.rows = state['rows'].copy()
+            self.best_row = int(state['best_row'])
+            self.best_row_history = [int(row) for row in state['best_row_history']]
+            if 'f_i' in state.files:
+                self.f_i = state['f_i'].copy()
+                self.cr_i = state['cr_i'].copy()
+                self.memory_f = state['memory_f'].copy()
+                self.memory_cr = state['memory_cr'].copy()
+                self.memory_idx = int(state['memory_idx'])
+
+            if self.history_path is None:
+                self.history = History(list(self.bounds.keys()), self.param_method)
+            else:
+                self.history = History.open(self.history_path, 'r+')
+
+            for prefix, obj in (('history_', self.history), ('surrogate_', surrogate), ('fidelity_', fidelity)):
+                if obj is not None:
+                    obj.load_state({key[len(prefix):]: state[key] for key in state.files if key.startswith(prefix)})
+
+        self.population = []
+        for i, (position, fitness) in enumerate(zip(self.positions, self.fitnesses)):
+            individual = Aerofoil('Population Member No. ' + str(i), self.param_method,
+                                  dict(zip(self.bounds.keys(), position)))
+            individual.fitness = fitness
+            self.population.append(individual)
+
+        self.best_individual = self.history.individual(self.best_row)
+
+        return gen
+
+    def optimize(self, func, evaluator=None, callback=None, surrogate=None, fidelity=None, checkpoint: str = None,
+                 checkpoint_every: int = 1):
         """
         Runs the entire optimisation process with the given fitness function.
 
+        The trial individuals of a generation are all created from the population at the start of that generation and
+        are then evaluated together, so the evaluation of a generation can be spread across worker processes.
+
         Parameters
         ----------
         func : function
             Function used for evaluating fitness.
+        evaluator : SerialEvaluator or ParallelEvaluator
+            Object used to evaluate the fitness of each batch of individuals. Defaults to a SerialEvaluator.
+        callback : function
+            Called with a summary dict (see report) at the end of every generation.
+        surrogate : RBFSurrogate
+            Surrogate model used to pre-screen the trials of each generation. Only the trials it selects are evaluated
+            with the fitness function; the others are discarded. All trials are evaluated if None.
+        fidelity : MultiFidelity
+            Low-fidelity screening of the trials of each generation. Only trials that look competitive with their target
+            at low fidelity are evaluated with the fitness function.
+        checkpoint : str
+            Path of a .npz file to which the state of the run is saved (see save_checkpoint), so that it can be
+            continued with resume. No checkpoints are saved if None.
+        checkpoint_every : int
+            Number of generations between checkpoints. The final generation is always saved.
         """
 
+        if evaluator is None:
+            evaluator = SerialEvaluator()
+        if self.stopping is not None:
+            self.stopping.start()
+
         self.initialise_population()
-        self.evaluate_population(func)
+        self.evaluate_population(func, evaluator)
+
+        info = {}
+        if fidelity is not None:
+            fidelity.start(evaluator, self.population)
+            info = fidelity.stats()
+        self.report(0, self.pop_size, callback, **info)
+
+        if surrogate is not None:
+            surrogate.add(self.positions, self.fitnesses)
+
+        if checkpoint is not None:
+            self.save_checkpoint(checkpoint, 0, surrogate, fidelity)
+
+        self._generations(1, func, evaluator, callback, surrogate, fidelity, checkpoint, checkpoint_every)
+
+    def resume(self, checkpoint: str, func, evaluator=None, callback=None, surrogate=None, fidelity=None,
+               checkpoint_every: int = 1):
+
+        """
+        Continues a run of optimize from the last generation saved to the given checkpoint file, which is updated as the
+        run goes on. With the same fitness function, a resumed run gives bit-identical results to one which was never
+        interrupted. The run continues up to n_generations of this optimizer, so a finished run can also be extended.
+        The surrogate and fidelity objects must be new objects created with the same settings as in the original run;
+        their state is restored from the checkpoint.
+        """
+
+        if evaluator is None:
+            evaluator = SerialEvaluator()
+
+        if self.stopping is not None:
+            self.stopping.start()
+
+        gen = self.load_checkpoint(checkpoint, surrogate, fidelity)
+        self._generations(gen + 1, func, evaluator, callback, surrogate, fidelity, checkpoint, checkpoint_every)
+
+    def _generations(self, start, func, evaluator, callback, surrogate, fidelity, checkpoint, checkpoint_every):
+        info = fidelity.stats() if fidelity is not None else {}
+
+        for gen in range(start, self.n_generations):
+            print('Evaluating Gen {}'.format(gen))
+
+            f, cr = self.sample_parameters(np.arange(self.pop_size))
+            v_trial = self.repair_trials(self.crossover(self.mutate(f), cr))
+
+            if surrogate is None:
+                evaluated = np.arange(self.pop_size)
+            else:
+                evaluated = surrogate.screen(v_trial, self.rng)
+
+            # trials which are not evaluated keep a fitness of -inf and therefore never replace their target
+            trials = [None] * self.pop_size
+            for idx in evaluated:
+                trials[idx] = self.trial_individual(idx, v_trial[idx])
+
+            trial_fitnesses = np.full(self.pop_size, -np.inf)
+            if fidelity is None:
+                trial_fitnesses[evaluated] = evaluator.evaluate(func, [trials[idx] for idx in evaluated])
+            else:
+                trial_fitnesses[evaluated], promoted = fidelity.evaluate(
+                    evaluator, func, [trials[idx] for idx in evaluated], evaluated, self.fitnesses)
+                evaluated = evaluated[promoted]
+
+            self.n_evaluations += len(evaluated)
+            for idx in evaluated:
+                trials[idx].fitness = trial_fitnesses[idx]
+            trial_rows = np.full(self.pop_size, -1)
+            trial_rows[evaluated] = self.history.append(v_trial[evaluated], trial_fitnesses[evaluated], gen)
+
+            if surrogate is not None:
+                surrogate.add(v_trial[evaluated], trial_fitnesses[evaluated], evaluated)
+
+            improvement = _improvement(trial_fitnesses, self.fitnesses)
+            replaced = self.selection(v_trial, trials, trial_fitnesses)
+            self.rows[replaced] = trial_rows[replaced]
+            self.adapt(np.arange(self.pop_size), f, cr, replaced, improvement)
+            self.update_memory()
+            if fidelity is not None:
+                fidelity.select(replaced)
+                info = fidelity.stats()
+
+            best_idx = np.argmax(self.fitnesses)
+            if self.fitnesses[best_idx] > self.best_individual.fitness:
+                self.best_individual = self.population[best_idx]
+                self.best_row = self.rows[best_idx]
+
+            self.best_fitness_history.append(self.best_individual.fitness)
+            self.best_row_history.append(self.best_row)
+            stop = self.stopped()
+            self.report(gen, int(replaced.sum()), callback, **info, **self._repair_info())
+            self.history.flush()
+
+            if checkpoint is not None and (gen % checkpoint_every == 0 or gen == self.n_generations - 1 or stop):
+                self.save_checkpoint(checkpoint, gen, surrogate, fidelity)
+            if stop:
+                break
 
-        for gen in range(self.n_generations - 1):
-            print('Evaluating Gen {}'.format(gen + 1))
+    def optimize_batch(self, func, callback=None):
+
+        """
+        Runs the optimisation process with a vectorised fitness function, which is called with the (n, n_params) array
+        of parameter vectors of a whole generation and returns their fitnesses as an array.
 
-            for idx in range(self.pop_size):
-                sys.stdout.write(self.population[idx].name + '\r')
-                v_donor = self.mutate(idx)
-                v_trial = self.crossover(idx, v_donor)
-                replaced = self.selection(idx, v_trial, func)
+        No Aerofoil objects are created for the trials. best_individual is rebuilt from the history whenever it
+        improves, and population is only brought up to date with positions at the end of the run.
 
-                if replaced and self.population[idx].fitness > self.best_individual.fitness:
-                    self.best_individual = copy.deepcopy(self.population[idx])
+        Parameters
+        ----------
+        func : function
+            Vectorised function used for evaluating fitness (e.g. fit._batch_similarity).
+        callback : function
+            Called with a summary dict (see report) at the end of every generation.
+        """
+
+        if self.stopping is not None:
+            self.stopping.start()
+
+        self.initialise_population()
+
+        print('Evaluating Gen 0')
+        with timings.stage('fitness'):
+            self._population_evaluated(func(self.positions))
+        self.report(0, self.pop_size, callback)
+
+        stale = np.zeros(self.pop_size, dtype=bool)
+        for gen in range(1, self.n_generations):
+            print('Evaluating Gen {}'.format(gen))
+
+            f, cr = self.sample_parameters(np.arange(self.pop_size))
+            v_trial = self.repair_trials(self.crossover(self.mutate(f), cr))
+            with timings.stage('fitness'):
+                trial_fitnesses = np.asarray(func(v_trial), dtype=float)
+            self.n_evaluations += self.pop_size
+            trial_rows = self.history.append(v_trial, trial_fitnesses, gen)
+
+            improvement = _improvement(trial_fitnesses, self.fitnesses)
+            replaced = self.selection(v_trial, None, trial_fitnesses)
+            self.rows[replaced] = trial_rows[replaced]
+            self.adapt(np.arange(self.pop_size), f, cr, replaced, improvement)
+            self.update_memory()
+            stale |= replaced
+
+            best_idx = np.argmax(self.fitnesses)
+            if self.fitnesses[best_idx] > self.best_individual.fitness:
+                self.best_row = self.rows[best_idx]
+                self.best_individual = self.history.individual(self.best_row)
 
             self.best_fitness_history.append(self.best_individual.fitness)
-            self.best_individual_history.append(self.best_individual)
+            self.best_row_history.append(self.best_row)
+            stop = self.stopped()
+            self.report(gen, int(replaced.sum()), callback, **self._repair_info())
+            self.history.flush()
+            if stop:
+                break
+
+        for idx in np.flatnonzero(stale):
+            individual = Aerofoil('Population Member No. ' + str(idx), self.param_method,
+                                  dict(zip(self.bounds.keys(), self.positions[idx])))
+            individual.fitness = self.fitnesses[idx]
+            self.population[idx] = individual
+
+    def optimize_async(self, func, evaluator, n_in_flight: int = None, callback=None):
+        """
+        Runs the optimisation process as an asynchronous steady-state DE with the given fitness function.
+
+        A fixed number of trial evaluations is kept in flight. As soon as one completes, its target is replaced if the
+        trial is fitter (updating best_individual immediately) and a new trial is generated from the current state of
+        the population, so slow evaluations never hold up the others. Every pop_size completed trials count as one
+        generation for the histories and the callback. The same number of trials is evaluated as by optimize, but the
+        order of completion depends on evaluation times, so runs are not reproducible.
+
+        Parameters
+        ----------
+        func : function
+            Function used for evaluating fitness.
+        evaluator : SerialEvaluator or ParallelEvaluator
+            Object used to evaluate individuals. Must provide submit and next_result.
+        n_in_flight : int
+            Number of evaluations kept running at once. Defaults to the evaluator's number of workers.
+        callback : function
+            Called with a summary dict (see report) at the end of every generation.
+        """
+
+        if n_in_flight is None:
+            n_in_flight = getattr(evaluator, 'n_workers', 1)
+        n_in_flight = min(n_in_flight, self.pop_size)
+
+        if self.stopping is not None:
+            self.stopping.start()
+
+        self.initialise_population()
+        self.evaluate_population(func, evaluator)
+        self.report(0, self.pop_size, callback)
+
+        n_trials = self.pop_size * (self.n_generations - 1)
+        n_submitted = 0
+        n_completed = 0
+        n_replaced = 0
+        next_idx = 0
+        pending = {}
+        stop = False
+
+        while n_completed < n_trials:
+            while not stop and len(pending) < n_in_flight and n_submitted < n_trials:
+                # targets are visited in turn, skipping those which already have a trial in flight
+                while next_idx in pending:
+                    next_idx = (next_idx + 1) % self.pop_size
+                f, cr = self.sample_parameters(np.array([next_idx]))
+                v_trial = self.repair_trials(self.trial_vector(next_idx, f[0], cr[0])[None], [next_idx])[0]
+                pending[next_idx] = (v_trial, self.trial_individual(next_idx, v_trial), f, cr)
+                evaluator.submit(func, pending[next_idx][1], next_idx)
+                n_submitted += 1
+                next_idx = (next_idx + 1) % self.pop_size
+
+            idx, fitness = evaluator.next_result()
+            v_trial, trial_individual, f, cr = pending.pop(idx)
+            trial_individual.fitness = fitness
+            n_completed += 1
+            self.n_evaluations += 1
+            row = self.history.append(v_trial[None], np.array([fitness]), (n_completed - 1) // self.pop_size + 1)[0]
+
+            improvement = _improvement(np.array([fitness]), self.fitnesses[[idx]])
+            replaced = fitness > self.fitnesses[idx]
+            self.adapt(np.array([idx]), f, cr, np.array([replaced]), improvement)
+            if replaced:
+                self.positions[idx] = v_trial
+                self.fitnesses[idx] = fitness
+                self.population[idx] = trial_individual
+                self.rows[idx] = row
+                n_replaced += 1
+
+                if fitness > self.best_individual.fitness:
+                    self.best_individual = trial_individual
+                    self.best_row = row
+
+            # once a stopping rule has fired no more trials are submitted, and the trials still in flight are completed
+            # as a last, partial generation
+            if n_completed % self.pop_size == 0 or (stop and not pending):
+                gen = (n_completed - 1) // self.pop_size + 1
+                print('Evaluated Gen {}'.format(gen))
+
+                self.best_fitness_history.append(self.best_individual.fitness)
+                self.best_row_history.append(self.best_row)
+                self.update_memory()
+                if not stop:
+                    stop = self.stopped()
+                    if stop:
+                        n_trials = n_submitted
+                self.report(gen, n_replaced, callback, **self._repair_info())
+                self.history.flush()
+                n_replaced = 0
@@ -0,0 +1,178 @@
+from ..aerofoil import Aerofoil
+import numpy as np
+import json
+import os
+
+# failure sentinel fitnesses of the fitness functions (see opt._drag_reward), in order of their failure codes
+FAILURES = ((-np.inf, 'constraint_violation'), (-1e12, 'xfoil_failed'), (-1e11, 'polar_unreadable'),
+            (-1e9, 'interpolation_failed'), (-1e8, 'cl_des_out_of_range'))
+
+_COLUMNS = (('positions', np.float64), ('fitnesses', np.float64), ('generations', np.int32), ('failures', np.int8))
+
+
+def failure_codes(fitnesses: np.ndarray):
+
+    """Returns the failure code of every fitness: 0 for a valid fitness, otherwise 1 + the index in FAILURES."""
+
+    codes = np.zeros(len(fitnesses), dtype=np.int8)
+    for code, (value, _) in enumerate(FAILURES, 1):
+        codes[fitnesses == value] = code
+
+    return codes
+
+
+class History:
+    def __init__(self, names: list, param_method: str, capacity: int = 1024, path: str = None):
+
+        """
+        Append-only columnar record of every evaluation of a run: parameter vector, fitness, generation and failure code
+        (see failure_codes). The columns are preallocated arrays which grow by doubling when full. If a path is given
+        they are memory-mapped .npy files in that directory, so the record is streamed to disk as the run goes on and
+        can be reopened with History.open for analysis. Aerofoil objects are only built on demand (see individual).
+
+        Parameters
+        ----------
+        names : list
+            Parameter names, in the order of the columns of positions.
+        param_method : str
+            Parametrisation method.
+        capacity : int
+            Number of rows allocated initially.
+        path : str
+            Directory of the memory-mapped columns. The record is held in memory if None.
+        """
+
+        self.names = list(names)
+        self.param_method = param_method
+        self.path = path
+        self.size = 0
+
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+        self._columns = {name: self._allocate(name, dtype, capacity) for name, dtype in _COLUMNS}
+
+    @classmethod
+    def open(cls, path: str, mode: str = 'r'):
+
+        """Reopens a record streamed to the given directory, read-only unless mode is 'r+'."""
+
+        with open(os.path.join(path, 'history.json')) as f:
+            meta = json.load(f)
+
+        history = cls.__new__(cls)
+        history.names = meta['names']
+        history.param_method = meta['param_method']
+        history.path = path
+        history.size = meta['size']
+        history._columns = {name: np.load(os.path.join(path, name + '.npy'), mmap_mode=mode) for name, _ in _COLUMNS}
+
+        return history
+
+    def _allocate(self, name, dtype, capacity, suffix=''):
+        shape = (capacity, len(self.names)) if name == 'positions' else (capacity,)
+        if self.path is None:
+            return np.zeros(shape, dtype=dtype)
+        return np.lib.format.open_memmap(os.path.join(self.path, name + '.npy' + suffix), 'w+', dtype, shape)
+
+    def _grow(self, capacity):
+        for name, dtype in _COLUMNS:
+            column = self._allocate(name, dtype, capacity, '.tmp' if self.path is not None else '')
+            column[:self.size] = self._columns[name][:self.size]
+            if self.path is None:
+                self._columns[name] = column
+                continue
+
+            # a file which is still mapped cannot be replaced on Windows, so both columns are unmapped first and the
+            # grown file is then mapped again
+            column.flush()
+            del column
+            self._columns[name] = None
+            path = os.path.join(self.path, name + '.npy')
+            os.replace(path + '.tmp', path)
+            self._columns[name] = np.load(path, mmap_mode='r+')
+
+    def append(self, positions: np.ndarray, fitnesses: np.ndarray, generation: int):
+
+        """Records a batch of evaluations and returns their row indices."""
+
+        n = len(fitnesses)
+        if self.size + n > len(self._columns['fitnesses']):
+            self._grow(max(2 * len(self._columns['fitnesses']), self.size + n))
+
+        rows = np.arange(self.size, self.size + n)
+        self._columns['positions'][rows] = positions
+        self._columns['fitnesses'][rows] = fitnesses
+        self._columns['generations'][rows] = generation
+        self._columns['failures'][rows] = failure_codes(np.asarray(fitnesses, dtype=float))
+        self.size += n
+
+        return rows
+
+    @property
+    def positions(self):
+        return self._columns['positions'][:self.size]
+
+    @property
+    def fitnesses(self):
+        return self._columns['fitnesses'][:self.size]
+
+    @property
+    def generations(self):
+        return self._columns['generations'][:self.size]
+
+    @property
+    def failures(self):
+        return self._columns['failures'][:self.size]
+
+    def __len__(self):
+        return self.size
+
+    def individual(self, row: int):
+
+        """Builds the Aerofoil object of the given row."""
+
+        aerofoil = Aerofoil('Evaluation No. ' + str(row), self.param_method,
+                            dict(zip(self.names, self._columns['positions'][row])))
+        aerofoil.fitness = self._columns['fitnesses'][row]
+
+        return aerofoil
+
+    def failure_counts(self):
+
+        """Returns the number of evaluations of each failure category."""
+
+        counts = np.bincount(self.failures, minlength=len(FAILURES) + 1)
+
+        return {name: int(count) for (_, name), count in zip(FAILURES, counts[1:])}
+
+    def flush(self):
+
+        """Writes the memory-mapped columns and the record size to disk."""
+
+        if self.path is None:
+            return
+        for column in self._columns.values():
+            column.flush()
+        with open(os.path.join(self.path, 'history.json'), 'w') as f:
+            json.dump({'names': self.names, 'param_method': self.param_method, 'size': self.size}, f)
+
+    def state(self):
+
+        """
+        Returns the record as a dict of arrays, for checkpoints (see DE.save_checkpoint). A memory-mapped record is
+        flushed instead and only its size is returned.
+        """
+
+        if self.path is not None:
+            self.flush()
+            return {'size': self.size}
+
+        return {'size': self.size, **{name: self._columns[name][:self.size] for name, _ in _COLUMNS}}
+
+    def load_state(self, state: dict):
+
+        """Restores the record from a dict returned by state, discarding rows recorded after it was saved."""
+
+        self.size = int(state['size'])
+        if self.path is None:
+            self._columns = {name: state[name].copy() for name, _ in _COLUMNS}
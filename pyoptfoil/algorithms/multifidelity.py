@@ -0,0 +1,138 @@
+import numpy as np
+import time
+
+
+class MultiFidelity:
+    def __init__(self, low_func, tolerance: float = 0.05, rule=None, evaluator=None):
+
+        """
+        Two-level fidelity screening of DE trials. Every trial is first scored with a cheap low-fidelity fitness
+        function and only trials that look competitive with their target are evaluated with the full-fidelity one.
+
+        By default a trial is promoted if its low-fidelity fitness is no more than tolerance (relative) worse than the
+        low-fidelity fitness of its target. The low-fidelity fitness of every population member is kept for this
+        purpose.
+
+        Parameters
+        ----------
+        low_func : function
+            Low-fidelity fitness function. Must be picklable to be used with a ParallelEvaluator.
+        tolerance : float
+            Relative margin by which a trial may be worse than its target at low fidelity and still be promoted.
+        rule : function
+            Custom promotion rule, called as rule(trial_low, target_low, target_high) with arrays of the low-fidelity
+            fitness of the trials and the low- and full-fidelity fitness of their targets. Returns a boolean mask of
+            the trials to promote. Overrides tolerance.
+        evaluator : SerialEvaluator, ParallelEvaluator or CachedEvaluator
+            Object used for the low-fidelity evaluations. Defaults to the evaluator used for full fidelity.
+        """
+
+        self.low_func = low_func
+        self.tolerance = tolerance
+        self.rule = rule
+        self.evaluator = evaluator
+
+        self.target_low = None
+        self._trial_low = None
+
+        self.n_low = 0
+        self.n_high = 0
+        self.time_low = 0.0
+        self.time_high = 0.0
+
+    def promote(self, trial_low: np.ndarray, target_low: np.ndarray, target_high: np.ndarray):
+
+        """Returns a boolean mask of the trials to evaluate at full fidelity."""
+
+        if self.rule is not None:
+            return np.asarray(self.rule(trial_low, target_low, target_high), dtype=bool)
+
+        return trial_low >= target_low - self.tolerance * np.abs(target_low)
+
+    def _evaluate(self, evaluator, func, individuals: list, level: str):
+        start = time.perf_counter()
+        fitnesses = np.asarray(evaluator.evaluate(func, individuals), dtype=float)
+
+        if level == 'low':
+            self.n_low += len(individuals)
+            self.time_low += time.perf_counter() - start
+        else:
+            self.n_high += len(individuals)
+            self.time_high += time.perf_counter() - start
+
+        return fitnesses
+
+    def start(self, evaluator, population: list):
+
+        """Scores the initial population at low fidelity."""
+
+        self.target_low = self._evaluate(self.evaluator or evaluator, self.low_func, population, 'low')
+
+    def evaluate(self, evaluator, func, trials: list, idx: np.ndarray, target_high: np.ndarray):
+
+        """
+        Scores the given trials at low fidelity and evaluates the promoted ones with the full-fidelity function.
+
+        Parameters
+        ----------
+        evaluator : SerialEvaluator or ParallelEvaluator
+            Object used to evaluate each batch of individuals.
+        func : function
+            Full-fidelity fitness function.
+        trials : list
+            Trial individuals.
+        idx : numpy array
+            Population index of the target of each trial.
+        target_high : numpy array
+            Full-fidelity fitness of the whole population.
+
+        Returns
+        -------
+        Full-fidelity fitness of every trial (-inf for trials which were not promoted) and a boolean mask of the
+        promoted trials.
+        """
+
+        trial_low = self._evaluate(self.evaluator or evaluator, self.low_func, trials, 'low')
+
+        promoted = self.promote(trial_low, self.target_low[idx], target_high[idx])
+
+        fitnesses = np.full(len(trials), -np.inf)
+        if promoted.any():
+            fitnesses[promoted] = self._evaluate(evaluator, func, [t for t, p in zip(trials, promoted) if p], 'high')
+
+        self._trial_low = np.full(len(self.target_low), np.nan)
+        self._trial_low[idx] = trial_low
+
+        return fitnesses, promoted
+
+    def select(self, replaced: np.ndarray):
+
+        """Carries the low-fidelity fitness of the trials which replaced their targets over to the population."""
+
+        self.target_low[replaced] = self._trial_low[replaced]
+
+    def state(self):
+
+        """Returns the low-fidelity population fitness and statistics as a dict, for checkpoints."""
+
+        return {'target_low': self.target_low, 'n_low': self.n_low, 'n_high': self.n_high, 'time_low': self.time_low,
+                'time_high': self.time_high}
+
+    def load_state(self, state: dict):
+
+        """Restores the low-fidelity population fitness and statistics from a dict returned by state."""
+
+        self.target_low = state['target_low'].copy()
+        self.n_low = int(state['n_low'])
+        self.n_high = int(state['n_high'])
+        self.time_low = float(state['time_low'])
+        self.time_high = float(state['time_high'])
+
+    def stats(self):
+
+        """Returns the number of evaluations and the time spent at each fidelity, and the promotion rate."""
+
+        n_trials = self.n_low - (len(self.target_low) if self.target_low is not None else 0)
+
+        return {'n_low': self.n_low, 'n_high': self.n_high, 'time_low': self.time_low, 'time_high': self.time_high,
+                'promotion_rate': self.n_high / n_trials if n_trials > 0 else np.nan}
@@ -0,0 +1,75 @@
+import numpy as np
+import time
+
+
+class EarlyStopping:
+    def __init__(self, stall_generations: int = None, stall_tol: float = 0.0, min_diversity: float = None,
+                 max_time: float = None, max_evaluations: int = None):
+
+        """
+        Stopping rules checked by the optimizer engines at the end of every generation, so that a run ends once it has
+        converged (or its budget is spent) instead of always running all n_generations. The run stops as soon as any of
+        the given rules fires; rules left as None are not checked. The reason is stored in the optimizer's stop_reason.
+
+        Parameters
+        ----------
+        stall_generations : int
+            Stops when best_fitness_history has improved by no more than stall_tol over this many generations.
+        stall_tol : float
+            Improvement in best fitness which counts as a stall.
+        min_diversity : float
+            Stops when the diversity of the population (see diversity) falls below this value.
+        max_time : float
+            Wall-clock budget of the run in seconds, counted from the start of optimisation (or of a resumed run).
+        max_evaluations : int
+            Budget of fitness evaluations. The generation during which it is reached is completed, so the final count
+            may exceed it by less than one generation.
+        """
+
+        self.stall_generations = stall_generations
+        self.stall_tol = stall_tol
+        self.min_diversity = min_diversity
+        self.max_time = max_time
+        self.max_evaluations = max_evaluations
+        self.start_time = None
+
+    def start(self):
+
+        """Starts the wall-clock budget."""
+
+        self.start_time = time.perf_counter()
+
+    def check(self, optimizer):
+
+        """Returns the reason the run of the given optimizer should stop, or None if it should go on."""
+
+        history = optimizer.best_fitness_history
+        if self.stall_generations is not None and len(history) > self.stall_generations:
+            if history[-1] - history[-1 - self.stall_generations] <= self.stall_tol:
+                return 'stall'
+
+        if self.min_diversity is not None:
+            if diversity(optimizer.positions, optimizer.lb, optimizer.ub) < self.min_diversity:
+                return 'diversity'
+
+        if self.max_time is not None and self.start_time is not None:
+            if time.perf_counter() - self.start_time >= self.max_time:
+                return 'max_time'
+
+        if self.max_evaluations is not None and optimizer.n_evaluations >= self.max_evaluations:
+            return 'max_evaluations'
+
+        return None
+
+
+def diversity(positions: np.ndarray, lb: np.ndarray, ub: np.ndarray):
+
+    """
+    Spread of a population: the standard deviation of each parameter, as a fraction of the range of its bounds,
+    averaged over the parameters whose bounds are not equal. A uniform random population scores about 0.29.
+    """
+
+    active = ub > lb
+    spread = np.std(positions[:, active], axis=0) / (ub - lb)[active]
+
+    return float(np.mean(spread))
@@ -0,0 +1,160 @@
+import numpy as np
+from numpy.linalg import LinAlgError
+from scipy.interpolate import RBFInterpolator
+from scipy.stats import rankdata, spearmanr
+
+
+class RBFSurrogate:
+    def __init__(self, lb: np.ndarray, ub: np.ndarray, fraction: float = 0.3, exploration: float = 0.1,
+                 min_archive: int = 50, neighbors: int = 50, kernel: str = 'thin_plate_spline'):
+
+        """
+        Radial basis function surrogate of the fitness function, used by DE.optimize to pre-screen trial vectors. The
+        model is fitted to the ranks of the fitnesses in the archive of evaluated parameter vectors, so failure
+        sentinel values (e.g. -1e12) only count as bad rather than distorting the fit.
+
+        Each generation, the trials with the highest predicted fitness (fraction of the population) and a random
+        exploration quota of the remaining trials are evaluated with the real objective. The other trials are
+        discarded without being evaluated.
+
+        Parameters
+        ----------
+        lb : numpy array
+            Lower bounds of the parameters, used to normalise the search space.
+        ub : numpy array
+            Upper bounds of the parameters.
+        fraction : float
+            Fraction of each generation's trials selected on predicted fitness.
+        exploration : float
+            Fraction of each generation's trials selected at random from those not selected on predicted fitness.
+        min_archive : int
+            Number of evaluated vectors needed before trials are screened.
+        neighbors : int
+            Number of nearest archive points used for each prediction.
+        kernel : str
+            RBF kernel (see scipy.interpolate.RBFInterpolator).
+        """
+
+        # parameters with equal bounds are constant and left out of the model
+        self.active = ub > lb
+        self.lb = lb[self.active]
+        self.span = (ub - lb)[self.active]
+        self.fraction = fraction
+        self.exploration = exploration
+        self.min_archive = min_archive
+        self.neighbors = neighbors
+        self.kernel = kernel
+
+        self.x = np.empty((0, self.active.sum()))
+        self.y = np.empty(0)
+
+        self.n_screened = 0
+        self.n_saved = 0
+        self._pending = None
+        self._checked = ([], [])
+
+    def add(self, x: np.ndarray, y: np.ndarray, idx: np.ndarray = None):
+
+        """
+        Adds evaluated parameter vectors and their fitnesses to the archive. idx holds the indices of the vectors among
+        the trials of the last call to screen; their predicted and actual fitnesses are then recorded for stats. Trials
+        selected by screen may be left out (e.g. if a later screen rejected them).
+        """
+
+        if self._pending is not None and idx is not None:
+            selected, predicted = self._pending
+            self._checked[0].append(predicted[np.searchsorted(selected, idx)])
+            self._checked[1].append(y)
+        self._pending = None
+
+        self.x = np.vstack((self.x, (x[:, self.active] - self.lb) / self.span))
+        self.y = np.concatenate((self.y, y))
+
+    def predict(self, x: np.ndarray):
+
+        """Predicts the fitness rank (0 worst, 1 best) of each parameter vector relative to the archive."""
+
+        x_arch, idx = np.unique(self.x, axis=0, return_index=True)
+        y_arch = (rankdata(self.y[idx]) - 1) / max(len(idx) - 1, 1)
+
+        model = RBFInterpolator(x_arch, y_arch, neighbors=min(self.neighbors, len(idx)), kernel=self.kernel,
+                                smoothing=1e-8)
+
+        return model((x[:, self.active] - self.lb) / self.span)
+
+    def screen(self, x: np.ndarray, rng: np.random.Generator):
+
+        """Returns the sorted indices of the trial vectors which should be evaluated with the real objective."""
+
+        n = len(x)
+        if len(self.y) < self.min_archive:
+            return np.arange(n)
+
+        try:
+            predicted = self.predict(x)
+        except LinAlgError:
+            # degenerate archive (e.g. a collapsed population); evaluate everything this generation
+            return np.arange(n)
+        order = np.argsort(-predicted)
+
+        n_best = int(np.ceil(self.fraction * n))
+        n_explore = min(int(np.ceil(self.exploration * n)), n - n_best)
+
+        selected = np.concatenate((order[:n_best], rng.choice(order[n_best:], n_explore, replace=False)))
+        selected = np.sort(selected)
+
+        self.n_screened += n
+        self.n_saved += n - len(selected)
+        self._pending = (selected, predicted[selected])
+
+        return selected
+
+    def state(self):
+
+        """Returns the archive and statistics as a dict of arrays, for checkpoints (see DE.save_checkpoint)."""
+
+        checked = [np.concatenate(c) if c else np.empty(0) for c in self._checked]
+
+        return {'x': self.x, 'y': self.y, 'n_screened': self.n_screened, 'n_saved': self.n_saved,
+                'predicted': checked[0], 'actual': checked[1]}
+
+    def load_state(self, state: dict):
+
+        """Restores the archive and statistics from a dict returned by state."""
+
+        self.x = state['x'].copy()
+        self.y = state['y'].copy()
+        self.n_screened = int(state['n_screened'])
+        self.n_saved = int(state['n_saved'])
+        self._checked = ([state['predicted'].copy()], [state['actual'].copy()]) if len(state['predicted']) else ([], [])
+        self._pending = None
+
+    def stats(self):
+
+        """
+        Returns the number of screened and saved evaluations, and the Spearman rank correlation between predicted and
+        actual fitness of the screened trials that were evaluated.
+        """
+
+        correlation = np.nan
+        if self._checked[0]:
+            correlation = float(spearmanr(np.concatenate(self._checked[0]), np.concatenate(self._checked[1]))[0])
+
+        return {'n_screened': self.n_screened, 'n_saved': self.n_saved, 'rank_correlation': correlation}
+
+
+def compare_histories(baseline: list, history: list):
+
+    """
+    Compares a best-fitness history against a baseline history (e.g. from a run without a surrogate), generation by
+    generation.
+
+    Returns
+    -------
+    Dict with the largest and final absolute gap between the two histories.
+    """
+
+    n = min(len(baseline), len(history))
+    gap = np.abs(np.asarray(baseline[:n], dtype=float) - np.asarray(history[:n], dtype=float))
+
+    return {'max_gap': float(gap.max()), 'final_gap': float(gap[-1])}
@@ -0,0 +1,299 @@
+"""
+Campaigns of drag optimisations over a table of operating conditions, sharing one evaluation pool (and its persistent
+XFOIL sessions) between all cases. Each case starts from the best results of the nearest cases already solved.
+
+    python -m pyoptfoil.campaign cases.csv --bounds bounds.json --alpha-range -1 5 0.5 --pop-size 20 --generations 30
+        --xfoil /opt/xfoil/bin/xfoil --workers 8 --persistent --concurrent 2 --out results.csv
+
+The case table is a CSV file with columns cl_des, re and m, and optionally name.
+"""
+
+from .algorithms.de import DE
+from .algorithms.history import failure_codes
+from .algorithms.stopping import EarlyStopping
+from .utils.evaluators import SerialEvaluator, ParallelEvaluator
+from .opt import opt, _xfoil_executable
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
+import argparse
+import contextlib
+import csv
+import json
+import os
+import sys
+import time
+
+
+def load_cases(path: str):
+
+    """Reads a case table (CSV with columns cl_des, re, m and optionally name) and returns it as a list of dicts."""
+
+    with open(path, newline='') as f:
+        rows = list(csv.DictReader(f))
+
+    return _cases([{key.strip(): value for key, value in row.items()} for row in rows])
+
+
+def _cases(cases):
+    # cases given as dicts or (cl_des, re, m) tuples, with default names
+    checked = []
+    for i, case in enumerate(cases):
+        if not isinstance(case, dict):
+            case = dict(zip(('cl_des', 're', 'm'), case))
+        if not {'cl_des', 're', 'm'} <= set(case):
+            raise ValueError("Every case needs cl_des, re and m")
+        checked.append({'name': str(case.get('name') or 'case_{}'.format(i)), 'cl_des': float(case['cl_des']),
+                        're': float(case['re']), 'm': float(case['m'])})
+
+    if len({case['name'] for case in checked}) < len(checked):
+        raise ValueError("Case names must be unique")
+
+    return checked
+
+
+def case_distance(a: dict, b: dict):
+
+    """Distance between the operating conditions of two cases, measured in (cl_des, log10(re), m)."""
+
+    return float(np.sqrt((a['cl_des'] - b['cl_des']) ** 2 + np.log10(a['re'] / b['re']) ** 2 + (a['m'] - b['m']) ** 2))
+
+
+def _seeds(case, solved: dict, n_seeds: int, n_neighbours: int):
+    # best parameter vectors of the nearest solved cases, taken from each of them in turn
+    if n_seeds == 0 or not solved:
+        return None, []
+
+    neighbours = sorted(solved, key=lambda name: case_distance(case, solved[name]['case']))[:n_neighbours]
+    ranked = [solved[name]['ranked'] for name in neighbours]
+    seeds = [positions[i] for i in range(max(map(len, ranked))) for positions in ranked if i < len(positions)]
+
+    return np.array(seeds[:n_seeds]), neighbours
+
+
+def _next_case(pending: list, started: list):
+    # the pending case nearest to any started case, so that neighbours are solved close together
+    if not started:
+        return pending[0]
+
+    return min(pending, key=lambda case: min(case_distance(case, other) for other in started))
+
+
+def _write_table(path: str, rows: list):
+    fieldnames = list(rows[0])
+    with open(path + '.tmp', 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(path + '.tmp', path)
+
+
+def run_campaign(cases: list, bounds: dict, pop_size: int, n_generations: int, alpha_range: tuple,
+                 xfoil_path: str = 'xfoil.exe', param_method: str = 'BP3333', f: float = 0.85, cr: float = 0.9,
+                 itermax: int = 100, n_workers: int = 1, persistent: bool = False, evaluator=None,
+                 n_concurrent: int = 1, warm_start: float = 0.5, n_neighbours: int = 2, stopping: dict = None,
+                 seed: int = None, results_path: str = None, de_options: dict = None, opt_options: dict = None,
+                 verbose: bool = False):
+
+    """
+    Runs a DE drag optimisation (see opt) for every case of a campaign, over one evaluation pool shared by all cases.
+
+    Cases are started nearest first: after the first case of the table, the next case is always the one closest (see
+    case_distance) to a case already started. The initial population of each case is seeded with the best parameter
+    vectors of the final populations of the nearest cases solved so far, which speeds up convergence (particularly with
+    stopping rules, which then end the run early). With n_concurrent > 1 several cases run at once, so that the pool is
+    kept busy while a case waits for the last evaluations of a generation.
+
+    Parameters
+    ----------
+    cases : list
+        Operating conditions, as dicts with keys cl_des, re, m and optionally name (see load_cases), or as
+        (cl_des, re, m) tuples.
+    bounds : dict
+        Lower and upper bounds of parameters in the search space.
+    pop_size : int
+        Population size of every case.
+    n_generations : int
+        Largest number of generations of every case.
+    alpha_range : tuple
+        Incidence range (alpha_start, alpha_stop, alpha_increment).
+    xfoil_path : str
+        Path of XFOIL executable file.
+    param_method : str
+        Parametrisation method.
+    f : float
+        Differential weight/mutation factor.
+    cr : float
+        Crossover probability.
+    itermax : int
+        XFOIL viscous solution iteration limit.
+    n_workers : int
+        Number of worker processes of the shared pool.
+    persistent : bool
+        Keeps one XFOIL process alive per worker for the whole campaign (see XfoilSession).
+    evaluator : Broker
+        Evaluator shared by all cases instead of a pool of n_workers, e.g. a utils.distributed.Broker. It is not
+        closed at the end of the campaign.
+    n_concurrent : int
+        Number of cases run at the same time. Values above 1 need worker processes (n_workers > 1 or an evaluator).
+    warm_start : float
+        Fraction of each initial population seeded from solved cases. The rest is sampled as usual.
+    n_neighbours : int
+        Number of nearest solved cases from which seeds are taken.
+    stopping : dict
+        Keyword arguments of the EarlyStopping rules given to every case (see algorithms.stopping).
+    seed : int
+        Seed of the random number generators; case i uses seed + i.
+    results_path : str
+        Path of a CSV file to which the results table is written, and rewritten every time a case finishes.
+    de_options : dict
+        Further keyword arguments of every DE (e.g. adaptation or sampler).
+    opt_options : dict
+        Further keyword arguments of every call of opt (e.g. target_cl, cache or solver). Every case runs in a thread
+        of its own, so the cache is shared between threads and a callback is called from them. A surrogate or a
+        checkpoint, which belong to a single run, cannot be given.
+    verbose : bool
+        Shows the output of every run, instead of only one line per finished case.
+
+    Returns
+    -------
+    List with a dict of results for every case, in the order of cases: the conditions, best fitness and drag
+    coefficient, number of evaluations and generations, stop reason, number of seeded population members and the cases
+    they came from, run time and best parameters.
+    """
+
+    cases = _cases(cases)
+    if n_concurrent > 1 and evaluator is None and n_workers <= 1:
+        raise ValueError("Concurrent cases require worker processes (n_workers > 1) or an evaluator")
+    if n_concurrent > 1 and (opt_options or {}).get('asynchronous'):
+        raise ValueError("Asynchronous runs cannot share the evaluator with concurrent cases")
+    if opt_options and {'evaluator', 'n_workers', 'persistent'} & set(opt_options):
+        raise ValueError("The evaluator, n_workers and persistent are set for the whole campaign")
+    # the cases run in threads of their own, so only objects safe to share between threads and cases can be passed on
+    if opt_options and {'surrogate', 'checkpoint'} & set(opt_options):
+        raise ValueError("A surrogate or checkpoint would be shared by every case of the campaign")
+
+    owned = evaluator is None
+    if owned:
+        xfoil_path = _xfoil_executable(xfoil_path, n_workers, persistent, None)
+        evaluator = ParallelEvaluator(n_workers) if n_workers > 1 else SerialEvaluator()
+
+    n_seeds = int(round(warm_start * pop_size))
+    index = {case['name']: i for i, case in enumerate(cases)}
+    solved = {}
+    results = {}
+    out = sys.stdout
+
+    def run_case(case, seeds):
+        i = index[case['name']]
+        optimizer = DE(bounds, pop_size, n_generations, param_method, f, cr,
+                       seed=None if seed is None else seed + i, initial_positions=seeds,
+                       stopping=None if stopping is None else EarlyStopping(**stopping), **(de_options or {}))
+        start = time.perf_counter()
+        opt(optimizer, case['cl_des'], case['re'], case['m'], alpha_range, xfoil_path, itermax, persistent=persistent,
+            evaluator=evaluator, **(opt_options or {}))
+
+        return optimizer, time.perf_counter() - start
+
+    def finished(case, neighbours, optimizer, duration):
+        valid = failure_codes(optimizer.fitnesses) == 0
+        order = np.argsort(-optimizer.fitnesses[valid], kind='stable')
+        solved[case['name']] = {'case': case, 'ranked': optimizer.positions[valid][order]}
+
+        fitness = float(optimizer.best_individual.fitness)
+        cd = -fitness if failure_codes(np.array([fitness]))[0] == 0 else float('nan')
+        results[case['name']] = dict(case, fitness=fitness, cd=cd, n_evaluations=optimizer.n_evaluations,
+                                     n_generations=len(optimizer.best_fitness_history),
+                                     stop_reason=optimizer.stop_reason, n_seeded=optimizer.n_seeded,
+                                     seeded_from=';'.join(neighbours), time=round(duration, 3),
+                                     **{key: float(value) for key, value in optimizer.best_individual.position.items()})
+
+        print('{:<24} cl_des={:<6g} re={:<9g} m={:<5g} fitness={:.6g} ({} evaluations, {:.1f} s)'.format(
+            case['name'], case['cl_des'], case['re'], case['m'], fitness, optimizer.n_evaluations, duration), file=out)
+        if results_path is not None:
+            _write_table(results_path, [results[c['name']] for c in cases if c['name'] in results])
+
+    pending = list(cases)
+    started = []
+    running = {}
+    try:
+        with contextlib.ExitStack() as stack:
+            if not verbose:
+                stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, 'w'))))
+            executor = stack.enter_context(ThreadPoolExecutor(n_concurrent))
+
+            while pending or running:
+                while pending and len(running) < n_concurrent:
+                    case = _next_case(pending, started)
+                    pending.remove(case)
+                    started.append(case)
+                    seeds, neighbours = _seeds(case, solved, n_seeds, n_neighbours)
+                    running[executor.submit(run_case, case, seeds)] = (case, neighbours)
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    case, neighbours = running.pop(future)
+                    finished(case, neighbours, *future.result())
+    finally:
+        if owned:
+            evaluator.close()
+
+    return [results[case['name']] for case in cases]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs a campaign of pyoptfoil drag optimisations over a case table")
+    parser.add_argument('cases', help='CSV case table with columns cl_des, re, m and optionally name')
+    parser.add_argument('--bounds', required=True, help='JSON file of parameter bounds, {"name": [lower, upper]}')
+    parser.add_argument('--alpha-range', type=float, nargs=3, required=True, metavar=('START', 'STOP', 'STEP'))
+    parser.add_argument('--pop-size', type=int, default=20)
+    parser.add_argument('--generations', type=int, default=30)
+    parser.add_argument('--param-method', default='BP3333')
+    parser.add_argument('--f', type=float, default=0.85, help='DE differential weight')
+    parser.add_argument('--cr', type=float, default=0.9, help='DE crossover probability')
+    parser.add_argument('--adaptation', default=None, choices=('jde', 'shade'))
+    parser.add_argument('--xfoil', default='xfoil.exe', help='XFOIL executable')
+    parser.add_argument('--itermax', type=int, default=100)
+    parser.add_argument('--solver', default='xfoil', choices=('xfoil', 'panel'))
+    parser.add_argument('--target-cl', action='store_true', help='solve directly for cl_des (see opt)')
+    parser.add_argument('--workers', type=int, default=1, help='worker processes of the shared pool')
+    parser.add_argument('--persistent', action='store_true', help='keep XFOIL processes alive between evaluations')
+    parser.add_argument('--listen', default=None, metavar='HOST:PORT',
+                        help='evaluate on distributed workers connecting to a broker at this address instead')
+    parser.add_argument('--authkey', default=None, help='broker authentication key (default: $PYOPTFOIL_AUTHKEY)')
+    parser.add_argument('--min-workers', type=int, default=1, help='distributed workers to wait for before starting')
+    parser.add_argument('--concurrent', type=int, default=1, help='cases run at the same time')
+    parser.add_argument('--warm-start', type=float, default=0.5, help='seeded fraction of each initial population')
+    parser.add_argument('--neighbours', type=int, default=2, help='solved cases from which seeds are taken')
+    parser.add_argument('--stall-generations', type=int, default=None, help='stop a case after this many generations '
+                                                                             'without improvement')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--out', default='campaign_results.csv', help='results table')
+    parser.add_argument('--verbose', action='store_true', help='show the output of every run')
+    args = parser.parse_args()
+
+    with open(args.bounds) as f:
+        bounds = json.load(f)
+
+    evaluator = None
+    if args.listen is not None:
+        from .utils.distributed import Broker
+
+        host, port = args.listen.rsplit(':', 1)
+        evaluator = Broker(host, int(port), args.authkey)
+        print('Waiting for {} workers at {}:{}'.format(args.min_workers, *evaluator.address))
+        evaluator.wait_for_workers(args.min_workers)
+
+    stopping = None if args.stall_generations is None else {'stall_generations': args.stall_generations}
+    opt_options = {'solver': args.solver, 'target_cl': args.target_cl}
+    try:
+        run_campaign(load_cases(args.cases), bounds, args.pop_size, args.generations, tuple(args.alpha_range),
+                     args.xfoil, args.param_method, args.f, args.cr, args.itermax, args.workers, args.persistent,
+                     evaluator, args.concurrent, args.warm_start, args.neighbours, stopping, args.seed, args.out,
+                     {'adaptation': args.adaptation}, opt_options, args.verbose)
+    finally:
+        if evaluator is not None:
+            evaluator.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,19 @@
 import numpy as np
+from .algorithms.base import Optimizer, create_optimizer
 from .algorithms.de import DE
+from .aerofoil import Aerofoil
+from .parameterizations.bezier_parsec import BP3333Batch, _interp_rows
+from .utils.evaluators import SerialEvaluator, ParallelEvaluator
+from .utils.timing import timings
+from scipy.optimize import least_squares
+from functools import partial
+import csv
+import os
 
 
 def _aerofoil_similarity(x_u, y_u, x_l, y_l, aerofoil):
     if aerofoil.parameterization.constraint_violation:
+        timings.event('constraint_violation')
         return -np.inf
     else:
         y_u_trial = np.interp(x_u, aerofoil.x_u, aerofoil.y_u)
@@ -11,15 +21,109 @@ def _aerofoil_similarity(x_u, y_u, x_l, y_l, aerofoil):
         return -(np.linalg.norm(y_l - y_l_trial) + np.linalg.norm(y_u - y_u_trial))
 
 
-def fit(optimizer: DE, x_u: np.ndarray, y_u: np.ndarray, x_l: np.ndarray, y_l: np.ndarray):
+def _batch_residuals(x_u, y_u, x_l, y_l, keys, positions):
+    # upper and lower surface residuals of every BP3333 shape of a batch (nan rows for constraint violations)
+    batch = BP3333Batch(positions, keys)
+    residuals = np.full((len(positions), len(x_u) + len(x_l)), np.nan)
+
+    rows = batch.feasible
+    if rows.any():
+        x_u_trial, y_u_trial, x_l_trial, y_l_trial = (a[rows] for a in batch.xy())
+        n = int(rows.sum())
+        residuals[rows, :len(x_u)] = y_u - _interp_rows(np.broadcast_to(x_u, (n, len(x_u))), x_u_trial, y_u_trial)
+        residuals[rows, len(x_u):] = y_l - _interp_rows(np.broadcast_to(x_l, (n, len(x_l))), x_l_trial, y_l_trial)
+
+    return residuals
+
+
+def _batch_similarity(x_u, y_u, x_l, y_l, keys, positions):
+    # vectorised _aerofoil_similarity of a batch of parameter vectors with the given parameter names
+    residuals = _batch_residuals(x_u, y_u, x_l, y_l, keys, positions)
+
+    fitnesses = -(np.linalg.norm(residuals[:, :len(x_u)], axis=1) + np.linalg.norm(residuals[:, len(x_u):], axis=1))
+    violations = np.isnan(fitnesses)
+    if violations.any():
+        timings.event('constraint_violation', int(violations.sum()))
+        fitnesses[violations] = -np.inf
+
+    return fitnesses
+
+
+def polish(optimizer: Optimizer, x_u: np.ndarray, y_u: np.ndarray, x_l: np.ndarray, y_l: np.ndarray):
+
+    """
+    Refines the best individual of a finished fit with a bounded least-squares fit (scipy.optimize.least_squares) of
+    the surface residuals, starting from its parameters. The Jacobian is computed by forward differences of all
+    parameters in a single batched geometry evaluation. The polished shape replaces optimizer.best_individual if its
+    fitness is better.
+
+    Parameters
+    ----------
+    optimizer : Optimizer
+        Optimisation algorithm object after a fit.
+    x_u : numpy array
+        Upper surface x coordinates of target aerofoil.
+    y_u : numpy array
+        Upper surface y coordinates of target aerofoil.
+    x_l : numpy array
+        Lower surface x coordinates of target aerofoil.
+    y_l : numpy array
+        Lower surface y coordinates of target aerofoil.
+
+    Returns
+    -------
+    Best individual after polishing.
+    """
+
+    keys = list(optimizer.bounds.keys())
+    x0 = np.array([optimizer.best_individual.position[k] for k in keys], dtype=float)
+
+    # parameters with equal bounds are held fixed
+    active = optimizer.ub > optimizer.lb
+    lb, ub = optimizer.lb[active], optimizer.ub[active]
+    step = 1e-7 * (ub - lb)
+
+    def positions(z):
+        x = np.tile(x0, (len(z), 1))
+        x[:, active] = z
+        return x
+
+    def residuals(z):
+        r = _batch_residuals(x_u, y_u, x_l, y_l, keys, positions(z))
+        # shapes violating the constraints get a residual far larger than any feasible one
+        return np.where(np.isnan(r), 1.0, r)
+
+    def jac(z):
+        # forward steps, taken backwards at the upper bounds
+        h = np.where(z + step > ub, -step, step)
+        r = residuals(np.vstack((z, z + np.diag(h))))
+        return ((r[1:] - r[0]) / h[:, None]).T
+
+    with timings.stage('polish'):
+        result = least_squares(lambda z: residuals(z[None])[0], np.clip(x0[active], lb, ub), jac=jac, bounds=(lb, ub))
+
+    polished = positions(result.x[None])
+    fitness = _batch_similarity(x_u, y_u, x_l, y_l, keys, polished)[0]
+    if fitness > optimizer.best_individual.fitness:
+        optimizer.best_individual = Aerofoil('Polished Best Individual', optimizer.param_method,
+                                             dict(zip(keys, polished[0])))
+        optimizer.best_individual.fitness = fitness
+
+    return optimizer.best_individual
+
+
+def fit(optimizer: Optimizer, x_u: np.ndarray, y_u: np.ndarray, x_l: np.ndarray, y_l: np.ndarray, n_workers: int = 1,
+        callback=None, checkpoint: str = None, vectorized: bool = False, polish_best: bool = False,
+        optimizer_options: dict = None):
 
     """
     Runs optimisation algorithm to obtain parameters which best fit the given target aerofoil coordinates.
 
     Parameters
     ----------
-    optimizer : DE
-        Optimisation algorithm object.
+    optimizer : Optimizer or str
+        Optimisation algorithm object (e.g. DE or CMAES), or the name under which an optimizer engine is registered
+        (see algorithms.base.create_optimizer).
     x_u : numpy array
         Upper surface x coordinates of target aerofoil.
     y_u : numpy array
@@ -28,7 +132,123 @@ def fit(optimizer: DE, x_u: np.ndarray, y_u: np.ndarray, x_l: np.ndarray, y_l: n
         Lower surface x coordinates of target aerofoil.
     y_l : numpy array
         Lower surface y coordinates of target aerofoil.
+    n_workers : int
+        Number of worker processes used to evaluate each generation.
+    callback : function
+        Called with a summary dict at the end of every generation (see DE.report).
+    checkpoint : str
+        Path of a .npz file to which the state of the run is saved every generation. If the file already exists, the
+        run is resumed from it (see DE.resume).
+    vectorized : bool
+        Scores every generation in one batched array operation (see DE.optimize_batch) instead of one Aerofoil at a
+        time. Only for the BP3333 parametrisation; n_workers and checkpoint are then ignored.
+    polish_best : bool
+        Refines the best individual with a bounded least-squares fit after the optimisation (see polish).
+    optimizer_options : dict
+        Keyword arguments with which the optimizer is created if it is given by name.
+
+    Returns
+    -------
+    Optimisation algorithm object, holding the results of the run.
     """
 
-    def func(a): return _aerofoil_similarity(x_u, y_u, x_l, y_l, a)
-    optimizer.optimize(func)
+    if isinstance(optimizer, str):
+        optimizer = create_optimizer(optimizer, **(optimizer_options or {}))
+    if checkpoint is not None and not isinstance(optimizer, DE):
+        raise ValueError("Checkpoints require DE")
+
+    if vectorized:
+        optimizer.optimize_batch(partial(_batch_similarity, x_u, y_u, x_l, y_l, list(optimizer.bounds.keys())),
+                                 callback)
+        if polish_best:
+            polish(optimizer, x_u, y_u, x_l, y_l)
+        return optimizer
+
+    if n_workers > 1:
+        evaluator = ParallelEvaluator(n_workers)
+    else:
+        evaluator = SerialEvaluator()
+
+    func = partial(_aerofoil_similarity, x_u, y_u, x_l, y_l)
+
+    with evaluator:
+        if checkpoint is None:
+            optimizer.optimize(func, evaluator, callback)
+        elif os.path.exists(checkpoint):
+            optimizer.resume(checkpoint, func, evaluator, callback)
+        else:
+            optimizer.optimize(func, evaluator, callback, checkpoint=checkpoint)
+    if polish_best:
+        polish(optimizer, x_u, y_u, x_l, y_l)
+
+    return optimizer
+
+
+def _fit_target(bounds, pop_size, n_generations, f, cr, polish_best, job):
+    # fits a single target of fit_many in the vectorised mode and returns its row of the results table
+    seed, name, x_u, y_u, x_l, y_l = job
+    optimizer = DE(bounds, pop_size, n_generations, 'BP3333', f, cr, seed)
+    fit(optimizer, x_u, y_u, x_l, y_l, vectorized=True, polish_best=polish_best)
+
+    position = np.array([optimizer.best_individual.position[k] for k in bounds], dtype=float)
+    residuals = _batch_residuals(x_u, y_u, x_l, y_l, list(bounds), position[None])[0]
+
+    return {'name': name, **dict(zip(bounds, position)), 'fitness': float(optimizer.best_individual.fitness),
+            'rms_residual': float(np.sqrt(np.mean(residuals ** 2))), 'max_residual': float(np.abs(residuals).max()),
+            'n_evaluations': optimizer.n_evaluations}
+
+
+def fit_many(targets: list, bounds: dict, pop_size: int, n_generations: int, f: float, cr: float, seed: int = None,
+             polish_best: bool = True, n_workers: int = 1, csv_path: str = None):
+
+    """
+    Fits the BP3333 parametrisation to many target aerofoils, each with its own vectorised DE run (see fit), spread
+    across worker processes.
+
+    Parameters
+    ----------
+    targets : list
+        (name, x_u, y_u, x_l, y_l) tuple of every target aerofoil.
+    bounds : dict
+        Lower and upper bounds of parameters in the search space.
+    pop_size : int
+        Population size.
+    n_generations : int
+        Total number of generations of each fit.
+    f : float
+        Differential weight/mutation factor.
+    cr : float
+        Crossover probability.
+    seed : int
+        Seed of the first fit; target i is fitted with seed + i. Fits are not reproducible if None.
+    polish_best : bool
+        Refines the result of every fit with a bounded least-squares fit (see polish).
+    n_workers : int
+        Number of worker processes, each of which fits whole targets.
+    csv_path : str
+        Path of a CSV file to which the results table is written.
+
+    Returns
+    -------
+    Results table as a list of dicts, one per target, with the fitted parameters, fitness, RMS and maximum residual
+    and number of evaluations.
+    """
+
+    jobs = [(None if seed is None else seed + i, *target) for i, target in enumerate(targets)]
+    func = partial(_fit_target, bounds, pop_size, n_generations, f, cr, polish_best)
+
+    if n_workers > 1:
+        evaluator = ParallelEvaluator(n_workers)
+    else:
+        evaluator = SerialEvaluator(verbose=False)
+
+    with evaluator:
+        table = evaluator.evaluate(func, jobs)
+
+    if csv_path is not None:
+        with open(csv_path, 'w', newline='') as f_csv:
+            writer = csv.DictWriter(f_csv, fieldnames=list(table[0]))
+            writer.writeheader()
+            writer.writerows(table)
+
+    return table
@@ -1,51 +1,301 @@
+from .algorithms.base import Optimizer, create_optimizer
 from .algorithms.de import DE
-from .aerofoil import Aerofoil
-from .utils.xfoil_tools import write_dat, run_xfoil, read_out
+from .algorithms.multifidelity import MultiFidelity
+from .aerofoil import Aerofoil, DEFAULT_POINTS
+from .algorithms.history import failure_codes
+from .utils.xfoil_tools import (write_dat, run_xfoil, run_xfoil_sweeps, read_out, read_polar, scratch_dir,
+                                shared_session, POLAR_COLUMNS, _discard)
+from .utils.evaluators import SerialEvaluator, ParallelEvaluator
+from .utils.cache import FitnessCache, CachedEvaluator
+from .utils.panel import DEFAULT_PANELS, InviscidSolution, PanelFilterEvaluator, contour
+from .utils.timing import timings
 import numpy as np
 from scipy.interpolate import CubicSpline
+from functools import partial
 import os
+import shutil
+
+
+def _xfoil_polar(xfoil_path: str, aerofoil: Aerofoil, alpha_range: tuple, re: float, m: float, itermax: int,
+                 persistent: bool, n_panels: int, target: tuple = None):
+    # polar of one XFOIL run, in the persistent session of this process or in a new XFOIL process working in the
+    # scratch directory of this process
+    if persistent:
+        return shared_session(xfoil_path).run(aerofoil, alpha_range, re, m, itermax, n_panels, target)
+
+    workdir = scratch_dir()
+    polar_path = os.path.join(workdir, 'xfoil.out')
+    with timings.stage('write_dat'):
+        write_dat(aerofoil, os.path.join(workdir, 'xfoil.dat'))
+    try:
+        with timings.stage('run_xfoil'):
+            run_xfoil(xfoil_path, 'xfoil.dat', alpha_range, re, m, itermax, n_panels, target, workdir)
+        with timings.stage('read_out'):
+            return read_out(polar_path, remove=True)
+    except BaseException:
+        # a polar left behind by a failed run would be appended to by the next one
+        _discard(polar_path)
+        raise
+
+
+def _target_drag(cl_des: float, re: float, m: float, alpha_range: tuple, xfoil_path: str, itermax: int,
+                 aerofoil: Aerofoil, persistent: bool, n_panels: int):
+    # thin aerofoil estimate of the design incidence, used as the warm-start point of the prescribed-Cl solve
+    alpha_start = float(np.clip(np.degrees(cl_des / (2 * np.pi)), alpha_range[0], alpha_range[1]))
+    target = (round(alpha_start, 2), cl_des)
+
+    try:
+        arr = _xfoil_polar(xfoil_path, aerofoil, alpha_range, re, m, itermax, persistent, n_panels, target)
+    except:
+        return None
+
+    # XFOIL only saves converged points, so a row at cl_des means the prescribed-Cl solve converged
+    converged = np.abs(arr[:, 1] - cl_des) < 1e-3
+    if not converged.any():
+        return None
+
+    return float(arr[converged][-1, 2])
 
 
 def _drag_reward(cl_des: float, re: float, m: float, alpha_range: tuple, xfoil_path: str, itermax: int,
-                 aerofoil: Aerofoil):
+                 aerofoil: Aerofoil, persistent: bool = False, n_panels: int = None, target_cl: bool = False,
+                 geometry: dict = None):
     if aerofoil.parameterization.constraint_violation:
+        timings.event('constraint_violation')
         return -np.inf
 
+    if geometry is not None:
+        aerofoil = aerofoil.resampled(**geometry)
+
+    if target_cl:
+        cd_des = _target_drag(cl_des, re, m, alpha_range, xfoil_path, itermax, aerofoil, persistent, n_panels)
+        if cd_des is not None:
+            timings.event('converged_target')
+            return -cd_des
+        # falls back to the incidence sweep
+        timings.event('target_fallback')
+
     try:
-        write_dat(aerofoil)
-        proc = run_xfoil(xfoil_path, 'xfoil.dat', alpha_range, re, m, itermax)
-        arr = read_out()
-        os.remove('xfoil.out')
+        arr = _xfoil_polar(xfoil_path, aerofoil, alpha_range, re, m, itermax, persistent, n_panels)
     except:
+        timings.event('xfoil_failed')
         return -1e12
 
+    return _interpolated_drag(arr, cl_des)[0]
+
+
+def _interpolated_drag(arr: np.ndarray, cl_des: float):
+    # drag at cl_des interpolated from an incidence sweep, returned as (fitness, incidence); the fitness is a failure
+    # sentinel and the incidence None if the polar cannot be used
     try:
         alpha = arr[:, 0]
         cl = arr[:, 1]
         cd = arr[:, 2]
+        if len(arr) < 2:
+            raise ValueError("Too few converged points")
     except:
-        return -1e11
+        timings.event('polar_unreadable')
+        return -1e11, None
 
     try:
-        alpha = alpha[np.argmin(cl):np.argmax(cl) + 1]
-        cl = cl[np.argmin(cl):np.argmax(cl) + 1]
-        cd = cd[np.argmin(cl):np.argmax(cl) + 1]
-
-        lift_spline = CubicSpline(cl, alpha)
-        alpha_req = float(lift_spline(cl_des, extrapolate=False))
-        drag_spline = CubicSpline(alpha, cd)
-        cd_des = float(drag_spline(alpha_req, extrapolate=False))
+        with timings.stage('post_processing'):
+            alpha = alpha[np.argmin(cl):np.argmax(cl) + 1]
+            cl = cl[np.argmin(cl):np.argmax(cl) + 1]
+            cd = cd[np.argmin(cl):np.argmax(cl) + 1]
+
+            lift_spline = CubicSpline(cl, alpha)
+            alpha_req = float(lift_spline(cl_des, extrapolate=False))
+            drag_spline = CubicSpline(alpha, cd)
+            cd_des = float(drag_spline(alpha_req, extrapolate=False))
     except:
-        return -1e9
+        timings.event('interpolation_failed')
+        return -1e9, None
 
     if np.isnan(cd_des):
+        timings.event('cl_des_out_of_range')
+        return -1e8, None
+    else:
+        timings.event('converged')
+        return -cd_des, alpha_req
+
+
+def _panel_reward(cl_des: float, re: float, alpha_range: tuple, aerofoil: Aerofoil, n_panels: int = DEFAULT_PANELS):
+    if aerofoil.parameterization.constraint_violation:
+        timings.event('constraint_violation')
+        return -np.inf
+
+    solution = InviscidSolution(*contour([aerofoil], n_panels))
+    alpha = solution.alpha(cl_des)
+    if not alpha_range[0] <= alpha[0] <= alpha_range[1]:
+        timings.event('cl_des_out_of_range')
         return -1e8
+
+    timings.event('converged')
+    return -float(solution.drag(alpha, re)[0])
+
+
+def multipoint_drag(aerofoil: Aerofoil, conditions: list, alpha_range: tuple, xfoil_path: str = 'xfoil.exe',
+                    itermax: int = 100, persistent: bool = False, n_panels: int = None, solver: str = 'xfoil',
+                    geometry: dict = None):
+
+    """
+    Evaluates the drag of an aerofoil at several operating conditions and combines the results into one fitness.
+
+    XFOIL is run once per aerofoil: the coordinates are loaded and panelled once, and one incidence sweep is run for
+    every distinct (re, m) pair, each saved to its own polar file. Conditions which share a Reynolds and Mach number
+    are interpolated from the same sweep.
+
+    Parameters
+    ----------
+    aerofoil : Aerofoil
+        Aerofoil to evaluate.
+    conditions : list
+        (cl_des, re, m, weight) of every operating condition.
+    alpha_range : tuple
+        Incidence range (alpha_start, alpha_stop, alpha_increment) of every sweep.
+    xfoil_path : str
+        Path of XFOIL executable file.
+    itermax : int
+        XFOIL viscous solution iteration limit.
+    persistent : bool
+        Runs the sweeps in the persistent XFOIL session of the current process (see XfoilSession).
+    n_panels : int
+        Number of panel nodes. Defaults to XFOIL's default paneling, or 120 panels with the panel solver.
+    solver : str
+        'xfoil', or 'panel' for the built-in inviscid panel solver (see opt).
+    geometry : dict
+        Resolution of the coordinates written for XFOIL (see opt).
+
+    Returns
+    -------
+    Fitness, and a list with a dict for every condition holding cl_des, re, m, weight, fitness, and the cd, alpha,
+    cdp, cm, top_xtr and bot_xtr of the design point (None if the condition failed; the last four are also None with
+    the panel solver). The fitness is -sum(weight * cd) if every condition succeeded, otherwise the lowest
+    failure sentinel of the failed conditions (see algorithms.history.FAILURES).
+    """
+
+    if aerofoil.parameterization.constraint_violation:
+        timings.event('constraint_violation')
+        results = [(-np.inf, None, None)] * len(conditions)
+    elif solver == 'panel':
+        solution = InviscidSolution(*contour([aerofoil], DEFAULT_PANELS if n_panels is None else n_panels))
+        results = []
+        for cl_des, re, m, weight in conditions:
+            alpha = solution.alpha(cl_des)
+            if alpha_range[0] <= alpha[0] <= alpha_range[1]:
+                timings.event('converged')
+                results.append((-float(solution.drag(alpha, re)[0]), float(alpha[0]), None))
+            else:
+                timings.event('cl_des_out_of_range')
+                results.append((-1e8, None, None))
     else:
-        return -cd_des
+        if geometry is not None:
+            aerofoil = aerofoil.resampled(**geometry)
+        flows = list(dict.fromkeys((re, m) for _, re, m, _ in conditions))
+        workdir = None if persistent else scratch_dir()
+        polar_names = ['xfoil_{}.out'.format(i) for i in range(len(flows))]
+        try:
+            if persistent:
+                polars = shared_session(xfoil_path).run_sweeps(aerofoil, [(alpha_range, re, m) for re, m in flows],
+                                                               itermax, n_panels)
+            else:
+                with timings.stage('write_dat'):
+                    write_dat(aerofoil, os.path.join(workdir, 'xfoil.dat'))
+                with timings.stage('run_xfoil'):
+                    run_xfoil_sweeps(xfoil_path, 'xfoil.dat', [(alpha_range, re, m, polar_name) for (re, m), polar_name
+                                                               in zip(flows, polar_names)], itermax, n_panels, workdir)
+                with timings.stage('read_out'):
+                    polars = [read_polar(os.path.join(workdir, polar_name), remove=True) for polar_name in polar_names]
+        except:
+            polars = [None] * len(flows)
+            if not persistent:
+                for polar_name in polar_names:
+                    _discard(os.path.join(workdir, polar_name))
+
+        results = []
+        for cl_des, re, m, weight in conditions:
+            polar = polars[flows.index((re, m))]
+            if polar is None:
+                timings.event('xfoil_failed')
+                results.append((-1e12, None, None))
+            else:
+                results.append(_interpolated_drag(polar, cl_des) + (polar,))
+
+    breakdown = []
+    for (cl_des, re, m, weight), (fitness, alpha, polar) in zip(conditions, results):
+        point = {'cl_des': cl_des, 're': re, 'm': m, 'weight': weight, 'fitness': float(fitness),
+                 'cd': None if alpha is None else -float(fitness), 'alpha': None if alpha is None else float(alpha)}
+        # the other polar columns are interpolated linearly at the design incidence
+        for i, name in enumerate(POLAR_COLUMNS[3:], 3):
+            point[name] = None if alpha is None or polar is None else float(np.interp(alpha, polar[:, 0], polar[:, i]))
+        breakdown.append(point)
+
+    fitnesses = np.array([fitness for fitness, _, _ in results], dtype=float)
+    failed = failure_codes(fitnesses) != 0
+    if failed.any():
+        return float(fitnesses[failed].min()), breakdown
+
+    return float(np.dot([weight for _, _, _, weight in conditions], fitnesses)), breakdown
+
+
+def _multipoint_reward(conditions: list, alpha_range: tuple, xfoil_path: str, itermax: int, aerofoil: Aerofoil,
+                       persistent: bool = False, solver: str = 'xfoil', geometry: dict = None):
+    return multipoint_drag(aerofoil, conditions, alpha_range, xfoil_path, itermax, persistent, solver=solver,
+                           geometry=geometry)[0]
+
 
+def _multipoint_breakdown(conditions: list, alpha_range: tuple, xfoil_path: str, itermax: int, aerofoil: Aerofoil,
+                          persistent: bool = False, solver: str = 'xfoil', geometry: dict = None):
+    return multipoint_drag(aerofoil, conditions, alpha_range, xfoil_path, itermax, persistent, solver=solver,
+                           geometry=geometry)[1]
 
-def opt(optimizer: DE, cl_des: float, re: float, m: float, alpha_range: tuple, xfoil_path: str = 'xfoil.exe',
-        itermax: int = 100):
+
+def _geometry_context(geometry: dict):
+    # cache context entry of a non-default coordinate resolution
+    if geometry is None:
+        return ()
+    return 'geometry', geometry.get('n_points', DEFAULT_POINTS), geometry.get('spacing', 'uniform')
+
+
+def _check_modes(optimizer, asynchronous, surrogate, low_fidelity, checkpoint):
+    if not isinstance(optimizer, DE) and (asynchronous or surrogate is not None or low_fidelity is not None or
+                                          checkpoint is not None):
+        raise ValueError("Asynchronous runs, surrogate and low-fidelity pre-screening and checkpoints require DE")
+    if asynchronous and (surrogate is not None or low_fidelity is not None or checkpoint is not None):
+        raise ValueError("Surrogate and low-fidelity pre-screening and checkpoints require synchronous generations")
+
+
+def _xfoil_executable(xfoil_path, n_workers, persistent, evaluator):
+    if evaluator is not None:
+        # XFOIL is then run on other machines, which resolve the path themselves
+        return xfoil_path
+    if n_workers > 1 or persistent:
+        # XFOIL is then run from other directories, so a relative executable path has to be resolved here
+        return os.path.abspath(shutil.which(xfoil_path) or xfoil_path)
+    return xfoil_path
+
+
+def _run(optimizer, func, evaluator, callback, surrogate, asynchronous, fidelity, checkpoint, close=True):
+    # runs the optimizer in the requested mode and closes the evaluator unless it belongs to the caller
+    try:
+        if asynchronous:
+            optimizer.optimize_async(func, evaluator, callback=callback)
+        elif checkpoint is not None and os.path.exists(checkpoint):
+            optimizer.resume(checkpoint, func, evaluator, callback, surrogate, fidelity)
+        elif isinstance(optimizer, DE):
+            optimizer.optimize(func, evaluator, callback, surrogate, fidelity, checkpoint)
+        else:
+            optimizer.optimize(func, evaluator, callback)
+    finally:
+        if close:
+            evaluator.close()
+
+
+def opt(optimizer: Optimizer, cl_des: float, re: float, m: float, alpha_range: tuple, xfoil_path: str = 'xfoil.exe',
+        itermax: int = 100, n_workers: int = 1, persistent: bool = False, cache: FitnessCache = None,
+        callback=None, surrogate=None, asynchronous: bool = False, low_fidelity: dict = None,
+        target_cl: bool = False, prefilter: dict = None, solver: str = 'xfoil', checkpoint: str = None,
+        optimizer_options: dict = None, evaluator=None, geometry: dict = None):
 
     """
     Runs optimisation algorithm to obtain parameters which minimise drag at a given lift coefficient, Reynolds number
@@ -53,8 +303,9 @@ def opt(optimizer: DE, cl_des: float, re: float, m: float, alpha_range: tuple, x
 
     Parameters
     ----------
-    optimizer : DE
-        Optimisation algorithm object.
+    optimizer : Optimizer or str
+        Optimisation algorithm object (e.g. DE or CMAES), or the name under which an optimizer engine is registered
+        (see algorithms.base.create_optimizer).
     cl_des : float
         Desired lift coefficient.
     re : float
@@ -67,8 +318,211 @@ def opt(optimizer: DE, cl_des: float, re: float, m: float, alpha_range: tuple, x
         Path of XFOIL executable file.
     itermax : int
         XFOIL viscous solution iteration limit.
+    n_workers : int
+        Number of worker processes used to evaluate each generation. Each worker runs XFOIL in its own temporary
+        directory.
+    persistent : bool
+        Keeps one XFOIL process alive per worker (see XfoilSession) and reuses it for every evaluation instead of
+        starting a new XFOIL process each time.
+    cache : FitnessCache
+        Cache of earlier evaluations. Individuals already evaluated at the same conditions are not run through XFOIL
+        again.
+    callback : function
+        Called with a summary dict at the end of every generation (see DE.report).
+    surrogate : RBFSurrogate
+        Surrogate model used to pre-screen trials so that only promising ones are run through XFOIL (see
+        DE.optimize).
+    asynchronous : bool
+        Runs the optimizer as an asynchronous steady-state DE which keeps every worker busy instead of waiting for the
+        slowest evaluation of each generation (see DE.optimize_async). Cannot be combined with a surrogate.
+    low_fidelity : dict
+        Settings of a cheap XFOIL pass which scores every trial first, so that only trials competitive with their
+        target are run at full fidelity (see MultiFidelity). Keys: 'n_panels' (default 80), 'alpha_step' (default
+        twice the incidence increment), 'itermax' (default 30) and 'tolerance' (default 0.05). Statistics for each
+        fidelity are included in the summaries passed to callback.
+    target_cl : bool
+        Drives XFOIL directly to cl_des (from a converged point at the thin aerofoil estimate of the design incidence)
+        instead of running the whole incidence sweep. The sweep is only run if this fails to converge. alpha_range is
+        still used for the fallback sweep and to bound the starting incidence.
+    prefilter : dict
+        Settings of an inviscid panel solver screen which rejects shapes that cannot plausibly reach cl_des before they
+        are run through XFOIL (see utils.panel.PanelFilterEvaluator). Keys: 'alpha_margin' (default 2), 'cp_min'
+        (default None) and 'n_panels' (default 120).
+    solver : str
+        'xfoil', or 'panel' to replace XFOIL with the built-in inviscid panel solver and a rough dissipation-based drag
+        estimate (see utils.panel.InviscidSolution.drag). The panel solver needs no XFOIL executable and is meant for
+        testing; the Mach number and the XFOIL settings are then ignored.
+    checkpoint : str
+        Path of a .npz file to which the state of the run is saved every generation. If the file already exists, the
+        run is resumed from it (see DE.resume); the surrogate and low-fidelity settings must then match the original
+        run.
+    optimizer_options : dict
+        Keyword arguments with which the optimizer is created if it is given by name.
+    evaluator : Broker
+        Evaluator used instead of the one chosen by n_workers, e.g. a utils.distributed.Broker which spreads the
+        evaluations over other machines. xfoil_path is then used as given on those machines, so it should be absolute
+        or the name of an executable on their PATH. The evaluator is not closed, so it can serve further runs.
+    geometry : dict
+        Resolution of the coordinates written for XFOIL, which repanels them: 'n_points' per bezier curve (default 100,
+        i.e. 400 points in all) and 'spacing' ('uniform' or 'cosine', see Aerofoil). Fewer, cosine-spaced points give
+        smaller coordinate files for the same leading and trailing edge resolution.
+
+    Returns
+    -------
+    Optimisation algorithm object, holding the results of the run.
     """
 
-    def func(a): return _drag_reward(cl_des, re, m, alpha_range, xfoil_path, itermax, a)
+    if isinstance(optimizer, str):
+        optimizer = create_optimizer(optimizer, **(optimizer_options or {}))
+
+    if solver not in ('xfoil', 'panel'):
+        raise ValueError("Invalid solver")
+    if solver == 'panel' and low_fidelity is not None:
+        raise ValueError("Low-fidelity pre-screening requires the XFOIL solver")
+
+    _check_modes(optimizer, asynchronous, surrogate, low_fidelity, checkpoint)
+    xfoil_path = _xfoil_executable(xfoil_path, n_workers, persistent, evaluator)
+
+    if evaluator is not None:
+        base_evaluator = evaluator
+    elif n_workers > 1:
+        base_evaluator = ParallelEvaluator(n_workers)
+    else:
+        base_evaluator = SerialEvaluator()
+
+    # only non-default solve modes are added to cache contexts, so earlier sweep results keep their keys
+    solve_mode = (('target_cl',) if target_cl else ()) + _geometry_context(geometry)
+    if solver == 'panel':
+        solve_mode = ('panel',)
+
+    owned = evaluator is None
+    evaluator = base_evaluator
+    if cache is not None:
+        context = (cl_des, re, m, tuple(alpha_range), itermax, optimizer.param_method) + solve_mode
+        evaluator = CachedEvaluator(base_evaluator, cache, context)
+
+    if solver == 'panel':
+        func = partial(_panel_reward, cl_des, re, alpha_range)
+    else:
+        func = partial(_drag_reward, cl_des, re, m, alpha_range, xfoil_path, itermax, persistent=persistent,
+                       target_cl=target_cl, geometry=geometry)
+
+    def screened(wrapped):
+        # the inviscid screen runs before the cache, so rejected shapes are never stored
+        if prefilter is None:
+            return wrapped
+        return PanelFilterEvaluator(wrapped, cl_des, alpha_range, prefilter.get('alpha_margin', 2.0),
+                                    prefilter.get('cp_min'), n_panels=prefilter.get('n_panels', DEFAULT_PANELS))
+
+    evaluator = screened(evaluator)
+
+    fidelity = None
+    if low_fidelity is not None:
+        coarse_range = (alpha_range[0], alpha_range[1], low_fidelity.get('alpha_step', 2 * alpha_range[2]))
+        low_itermax = low_fidelity.get('itermax', 30)
+        n_panels = low_fidelity.get('n_panels', 80)
+        low_func = partial(_drag_reward, cl_des, re, m, coarse_range, xfoil_path, low_itermax, persistent=persistent,
+                           n_panels=n_panels, target_cl=target_cl, geometry=geometry)
+
+        # low-fidelity results are cached under their own settings so they never stand in for full-fidelity ones
+        low_evaluator = base_evaluator
+        if cache is not None:
+            low_context = (cl_des, re, m, coarse_range, low_itermax, n_panels, optimizer.param_method) + solve_mode
+            low_evaluator = CachedEvaluator(base_evaluator, cache, low_context)
+        low_evaluator = screened(low_evaluator)
+
+        fidelity = MultiFidelity(low_func, low_fidelity.get('tolerance', 0.05), evaluator=low_evaluator)
+
+    _run(optimizer, func, evaluator, callback, surrogate, asynchronous, fidelity, checkpoint, owned)
+
+    return optimizer
+
+
+def opt_multipoint(optimizer: Optimizer, conditions: list, alpha_range: tuple, xfoil_path: str = 'xfoil.exe',
+                   itermax: int = 100, n_workers: int = 1, persistent: bool = False, cache: FitnessCache = None,
+                   callback=None, surrogate=None, asynchronous: bool = False, solver: str = 'xfoil',
+                   checkpoint: str = None, optimizer_options: dict = None, evaluator=None, geometry: dict = None):
+
+    """
+    Runs optimisation algorithm to obtain parameters which minimise the weighted sum of the drag coefficients at several
+    operating conditions (see multipoint_drag). Each shape is analysed at every condition in a single XFOIL run.
+
+    Parameters
+    ----------
+    optimizer : Optimizer or str
+        Optimisation algorithm object, or the name under which an optimizer engine is registered.
+    conditions : list
+        (cl_des, re, m, weight) of every operating condition.
+    alpha_range : tuple
+        Incidence range (alpha_start, alpha_stop, alpha_increment) swept at every Reynolds and Mach number.
+    xfoil_path : str
+        Path of XFOIL executable file.
+    itermax : int
+        XFOIL viscous solution iteration limit.
+    n_workers : int
+        Number of worker processes used to evaluate each generation.
+    persistent : bool
+        Keeps one XFOIL process alive per worker and reuses it for every evaluation.
+    cache : FitnessCache
+        Cache of earlier evaluations, keyed on the whole list of conditions.
+    callback : function
+        Called with a summary dict at the end of every generation.
+    surrogate : RBFSurrogate
+        Surrogate model used to pre-screen trials (see DE.optimize).
+    asynchronous : bool
+        Runs the optimizer as an asynchronous steady-state DE (see DE.optimize_async).
+    solver : str
+        'xfoil', or 'panel' for the built-in inviscid panel solver (see opt).
+    checkpoint : str
+        Path of a .npz file to which the state of the run is saved every generation, or from which it is resumed.
+    optimizer_options : dict
+        Keyword arguments with which the optimizer is created if it is given by name.
+    evaluator : Broker
+        Evaluator used instead of the one chosen by n_workers (see opt). It is not closed at the end of the run.
+    geometry : dict
+        Resolution of the coordinates written for XFOIL (see opt).
+
+    Returns
+    -------
+    Optimisation algorithm object, holding the results of the run. The per-condition breakdown of the best individual
+    (see multipoint_drag) is stored in optimizer.best_individual.breakdown; it is computed with one further analysis
+    of that shape at the end of the run.
+    """
+
+    if isinstance(optimizer, str):
+        optimizer = create_optimizer(optimizer, **(optimizer_options or {}))
+
+    if solver not in ('xfoil', 'panel'):
+        raise ValueError("Invalid solver")
+    if not conditions or any(len(condition) != 4 for condition in conditions):
+        raise ValueError("Conditions must be a non-empty list of (cl_des, re, m, weight) tuples")
+    conditions = [tuple(condition) for condition in conditions]
+
+    _check_modes(optimizer, asynchronous, surrogate, None, checkpoint)
+    xfoil_path = _xfoil_executable(xfoil_path, n_workers, persistent, evaluator)
+
+    owned = evaluator is None
+    if owned:
+        evaluator = ParallelEvaluator(n_workers) if n_workers > 1 else SerialEvaluator()
+    base_evaluator = evaluator
+    if cache is not None:
+        context = ('multipoint', tuple(conditions), tuple(alpha_range), itermax, optimizer.param_method)
+        if solver == 'panel':
+            context += ('panel',)
+        else:
+            context += _geometry_context(geometry)
+        evaluator = CachedEvaluator(evaluator, cache, context)
+
+    func = partial(_multipoint_reward, conditions, alpha_range, xfoil_path, itermax, persistent=persistent,
+                   solver=solver, geometry=geometry)
+    _run(optimizer, func, evaluator, callback, surrogate, asynchronous, None, checkpoint, owned)
+
+    breakdown = partial(_multipoint_breakdown, conditions, alpha_range, xfoil_path, itermax, persistent=persistent,
+                        solver=solver, geometry=geometry)
+    if owned:
+        optimizer.best_individual.breakdown = breakdown(optimizer.best_individual)
+    else:
+        # the caller's evaluator is still open and may be the only place where xfoil_path is valid
+        optimizer.best_individual.breakdown = base_evaluator.evaluate(breakdown, [optimizer.best_individual])[0]
 
-    optimizer.optimize(func)
+    return optimizer
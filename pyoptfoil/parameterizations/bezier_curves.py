@@ -1,4 +1,8 @@
 import numpy as np
+from functools import lru_cache
+
+# spacings of the bezier parameter accepted by bernstein_basis
+SPACINGS = ('uniform', 'cosine')
 
 
 def b3(u: np.ndarray, p0: float, p1: float, p2: float, p3: float):
@@ -41,3 +45,36 @@ def db3(u: np.ndarray, p0: float, p1: float, p2: float, p3: float):
 
     db_du = -3 * p0 * (1 - u) ** 2 + 3 * p1 * (1 - 4 * u + 3 * u ** 2) + 3 * p2 * (2 * u - 3 * u ** 2) + 3 * p3 * u ** 2
     return db_du
+
+
+@lru_cache(maxsize=None)
+def bernstein_basis(n_points: int, spacing: str = 'uniform'):
+    """
+    Cubic Bernstein basis matrices for n_points values of the bezier parameter u. The matrices are cached, so curves of
+    the same resolution share them.
+
+    Parameters
+    ----------
+    n_points : number of points along the curve.
+    spacing : 'uniform' (equally spaced u) or 'cosine' (u = (1 - cos(pi * s)) / 2 for equally spaced s, which clusters
+    the points at both ends of the curve).
+
+    Returns
+    -------
+    b : (n_points, 4) array such that b @ (p0, p1, p2, p3) gives the cubic bezier points.
+    db : (n_points, 4) array such that db @ (p0, p1, p2, p3) gives the cubic bezier curve gradients.
+    """
+
+    if spacing == 'uniform':
+        u = np.linspace(0, 1, n_points)
+    elif spacing == 'cosine':
+        u = (1 - np.cos(np.linspace(0, np.pi, n_points))) / 2
+    else:
+        raise ValueError("Invalid spacing")
+
+    b = np.stack([b3(u, *p) for p in np.eye(4)], axis=1)
+    db = np.stack([db3(u, *p) for p in np.eye(4)], axis=1)
+    b.flags.writeable = False
+    db.flags.writeable = False
+
+    return b, db
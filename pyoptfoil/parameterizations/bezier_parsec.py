@@ -1,188 +1,294 @@
 import numpy as np
-import math
-from scipy.optimize import fsolve
-from .bezier_curves import b3, db3
+from .bezier_curves import bernstein_basis
 
+PARAM_KEYS = ('x_t', 'y_t', 'r_le', 'k_t', 'beta_te', 'dz_te', 'gamma_le', 'x_c', 'y_c', 'k_c', 'alpha_te', 'z_te')
 
-class BP3333:
-    def __init__(self, name: str, params: dict):
+# parameters entering the thickness (r_t) and camber (r_c) constraint checks
+THICKNESS_KEYS = PARAM_KEYS[:6]
+CAMBER_KEYS = PARAM_KEYS[6:]
+
+
+def _real_quartic_roots(coeffs: np.ndarray):
+    # eigenvalues of the companion matrices of a batch of quartics, with complex roots replaced by nan
+    n = len(coeffs)
+    companion = np.zeros((n, 4, 4))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        companion[:, 0, :] = -coeffs[:, 1:] / coeffs[:, :1]
+    companion[:, 1, 0] = companion[:, 2, 1] = companion[:, 3, 2] = 1
+
+    solvable = np.isfinite(companion).all(axis=(1, 2))
+    companion[~solvable] = 0
+
+    roots = np.linalg.eigvals(companion)
+    real = solvable[:, None] & (np.abs(roots.imag) <= 1e-7 * np.maximum(1, np.abs(roots.real)))
+
+    return np.where(real, roots.real, np.nan)
+
+
+def _interp_rows(x: np.ndarray, xp: np.ndarray, fp: np.ndarray):
+    # row-wise np.interp. Every row lies within [0, 1], so offsetting each row keeps them apart and the segments of all
+    # the queries are found by a single np.interp call over the node indices. The queries are clipped to the ends of
+    # their row, so they are clamped as by np.interp, and are interpolated from the unshifted values as np.interp does
+    n, m = xp.shape
+    x = np.clip(x, xp[:, :1], xp[:, -1:])
+    last = m * np.arange(1, n + 1)[:, None] - 1
+    offset = 2 * np.arange(n)[:, None]
+    j = np.minimum(np.interp(x + offset, (xp + offset).ravel(), np.arange(n * m, dtype=float)).astype(int), last)
+    xp, fp = xp.ravel(), fp.ravel()
+    j1 = np.minimum(j + 1, last)
+    xj, xj1 = xp[j], xp[j1]
+
+    # shifted values within rounding of a node may fall in the neighbouring segment
+    shift = (x >= xj1).astype(int) * (j < last) - (x < xj)
+    if shift.any():
+        j += shift
+        j1 = np.minimum(j + 1, last)
+        xj, xj1 = xp[j], xp[j1]
+
+    fj = fp[j]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (fp[j1] - fj) / (xj1 - xj)
+
+    return np.where(x == xj, fj, slope * (x - xj) + fj)
+
+
+class BP3333Batch:
+    def __init__(self, params: np.ndarray, keys: tuple = PARAM_KEYS):
 
         """
-        Bezier-PARSEC 3333 aerofoil parametrisation class.
+        Bezier-PARSEC 3333 aerofoil parametrisation of a batch of shapes. The constraint checks and coordinates of every
+        shape are computed together as array operations.
 
         Parameters
         ----------
-        name : Geometry name.
-        params : Dict containing BP3333 parameters. Should contain the following keys: 'x_t', 'y_t', 'r_le', 'k_t',
-        'beta_te' , 'dz_te', 'gamma_le', 'x_c', 'y_c', 'k_c', 'alpha_te', 'z_te'.
+        params : (N, 12) array of BP3333 parameters, one shape per row.
+        keys : Parameter name of each column of params. Defaults to PARAM_KEYS.
         """
 
-        self.name = name
-        self.params = params
-        self.constraint_violation = False
-        self._rt()
-        self._rc()
+        params = np.atleast_2d(np.asarray(params, dtype=float))
+        self.params = {k: params[:, i] for i, k in enumerate(keys)}
+
+        self.r_t = self._rt()
+        self.r_c = self._rc()
+        self.feasible = ~np.isnan(self.r_t) & ~np.isnan(self.r_c)
 
     def _rt(self):
-        def quartic_func(r_t, x_t, y_t, r_le, k_t):
-            expr = 27 * k_t ** 2 * r_t ** 4 / 4
-            expr -= 27 * k_t ** 2 * x_t * r_t ** 3
-            expr += (9 * k_t * y_t + 81 * k_t ** 2 * x_t ** 2 / 2) * r_t ** 2
-            expr += (2 * r_le - 18 * k_t * x_t * y_t - 27 * k_t ** 2 * x_t ** 3) * r_t
-            expr += 3 * y_t ** 2 + 9 * k_t * x_t ** 2 * y_t + 27 * k_t ** 2 * x_t ** 4 / 4
-            return expr
+        x_t = self.params['x_t'][:, None]
+        y_t = self.params['y_t'][:, None]
+        r_le = self.params['r_le'][:, None]
+        k_t = self.params['k_t'][:, None]
+        dz_te = self.params['dz_te'][:, None]
+        beta_te = self.params['beta_te'][:, None]
+
+        coeffs = np.hstack((27 * k_t ** 2 / 4,
+                            -27 * k_t ** 2 * x_t,
+                            9 * k_t * y_t + 81 * k_t ** 2 * x_t ** 2 / 2,
+                            2 * r_le - 18 * k_t * x_t * y_t - 27 * k_t ** 2 * x_t ** 3,
+                            3 * y_t ** 2 + 9 * k_t * x_t ** 2 * y_t + 27 * k_t ** 2 * x_t ** 4 / 4))
+        r_t = _real_quartic_roots(coeffs)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            check1 = (0 < r_t) & (r_t < x_t)
+            check2 = r_t > x_t - np.sqrt(-2 * y_t / (3 * k_t))
+            check3 = 1 + (dz_te - (3 * k_t * (x_t - r_t) ** 2 / 2 + y_t)) / np.tan(beta_te) \
+                     > 2 * x_t - r_t  # ensures that x is monotonically increasing
+
+        r_t = np.where(check1 & check2 & check3, r_t, np.inf).min(axis=1)
+        r_t[np.isinf(r_t)] = np.nan
+
+        return r_t
 
-        r_t = fsolve(quartic_func, 0.15, (self.params['x_t'], self.params['y_t'], self.params['r_le'], self.params['k_t']))
+    def _rc(self):
+        gamma_le = self.params['gamma_le'][:, None]
+        x_c = self.params['x_c'][:, None]
+        y_c = self.params['y_c'][:, None]
+        k_c = self.params['k_c'][:, None]
+        alpha_te = self.params['alpha_te'][:, None]
+        z_te = self.params['z_te'][:, None]
 
-        def rt_constraint_check(params, p):
-            retbool1 = 0 < p < params['x_t']
-            retbool2 = p > params['x_t'] - (-2 * params['y_t'] / (3 * params['k_t'])) ** 0.5
-            retbool3 = 1 + (params['dz_te'] - (3 * params['k_t'] * (params['x_t'] - p) ** 2 / 2 + params['y_t'])) \
-                       / math.tan(params['beta_te']) > 2 * params[
-                           'x_t'] - p  # ensures that x is monotonically increasing
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cot_le = np.tan(gamma_le) ** -1
+            cot_te = np.tan(alpha_te) ** -1
 
-            return retbool1 and retbool2 and retbool3
+            summand1 = 16 + 3 * k_c * (cot_le + cot_te) * (1 + z_te * cot_te)
 
-        r_t = list(filter(lambda i: rt_constraint_check(self.params, i), r_t))
+            summand2 = 6 * k_c * (cot_le + cot_te) * (1 - y_c * (cot_le + cot_te) + z_te * cot_te)
+            summand2 = np.array([-1, 1]) * 4 * (16 + summand2) ** 0.5
 
-        if len(r_t) is 0:
-            self.constraint_violation = True
-        else:
-            self.r_t = min(r_t)
+            r_c = (summand1 + summand2) / (3 * k_c * (cot_le + cot_te) ** 2)
 
-    def _rc(self):
-        summand1 = 16 + 3 * self.params['k_c'] * (
-                math.tan(self.params['gamma_le']) ** -1 + math.tan(self.params['alpha_te']) ** -1) * (
-                           1 + self.params['z_te'] * math.tan(self.params['alpha_te']) ** -1)
-
-        summand2 = 6 * self.params['k_c'] * (
-                math.tan(self.params['gamma_le']) ** -1 + math.tan(self.params['alpha_te']) ** -1)
-        summand2 *= 1 - self.params['y_c'] * (
-                math.tan(self.params['gamma_le']) ** -1 + math.tan(self.params['alpha_te']) ** -1) + self.params[
-                        'z_te'] * math.tan(self.params['alpha_te']) ** -1
-        summand2 = np.array([-1, 1]) * 4 * (16 + summand2) ** 0.5
-
-        r_c = (summand1 + summand2) / (3 * self.params['k_c'] * (
-                math.tan(self.params['gamma_le']) ** -1 + math.tan(self.params['alpha_te']) ** -1) ** 2)
-
-        def rc_constraint_check(params, p):
-            retbool1 = 0 < p < params['y_c']
-            retbool2 = params['x_c'] - (2 * (p - params['y_c']) / (3 * params['k_c'])) ** 0.5 > p / math.tan(
-                params['gamma_le'])  # ensures that x is monotonically increasing
-            retbool3 = 1 + (params['z_te'] - p) * math.tan(params['alpha_te']) ** -1 > params['x_c'] + (
-                    2 * (p - params['y_c']) / (3 * params['k_c'])) ** 0.5  # ensures that x is monotonically increasing
-            retbool4 = np.isreal(p)
-            return retbool1 and retbool2 and retbool3 and retbool4
-
-        r_c = list(filter(lambda i: rc_constraint_check(self.params, i), r_c))
-
-        if len(r_c) is 0:
-            self.constraint_violation = True
-        else:
-            self.r_c = max(r_c)
+            check1 = (0 < r_c) & (r_c < y_c)
+            check2 = x_c - (2 * (r_c - y_c) / (3 * k_c)) ** 0.5 \
+                     > r_c * cot_le  # ensures that x is monotonically increasing
+            check3 = 1 + (z_te - r_c) * cot_te \
+                     > x_c + (2 * (r_c - y_c) / (3 * k_c)) ** 0.5  # ensures that x is monotonically increasing
 
-    def xy_lt(self):
+        r_c = np.where(check1 & check2 & check3, r_c, -np.inf).max(axis=1)
+        r_c[np.isinf(r_c)] = np.nan
 
-        """Calculates cubic bezier control points for the leading edge thickness curve"""
+        return r_c
+
+    def violated(self, keys: tuple = PARAM_KEYS):
 
-        x0 = 0
-        x1 = 0
-        x2 = self.r_t
-        x3 = self.params['x_t']
+        """
+        Returns an (N, len(keys)) boolean array marking the parameters of each shape which enter a violated constraint:
+        the thickness parameters if no valid r_t exists, the camber parameters if no valid r_c exists.
+        """
+
+        thickness = np.isin(keys, THICKNESS_KEYS)
+        camber = np.isin(keys, CAMBER_KEYS)
+
+        return (np.isnan(self.r_t)[:, None] & thickness) | (np.isnan(self.r_c)[:, None] & camber)
+
+    def xy_lt(self):
 
-        y0 = 0
-        y1 = 3 * self.params['k_t'] * (self.params['x_t'] - self.r_t) ** 2 / 2 + self.params['y_t']
-        y2 = self.params['y_t']
-        y3 = self.params['y_t']
+        """Calculates cubic bezier control points for the leading edge thickness curves"""
 
-        x_lt = (x0, x1, x2, x3)
-        y_lt = (y0, y1, y2, y3)
+        x_t, y_t, k_t = self.params['x_t'], self.params['y_t'], self.params['k_t']
+        zeros = np.zeros_like(x_t)
+
+        x_lt = np.stack((zeros, zeros, self.r_t, x_t), axis=1)
+        y_lt = np.stack((zeros, 3 * k_t * (x_t - self.r_t) ** 2 / 2 + y_t, y_t, y_t), axis=1)
 
         return x_lt, y_lt
 
     def xy_tt(self):
 
-        """Calculates cubic bezier control points for the trailing edge thickness curve"""
-
-        x0 = self.params['x_t']
-        x1 = 2 * self.params['x_t'] - self.r_t
-        x2 = 1 + (self.params['dz_te'] - (
-                3 * self.params['k_t'] * (self.params['x_t'] - self.r_t) ** 2 / 2 + self.params['y_t'])) \
-             / math.tan(self.params['beta_te'])
-        x3 = 1
+        """Calculates cubic bezier control points for the trailing edge thickness curves"""
 
-        y0 = self.params['y_t']
-        y1 = self.params['y_t']
-        y2 = 3 * self.params['k_t'] * (self.params['x_t'] - self.r_t) ** 2 / 2 + self.params['y_t']
-        y3 = self.params['dz_te']
+        x_t, y_t, k_t = self.params['x_t'], self.params['y_t'], self.params['k_t']
+        dz_te, beta_te = self.params['dz_te'], self.params['beta_te']
+        ones = np.ones_like(x_t)
 
-        x_tt = (x0, x1, x2, x3)
-        y_tt = (y0, y1, y2, y3)
+        x_tt = np.stack((x_t, 2 * x_t - self.r_t,
+                         1 + (dz_te - (3 * k_t * (x_t - self.r_t) ** 2 / 2 + y_t)) / np.tan(beta_te), ones), axis=1)
+        y_tt = np.stack((y_t, y_t, 3 * k_t * (x_t - self.r_t) ** 2 / 2 + y_t, dz_te), axis=1)
 
         return x_tt, y_tt
 
     def xy_lc(self):
 
-        """Calculates cubic bezier control points for the leading edge camber curve"""
-
-        x0 = 0
-        x1 = self.r_c * math.tan(self.params['gamma_le']) ** -1
-        x2 = self.params['x_c'] - (2 * (self.r_c - self.params['y_c']) / (3 * self.params['k_c'])) ** 0.5
-        x3 = self.params['x_c']
+        """Calculates cubic bezier control points for the leading edge camber curves"""
 
-        y0 = 0
-        y1 = self.r_c
-        y2 = self.params['y_c']
-        y3 = self.params['y_c']
+        x_c, y_c, k_c, gamma_le = self.params['x_c'], self.params['y_c'], self.params['k_c'], self.params['gamma_le']
+        zeros = np.zeros_like(x_c)
 
-        x_lc = (x0, x1, x2, x3)
-        y_lc = (y0, y1, y2, y3)
+        x_lc = np.stack((zeros, self.r_c * np.tan(gamma_le) ** -1,
+                         x_c - (2 * (self.r_c - y_c) / (3 * k_c)) ** 0.5, x_c), axis=1)
+        y_lc = np.stack((zeros, self.r_c, y_c, y_c), axis=1)
 
         return x_lc, y_lc
 
     def xy_tc(self):
-        """Calculates cubic bezier control points for the trailing edge camber curve"""
 
-        x0 = self.params['x_c']
-        x1 = self.params['x_c'] + (2 * (self.r_c - self.params['y_c']) / (3 * self.params['k_c'])) ** 0.5
-        x2 = 1 + (self.params['z_te'] - self.r_c) * math.tan(self.params['alpha_te']) ** -1
-        x3 = 1
+        """Calculates cubic bezier control points for the trailing edge camber curves"""
 
-        y0 = self.params['y_c']
-        y1 = self.params['y_c']
-        y2 = self.r_c
-        y3 = self.params['z_te']
+        x_c, y_c, k_c = self.params['x_c'], self.params['y_c'], self.params['k_c']
+        z_te, alpha_te = self.params['z_te'], self.params['alpha_te']
+        ones = np.ones_like(x_c)
 
-        x_tc = (x0, x1, x2, x3)
-        y_tc = (y0, y1, y2, y3)
+        x_tc = np.stack((x_c, x_c + (2 * (self.r_c - y_c) / (3 * k_c)) ** 0.5,
+                         1 + (z_te - self.r_c) * np.tan(alpha_te) ** -1, ones), axis=1)
+        y_tc = np.stack((y_c, y_c, self.r_c, z_te), axis=1)
 
         return x_tc, y_tc
 
-    def xy(self):
-        """Calculates aerofoil x,y coordinates"""
+    def xy(self, n_points: int = 100, spacing: str = 'uniform'):
+
+        """
+        Calculates aerofoil x,y coordinates of every shape. Each surface has 2 * n_points points (n_points per bezier
+        curve, spaced as given to bezier_curves.bernstein_basis). Rows of infeasible shapes are nan.
+        """
+
+        shape = (len(self.feasible), 2 * n_points)
+        x_u, y_u, x_l, y_l = (np.full(shape, np.nan) for _ in range(4))
 
-        x_lt, y_lt = self.xy_lt()
-        x_tt, y_tt = self.xy_tt()
-        x_lc, y_lc = self.xy_lc()
-        x_tc, y_tc = self.xy_tc()
+        rows = self.feasible
+        if not rows.any():
+            return x_u, y_u, x_l, y_l
 
-        u = np.linspace(0, 1, 100)  # bezier parameter u
+        b, db = bernstein_basis(n_points, spacing)
 
-        x_t = np.concatenate((b3(u, *x_lt), b3(u, *x_tt)))
-        y_t = np.concatenate((b3(u, *y_lt), b3(u, *y_tt)))
-        x_c = np.concatenate((b3(u, *x_lc), b3(u, *x_tc)))
-        y_c = np.concatenate((b3(u, *y_lc), b3(u, *y_tc)))
+        with np.errstate(invalid='ignore'):
+            x_lt, y_lt = (a[rows] for a in self.xy_lt())
+            x_tt, y_tt = (a[rows] for a in self.xy_tt())
+            x_lc, y_lc = (a[rows] for a in self.xy_lc())
+            x_tc, y_tc = (a[rows] for a in self.xy_tc())
 
-        dyc_du = np.concatenate((db3(u, *y_lc), db3(u, *y_tc)))
-        dxc_du = np.concatenate((db3(u, *x_lc), db3(u, *x_tc)))
+        x_t = np.hstack((x_lt @ b.T, x_tt @ b.T))
+        y_t = np.hstack((y_lt @ b.T, y_tt @ b.T))
+        x_c = np.hstack((x_lc @ b.T, x_tc @ b.T))
+        y_c = np.hstack((y_lc @ b.T, y_tc @ b.T))
+
+        dyc_du = np.hstack((y_lc @ db.T, y_tc @ db.T))
+        dxc_du = np.hstack((x_lc @ db.T, x_tc @ db.T))
         dyc_dxc = dyc_du / dxc_du
         theta = np.arctan(dyc_dxc)
 
-        y_t = np.interp(x_c, x_t, y_t)  # interpolating for thickness at camber x points
+        y_t = _interp_rows(x_c, x_t, y_t)  # interpolating for thickness at camber x points
 
-        x_u = x_c - y_t / 2 * np.sin(theta)
-        x_l = x_c + y_t / 2 * np.sin(theta)
-        y_u = y_c + y_t / 2 * np.cos(theta)
-        y_l = y_c - y_t / 2 * np.cos(theta)
+        x_u[rows] = x_c - y_t / 2 * np.sin(theta)
+        x_l[rows] = x_c + y_t / 2 * np.sin(theta)
+        y_u[rows] = y_c + y_t / 2 * np.cos(theta)
+        y_l[rows] = y_c - y_t / 2 * np.cos(theta)
 
         return x_u, y_u, x_l, y_l
+
+
+class BP3333:
+    def __init__(self, name: str, params: dict):
+
+        """
+        Bezier-PARSEC 3333 aerofoil parametrisation class.
+
+        Parameters
+        ----------
+        name : Geometry name.
+        params : Dict containing BP3333 parameters. Should contain the following keys: 'x_t', 'y_t', 'r_le', 'k_t',
+        'beta_te' , 'dz_te', 'gamma_le', 'x_c', 'y_c', 'k_c', 'alpha_te', 'z_te'.
+        """
+
+        self.name = name
+        self.params = params
+        self._batch = BP3333Batch([[params[k] for k in PARAM_KEYS]])
+
+        self.constraint_violation = not self._batch.feasible[0]
+        if not np.isnan(self._batch.r_t[0]):
+            self.r_t = float(self._batch.r_t[0])
+        if not np.isnan(self._batch.r_c[0]):
+            self.r_c = float(self._batch.r_c[0])
+
+    def xy_lt(self):
+
+        """Calculates cubic bezier control points for the leading edge thickness curve"""
+
+        x_lt, y_lt = self._batch.xy_lt()
+        return tuple(x_lt[0]), tuple(y_lt[0])
+
+    def xy_tt(self):
+
+        """Calculates cubic bezier control points for the trailing edge thickness curve"""
+
+        x_tt, y_tt = self._batch.xy_tt()
+        return tuple(x_tt[0]), tuple(y_tt[0])
+
+    def xy_lc(self):
+
+        """Calculates cubic bezier control points for the leading edge camber curve"""
+
+        x_lc, y_lc = self._batch.xy_lc()
+        return tuple(x_lc[0]), tuple(y_lc[0])
+
+    def xy_tc(self):
+
+        """Calculates cubic bezier control points for the trailing edge camber curve"""
+
+        x_tc, y_tc = self._batch.xy_tc()
+        return tuple(x_tc[0]), tuple(y_tc[0])
+
+    def xy(self, n_points: int = 100, spacing: str = 'uniform'):
+
+        """Calculates aerofoil x,y coordinates (see BP3333Batch.xy)"""
+
+        x_u, y_u, x_l, y_l = self._batch.xy(n_points, spacing)
+        return x_u[0], y_u[0], x_l[0], y_l[0]
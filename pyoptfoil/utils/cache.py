@@ -0,0 +1,203 @@
+from collections import OrderedDict, deque
+import hashlib
+import numpy as np
+import sqlite3
+import threading
+
+# fitnesses of failures which depend on the run rather than the shape (see algorithms.history.FAILURES): XFOIL crashed,
+# timed out or was killed, or its polar file could not be read. They are never cached, so the shape is evaluated again
+TRANSIENT_FAILURES = (-1e12, -1e11)
+
+
+class FitnessCache:
+    def __init__(self, path: str = None, resolution: float = 1e-9, maxsize: int = 100000):
+
+        """
+        Fitness cache keyed on quantized parameter vectors. Entries are kept in an in-memory LRU and, if a path is
+        given, in an SQLite database on disk so that later runs (including runs in other processes at the same time)
+        reuse earlier evaluations. Failures which may not recur (see TRANSIENT_FAILURES) are not stored. The cache may
+        be used from several threads at once, e.g. by the concurrent cases of a campaign.
+
+        Parameters
+        ----------
+        path : str
+            Path of the SQLite database file. The cache is held in memory only if None.
+        resolution : float
+            Parameter values closer together than this map to the same key.
+        maxsize : int
+            Maximum number of entries held in memory.
+        """
+
+        self.path = path
+        self.resolution = resolution
+        self.maxsize = maxsize
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        # one connection serves every thread; the lock also guards the LRU and the counters
+        self._lock = threading.Lock()
+        self._lru = OrderedDict()
+        self._db = None
+        if path is not None:
+            # WAL journaling lets several processes read the database while another one writes to it
+            self._db = sqlite3.connect(path, timeout=60, check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('CREATE TABLE IF NOT EXISTS fitness (key TEXT PRIMARY KEY, value REAL)')
+            self._db.commit()
+
+    def key(self, context: tuple, params: dict):
+
+        """Returns the cache key of a parameter dict evaluated under the given context (e.g. flight conditions)."""
+
+        names = sorted(params)
+        quantized = np.round(np.array([params[k] for k in names], dtype=float) / self.resolution).astype(np.int64)
+
+        digest = hashlib.sha1(repr((context, names)).encode())
+        digest.update(quantized.tobytes())
+
+        return digest.hexdigest()
+
+    def get(self, key: str):
+
+        """Returns the cached fitness for the given key, or None if it has not been evaluated."""
+
+        with self._lock:
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                self.memory_hits += 1
+                return self._lru[key]
+
+            if self._db is not None:
+                row = self._db.execute('SELECT value FROM fitness WHERE key = ?', (key,)).fetchone()
+                if row is not None:
+                    self._remember(key, row[0])
+                    self.disk_hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def put_many(self, items: list):
+
+        """Stores a list of (key, fitness) pairs, leaving out transient failures."""
+
+        items = [(key, value) for key, value in items if value not in TRANSIENT_FAILURES]
+        with self._lock:
+            for key, value in items:
+                self._remember(key, value)
+
+            if self._db is not None and items:
+                with self._db:
+                    self._db.executemany('INSERT OR REPLACE INTO fitness VALUES (?, ?)', items)
+
+    def _remember(self, key, value):
+        self._lru[key] = value
+        self._lru.move_to_end(key)
+        if len(self._lru) > self.maxsize:
+            self._lru.popitem(last=False)
+
+    def stats(self):
+
+        """Returns the cache hit/miss statistics."""
+
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+
+            return {'hits': hits, 'memory_hits': self.memory_hits, 'disk_hits': self.disk_hits,
+                    'misses': self.misses, 'hit_rate': hits / lookups if lookups else 0.0}
+
+    def close(self):
+
+        """Closes the database connection."""
+
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+class CachedEvaluator:
+    def __init__(self, evaluator, cache: FitnessCache, context: tuple):
+
+        """
+        Evaluator which looks up every individual in a FitnessCache and only passes the ones which have not been
+        evaluated before on to the wrapped evaluator. Identical individuals within a batch are evaluated once. All cache
+        access happens in the calling process, so the wrapped evaluator may use worker processes.
+
+        Parameters
+        ----------
+        evaluator : SerialEvaluator or ParallelEvaluator
+            Evaluator used for cache misses.
+        cache : FitnessCache
+            Cache to read from and write to.
+        context : tuple
+            Everything other than the parameters that determines fitness (e.g. flight conditions, solver settings and
+            parametrisation method). Part of every key.
+        """
+
+        self.evaluator = evaluator
+        self.cache = cache
+        self.context = context
+        self._ready = deque()
+        self._pending = {}
+
+    def evaluate(self, func, individuals: list):
+
+        """Returns the fitness of every individual in the given list, in order."""
+
+        keys = [self.cache.key(self.context, individual.position) for individual in individuals]
+        fitnesses = [self.cache.get(key) for key in keys]
+
+        pending = {}
+        for i, (key, fitness) in enumerate(zip(keys, fitnesses)):
+            if fitness is None:
+                pending.setdefault(key, []).append(i)
+
+        if pending:
+            results = self.evaluator.evaluate(func, [individuals[idx[0]] for idx in pending.values()])
+            for idx, fitness in zip(pending.values(), results):
+                for i in idx:
+                    fitnesses[i] = fitness
+            self.cache.put_many(list(zip(pending.keys(), map(float, results))))
+
+        return fitnesses
+
+    def submit(self, func, individual, tag=None):
+
+        """Starts evaluating a single individual unless it is cached. The result is returned by next_result."""
+
+        key = self.cache.key(self.context, individual.position)
+        fitness = self.cache.get(key)
+
+        if fitness is None:
+            self._pending[tag] = key
+            self.evaluator.submit(func, individual, tag)
+        else:
+            self._ready.append((tag, fitness))
+
+    def next_result(self, timeout: float = None):
+
+        """Returns the (tag, fitness) pair of the next completed submission, cached results first."""
+
+        if self._ready:
+            return self._ready.popleft()
+
+        tag, fitness = self.evaluator.next_result(timeout)
+        self.cache.put_many([(self._pending.pop(tag), float(fitness))])
+
+        return tag, fitness
+
+    def close(self):
+
+        """Closes the wrapped evaluator."""
+
+        self.evaluator.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
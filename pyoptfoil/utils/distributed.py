@@ -0,0 +1,595 @@
+"""
+Distributed evaluation over TCP. A Broker, running in the optimising process, queues evaluations and hands them out in
+batches to Worker processes, which may run on any machine that can reach it:
+
+    broker = Broker(host='0.0.0.0', port=5555, authkey='secret')
+    # on every compute node:  python -m pyoptfoil.utils.distributed <broker host>:5555 --authkey secret --processes 8
+    broker.wait_for_workers(4)
+    opt(optimizer, 0.6, 5e5, 0, (-1, 5, 0.5), xfoil_path='/opt/xfoil/bin/xfoil', evaluator=broker)
+    broker.close()
+
+Workers are sent the fitness function (e.g. _drag_reward together with cl_des, re, m, alpha_range and itermax) with the
+first task which uses it, and then only the name, parametrisation method, parameters and resolution of each individual, from which they rebuild the
+aerofoil.
+
+Messages are pickled, so they are only accepted from peers which prove they hold the same authentication key; the
+broker should still only be exposed on trusted networks.
+"""
+
+from multiprocessing.connection import Listener, Client
+from multiprocessing import AuthenticationError
+from collections import deque
+from ..aerofoil import Aerofoil
+from .timing import timings, _timed_call
+import multiprocessing as mp
+import argparse
+import os
+import pickle
+import queue
+import secrets
+import socket
+import threading
+import time
+import traceback
+
+
+def _authkey(authkey, generate: bool = False):
+    # authentication key as bytes, falling back to the PYOPTFOIL_AUTHKEY environment variable
+    authkey = authkey or os.environ.get('PYOPTFOIL_AUTHKEY')
+    if authkey is None:
+        if not generate:
+            raise ValueError("An authentication key is required (authkey or PYOPTFOIL_AUTHKEY)")
+        authkey = secrets.token_hex(16)
+
+    return authkey.encode() if isinstance(authkey, str) else bytes(authkey)
+
+
+def _pack(individual):
+    # aerofoils are sent as their definition and rebuilt by the worker, which is much smaller than their coordinates
+    if isinstance(individual, Aerofoil):
+        return (individual.name, individual.param_method, individual.position, individual.n_points,
+                individual.spacing)
+
+    return individual
+
+
+def _unpack(payload):
+    if isinstance(payload, tuple):
+        return Aerofoil(*payload)
+
+    return payload
+
+
+def _execute(func, payload, timed: bool):
+    # (fitness, timing statistics, error traceback) of one evaluation in a worker
+    try:
+        individual = _unpack(payload)
+        if timed:
+            fitness, raw = _timed_call(func, individual)
+        else:
+            fitness, raw = func(individual), None
+    except Exception:
+        return None, None, traceback.format_exc()
+
+    return fitness, raw, None
+
+
+class _Function:
+    # a fitness function queued on the broker; it is kept alongside its pickle so that its id cannot be reused by another
+    # object while any task uses it
+    __slots__ = ('func_id', 'func', 'pickle', 'n_tasks')
+
+    def __init__(self, func_id, func):
+        self.func_id = func_id
+        self.func = func
+        self.pickle = pickle.dumps(func)
+        self.n_tasks = 0
+
+
+class _Task:
+    __slots__ = ('tag', 'function', 'payload', 'timed', 'sink', 'attempts')
+
+    def __init__(self, tag, function, payload, timed, sink):
+        self.tag = tag
+        self.function = function
+        self.payload = payload
+        self.timed = timed
+        self.sink = sink
+        self.attempts = 0
+
+
+class _WorkerConnection:
+    # broker-side state of one connected worker; only its serving thread closes the connection
+    def __init__(self, conn):
+        self.conn = conn
+        self.name = None
+        self.in_flight = set()
+        self.funcs = set()
+        self.forgotten = []
+        self.last_seen = time.monotonic()
+        self.alive = True
+
+
+class Broker:
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, authkey=None, batch_size: int = 4,
+                 heartbeat_interval: float = 1.0, heartbeat_timeout: float = 10.0, max_attempts: int = 3,
+                 worker_timeout: float = 60.0):
+
+        """
+        Evaluator which sends individuals to remote Worker processes over TCP. It can be used wherever a
+        ParallelEvaluator can (including DE.optimize_async), and results are returned in the same order, so a run is
+        identical to one using SerialEvaluator.
+
+        Tasks are sent to each worker in batches of up to batch_size, and every worker is kept up to two batches ahead
+        so that it never waits on a round trip. Workers and broker exchange heartbeats; a worker which disconnects or
+        stays silent for heartbeat_timeout is dropped and its unfinished tasks are queued again at the front of the
+        queue. Workers may join or leave at any time, but if none is connected for worker_timeout while tasks are
+        queued, evaluate and next_result discard the queued tasks they wait on and raise a TimeoutError.
+
+        Parameters
+        ----------
+        host : str
+            Interface to listen on ('0.0.0.0' for all interfaces).
+        port : int
+            Port to listen on. 0 picks a free port; the address actually used is stored in address.
+        authkey : str or bytes
+            Key which workers must present. Defaults to the PYOPTFOIL_AUTHKEY environment variable, or else to a random
+            key, stored in authkey.
+        batch_size : int
+            Largest number of tasks sent to a worker at a time. Smaller batches are sent when there are fewer tasks
+            than workers can take, so that the work is spread evenly.
+        heartbeat_interval : float
+            Seconds between heartbeats.
+        heartbeat_timeout : float
+            Seconds of silence after which a worker is considered dead.
+        max_attempts : int
+            Number of workers a task may be lost with before its evaluation fails with a RuntimeError.
+        worker_timeout : float
+            Seconds for which queued tasks may wait without any worker connected.
+        """
+
+        self.batch_size = batch_size
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_attempts = max_attempts
+        self.worker_timeout = worker_timeout
+        self.authkey = _authkey(authkey, generate=True)
+
+        self._listener = Listener((host, port), authkey=self.authkey)
+        self.address = self._listener.address
+
+        self._lock = threading.Lock()
+        self._workers = []
+        self._pending = deque()
+        self._tasks = {}
+        self._funcs = {}
+        self._next_func = 0
+        self._next_task = 0
+        self._results = queue.Queue()
+        self._closed = threading.Event()
+        self.n_completed = 0
+        self.n_requeued = 0
+
+        threading.Thread(target=self._accept, daemon=True).start()
+        threading.Thread(target=self._monitor, daemon=True).start()
+
+    @property
+    def n_workers(self):
+
+        """Number of connected workers (at least 1, so that DE.optimize_async always keeps a task in flight)."""
+
+        return max(len(self._workers), 1)
+
+    def wait_for_workers(self, n: int, timeout: float = None):
+
+        """Waits until at least n workers are connected. Raises TimeoutError if this takes longer than timeout."""
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while len(self._workers) < n:
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError("{} of {} workers connected".format(len(self._workers), n))
+            time.sleep(0.05)
+
+    def _accept(self):
+        while not self._closed.is_set():
+            try:
+                conn = self._listener.accept()
+            except (AuthenticationError, EOFError, OSError):
+                # a peer failing the handshake is turned away; errors after close end the thread
+                continue
+            threading.Thread(target=self._serve, args=(_WorkerConnection(conn),), daemon=True).start()
+
+    def _serve(self, worker):
+        conn = worker.conn
+        try:
+            if self._closed.is_set():
+                return
+            message = conn.recv()
+            worker.name = message[1].get('name')
+            conn.send(('welcome', {'heartbeat_interval': self.heartbeat_interval,
+                                   'heartbeat_timeout': self.heartbeat_timeout}))
+            with self._lock:
+                worker.last_seen = time.monotonic()
+                self._workers.append(worker)
+                self._dispatch()
+
+            while worker.alive:
+                if not conn.poll(self.heartbeat_interval):
+                    continue
+                message = conn.recv()
+                worker.last_seen = time.monotonic()
+                if message[0] == 'results':
+                    with self._lock:
+                        self._complete(worker, message[1])
+                        self._dispatch()
+        except Exception:
+            # anything unexpected from a worker (a broken connection or a malformed message) drops that worker
+            pass
+        finally:
+            with self._lock:
+                self._drop(worker)
+                self._dispatch()
+            conn.close()
+
+    def _monitor(self):
+        while not self._closed.wait(self.heartbeat_interval):
+            now = time.monotonic()
+            with self._lock:
+                for worker in list(self._workers):
+                    if now - worker.last_seen > self.heartbeat_timeout:
+                        self._drop(worker)
+                    else:
+                        self._send(worker, ('heartbeat',))
+                self._dispatch()
+
+    def _send(self, worker, message):
+        # called with the lock held
+        try:
+            worker.conn.send(message)
+        except (OSError, ValueError):
+            self._drop(worker)
+
+    def _drop(self, worker):
+        # called with the lock held; the tasks of the worker go back to the front of the queue in their original order
+        if not worker.alive:
+            return
+        worker.alive = False
+        if worker in self._workers:
+            self._workers.remove(worker)
+
+        for task_id in sorted(worker.in_flight, reverse=True):
+            task = self._tasks[task_id]
+            task.attempts += 1
+            if task.attempts >= self.max_attempts:
+                self._retire(self._tasks.pop(task_id))
+                error = RuntimeError("Evaluation lost with {} workers".format(task.attempts))
+                task.sink.put((task.tag, None, None, error))
+            else:
+                self._pending.appendleft(task_id)
+                self.n_requeued += 1
+        worker.in_flight.clear()
+
+    def _complete(self, worker, results):
+        # called with the lock held; results of tasks no longer assigned to the worker are ignored
+        for task_id, fitness, raw, error in results:
+            if task_id not in worker.in_flight:
+                continue
+            worker.in_flight.remove(task_id)
+            task = self._tasks.pop(task_id)
+            self._retire(task)
+            if error is not None:
+                error = RuntimeError("Evaluation failed on worker {}:\n{}".format(worker.name, error))
+            task.sink.put((task.tag, fitness, raw, error))
+            self.n_completed += 1
+
+    def _retire(self, task):
+        # called with the lock held once a task leaves the broker; a function no task uses any more is forgotten, and
+        # so are the copies of the workers, which are told to drop them with their next batch
+        function = task.function
+        function.n_tasks -= 1
+        if function.n_tasks > 0:
+            return
+        del self._funcs[id(function.func)]
+        for worker in self._workers:
+            if function.func_id in worker.funcs:
+                worker.funcs.remove(function.func_id)
+                worker.forgotten.append(function.func_id)
+
+    def _cancel(self, sink):
+        # called with the lock held; drops the queued tasks whose results go to the given sink
+        cancelled = [task_id for task_id in self._pending if self._tasks[task_id].sink is sink]
+        self._pending = deque(task_id for task_id in self._pending if self._tasks[task_id].sink is not sink)
+        for task_id in cancelled:
+            self._retire(self._tasks.pop(task_id))
+
+        return len(cancelled)
+
+    def _dispatch(self):
+        # called with the lock held; hands out the queue in rounds so that every worker gets a share of it
+        while self._pending:
+            capacity = {worker: 2 * self.batch_size - len(worker.in_flight) for worker in self._workers}
+            ready = [worker for worker in self._workers if capacity[worker] > 0]
+            if not ready:
+                return
+            share = min(self.batch_size, -(-len(self._pending) // len(ready)))
+
+            for worker in ready:
+                n = min(share, capacity[worker], len(self._pending))
+                if n == 0:
+                    break
+                batch = []
+                for _ in range(n):
+                    task_id = self._pending.popleft()
+                    task = self._tasks[task_id]
+                    function = task.function
+                    # every function is sent to a worker once, with the first task which uses it
+                    func = None if function.func_id in worker.funcs else function.pickle
+                    batch.append((task_id, function.func_id, func, task.payload, task.timed))
+                    worker.funcs.add(function.func_id)
+                    worker.in_flight.add(task_id)
+                forgotten, worker.forgotten = worker.forgotten, []
+                self._send(worker, ('tasks', batch, forgotten))
+
+    def _queue(self, func, individuals, tags, sink):
+        timed = timings.enabled
+
+        with self._lock:
+            function = self._funcs.get(id(func))
+            if function is None:
+                # functions are numbered rather than identified by id, which may be reused once one is forgotten
+                function = self._funcs[id(func)] = _Function(self._next_func, func)
+                self._next_func += 1
+            for individual, tag in zip(individuals, tags):
+                task_id = self._next_task
+                self._next_task += 1
+                self._tasks[task_id] = _Task(tag, function, _pack(individual), timed, sink)
+                self._pending.append(task_id)
+                function.n_tasks += 1
+            self._dispatch()
+
+    @staticmethod
+    def _result(item):
+        tag, fitness, raw, error = item
+        if error is not None:
+            raise error
+        if raw is not None:
+            timings.merge(raw)
+
+        return tag, fitness
+
+    def _wait(self, sink, timeout: float = None):
+        # next item of the sink; raises queue.Empty after timeout, or TimeoutError once tasks have been queued for
+        # worker_timeout with no worker connected, in which case the queued tasks feeding the sink are discarded
+        deadline = None if timeout is None else time.monotonic() + timeout
+        idle_since = None
+        while True:
+            wait = self.heartbeat_interval
+            if deadline is not None:
+                wait = min(wait, max(deadline - time.monotonic(), 0))
+            try:
+                return sink.get(timeout=wait)
+            except queue.Empty:
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise
+
+            with self._lock:
+                if self._workers or not self._pending:
+                    idle_since = None
+                elif idle_since is None:
+                    idle_since = time.monotonic()
+                elif time.monotonic() - idle_since > self.worker_timeout:
+                    n_cancelled = self._cancel(sink)
+                    raise TimeoutError("No worker connected for {} s; {} queued tasks discarded".format(
+                        self.worker_timeout, n_cancelled))
+
+    def evaluate(self, func, individuals: list):
+
+        """Returns the fitness of every individual in the given list, in order."""
+
+        sink = queue.Queue()
+        self._queue(func, individuals, range(len(individuals)), sink)
+
+        fitnesses = [None] * len(individuals)
+        for _ in individuals:
+            i, fitness = self._result(self._wait(sink))
+            fitnesses[i] = fitness
+
+        return fitnesses
+
+    def submit(self, func, individual, tag=None):
+
+        """
+        Queues a single individual for evaluation. The result is returned by next_result together with the given tag,
+        in order of completion.
+        """
+
+        self._queue(func, [individual], [tag], self._results)
+
+    def next_result(self, timeout: float = None):
+
+        """
+        Waits for the next submission to complete and returns its (tag, fitness) pair. Raises queue.Empty if this takes
+        longer than timeout.
+        """
+
+        return self._result(self._wait(self._results, timeout))
+
+    def stats(self):
+
+        """Returns the number of connected workers and of queued, running, completed and re-queued tasks."""
+
+        with self._lock:
+            return {'n_workers': len(self._workers), 'n_pending': len(self._pending),
+                    'n_in_flight': sum(len(worker.in_flight) for worker in self._workers),
+                    'n_completed': self.n_completed, 'n_requeued': self.n_requeued}
+
+    def close(self):
+
+        """Tells every worker to stop and stops listening for new ones."""
+
+        if self._closed.is_set():
+            return
+        self._closed.set()
+
+        with self._lock:
+            for worker in list(self._workers):
+                self._send(worker, ('stop',))
+                worker.alive = False
+            self._workers.clear()
+
+        # a thread blocked in accept is not woken by closing the listener on every platform, so it is connected to
+        try:
+            Client(self.address, authkey=self.authkey).close()
+        except (OSError, AuthenticationError):
+            pass
+        self._listener.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class Worker:
+    def __init__(self, address: tuple, authkey=None, name: str = None, connect_timeout: float = 30.0):
+
+        """
+        Process which evaluates tasks handed out by a Broker until the broker closes or can no longer be reached.
+
+        Parameters
+        ----------
+        address : tuple
+            (host, port) of the broker.
+        authkey : str or bytes
+            Key of the broker. Defaults to the PYOPTFOIL_AUTHKEY environment variable.
+        name : str
+            Name of the worker, used in error messages. Defaults to host:pid.
+        connect_timeout : float
+            Seconds for which to keep trying to connect, so that workers can be started before the broker.
+        """
+
+        self.address = tuple(address)
+        self.authkey = _authkey(authkey)
+        self.name = name or '{}:{}'.format(socket.gethostname(), os.getpid())
+        self.connect_timeout = connect_timeout
+        self._conn = None
+        self._send_lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def _connect(self):
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            try:
+                return Client(self.address, authkey=self.authkey)
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.2)
+
+    def _send(self, message):
+        with self._send_lock:
+            self._conn.send(message)
+
+    def _receive(self, batches: queue.Queue, timeout: float):
+        # reads task batches until the broker stops the worker, goes away or stays silent for longer than timeout
+        last_seen = time.monotonic()
+        try:
+            while not self._stopped.is_set():
+                if not self._conn.poll(min(timeout, 1.0)):
+                    if time.monotonic() - last_seen > timeout:
+                        break
+                    continue
+                message = self._conn.recv()
+                last_seen = time.monotonic()
+                if message[0] == 'tasks':
+                    batches.put(message[1:])
+                elif message[0] == 'stop':
+                    break
+        except (EOFError, OSError):
+            pass
+        finally:
+            self._stopped.set()
+            batches.put(None)
+
+    def _heartbeat(self, interval: float):
+        while not self._stopped.wait(interval):
+            try:
+                self._send(('heartbeat',))
+            except (OSError, ValueError):
+                return
+
+    def run(self):
+
+        """Connects to the broker and evaluates tasks until stopped. Returns the number of tasks evaluated."""
+
+        self._conn = self._connect()
+        self._send(('hello', {'name': self.name}))
+        settings = self._conn.recv()[1]
+
+        batches = queue.Queue()
+        threading.Thread(target=self._receive, args=(batches, settings['heartbeat_timeout']), daemon=True).start()
+        threading.Thread(target=self._heartbeat, args=(settings['heartbeat_interval'],), daemon=True).start()
+
+        funcs = {}
+        n_evaluated = 0
+        try:
+            while True:
+                message = batches.get()
+                if message is None or self._stopped.is_set():
+                    break
+                batch, forgotten = message
+                for func_id in forgotten:
+                    funcs.pop(func_id, None)
+                results = []
+                for task_id, func_id, func, payload, timed in batch:
+                    if func is not None:
+                        funcs[func_id] = pickle.loads(func)
+                    results.append((task_id,) + _execute(funcs[func_id], payload, timed))
+                self._send(('results', results))
+                n_evaluated += len(batch)
+        except (OSError, ValueError):
+            pass
+        finally:
+            self._stopped.set()
+            self._conn.close()
+
+        return n_evaluated
+
+
+def _run_worker(address: tuple, authkey, connect_timeout: float):
+    Worker(address, authkey, connect_timeout=connect_timeout).run()
+
+
+def start_workers(address: tuple, n_processes: int, authkey=None, connect_timeout: float = 30.0):
+
+    """
+    Starts the given number of Worker processes on this machine, e.g. to run against a broker on localhost. Returns the
+    list of started multiprocessing.Process objects, which exit when the broker closes.
+    """
+
+    authkey = _authkey(authkey)
+    processes = [mp.Process(target=_run_worker, args=(tuple(address), authkey, connect_timeout), daemon=True)
+                 for _ in range(n_processes)]
+    for process in processes:
+        process.start()
+
+    return processes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs pyoptfoil evaluation workers for a distributed.Broker")
+    parser.add_argument('address', help='host:port of the broker')
+    parser.add_argument('--processes', type=int, default=1, help='number of worker processes')
+    parser.add_argument('--authkey', default=None, help='authentication key (default: $PYOPTFOIL_AUTHKEY)')
+    parser.add_argument('--connect-timeout', type=float, default=30.0,
+                        help='seconds for which to keep trying to reach the broker')
+    args = parser.parse_args()
+
+    host, port = args.address.rsplit(':', 1)
+    for process in start_workers((host, int(port)), args.processes, args.authkey, args.connect_timeout):
+        process.join()
+
+
+if __name__ == '__main__':
+    main()
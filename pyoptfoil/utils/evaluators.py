@@ -0,0 +1,174 @@
+import multiprocessing as mp
+from multiprocessing.util import Finalize
+from collections import deque
+import os
+import queue
+import shutil
+import sys
+import tempfile
+import threading
+from functools import partial
+from .timing import timings, _timed_call
+from .xfoil_tools import scratch_root
+
+
+class SerialEvaluator:
+    def __init__(self, verbose: bool = True):
+
+        """
+        Evaluates a batch of individuals one after another in the current process.
+
+        Parameters
+        ----------
+        verbose : bool
+            Writes the name of each individual to stdout as it is evaluated.
+        """
+
+        self.verbose = verbose
+        self._results = deque()
+
+    def evaluate(self, func, individuals: list):
+
+        """Returns the fitness of every individual in the given list, in order."""
+
+        fitnesses = []
+        for individual in individuals:
+            if self.verbose:
+                sys.stdout.write(individual.name + '\r')
+            with timings.stage('fitness'):
+                fitnesses.append(func(individual))
+
+        return fitnesses
+
+    def submit(self, func, individual, tag=None):
+
+        """Evaluates a single individual. The result is returned by next_result together with the given tag."""
+
+        self._results.append((tag, self.evaluate(func, [individual])[0]))
+
+    def next_result(self, timeout: float = None):
+
+        """Returns the (tag, fitness) pair of the next completed submission."""
+
+        return self._results.popleft()
+
+    def close(self):
+
+        """Releases any resources held by the evaluator."""
+
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _cleanup_worker(workdir: str, origin: str):
+    os.chdir(origin)
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _init_worker():
+    # every worker runs inside its own scratch directory so that the fixed xfoil.dat/xfoil.out file names used by the
+    # XFOIL tools never collide between concurrent evaluations
+    origin = tempfile.gettempdir()
+    workdir = tempfile.mkdtemp(prefix='pyoptfoil_', dir=scratch_root())
+    os.chdir(workdir)
+    Finalize(None, _cleanup_worker, args=(workdir, origin), exitpriority=0)
+
+
+class ParallelEvaluator:
+    def __init__(self, n_workers: int = None, chunksize: int = 1):
+
+        """
+        Evaluates a batch of individuals across a pool of worker processes. Each worker process is given its own
+        temporary working directory (in memory where possible, see xfoil_tools.scratch_root), which is removed when the
+        evaluator is closed.
+
+        The fitness function and individuals must be picklable (e.g. a module level function or a functools.partial of
+        one, rather than a lambda or closure). Results are returned in the order of the given individuals, so a run is
+        identical to one using SerialEvaluator.
+
+        Parameters
+        ----------
+        n_workers : int
+            Number of worker processes. Defaults to the number of CPUs.
+        chunksize : int
+            Number of individuals sent to a worker at a time.
+        """
+
+        self.n_workers = n_workers or os.cpu_count()
+        self.chunksize = chunksize
+        self._pool = None
+        self._results = queue.Queue()
+        self._lock = threading.Lock()
+
+    def _start(self):
+        # several threads may share the evaluator (see campaign), so the pool is created under a lock
+        with self._lock:
+            if self._pool is None:
+                self._pool = mp.Pool(self.n_workers, initializer=_init_worker)
+
+        return self._pool
+
+    def evaluate(self, func, individuals: list):
+
+        """Returns the fitness of every individual in the given list, in order."""
+
+        pool = self._start()
+
+        if not timings.enabled:
+            return pool.map(func, individuals, chunksize=self.chunksize)
+
+        # statistics recorded in the workers are sent back with each result and merged into this process' registry
+        fitnesses = []
+        for fitness, raw in pool.map(partial(_timed_call, func), individuals, chunksize=self.chunksize):
+            timings.merge(raw)
+            fitnesses.append(fitness)
+
+        return fitnesses
+
+    def submit(self, func, individual, tag=None):
+
+        """
+        Starts evaluating a single individual on the next free worker. The result is returned by next_result together
+        with the given tag, in order of completion.
+        """
+
+        pool = self._start()
+
+        timed = timings.enabled
+        pool.apply_async(partial(_timed_call, func) if timed else func, (individual,),
+                         callback=lambda result: self._results.put((tag, result, timed, None)),
+                         error_callback=lambda error: self._results.put((tag, None, timed, error)))
+
+    def next_result(self, timeout: float = None):
+
+        """Waits for the next submission to complete and returns its (tag, fitness) pair."""
+
+        tag, result, timed, error = self._results.get(timeout=timeout)
+        if error is not None:
+            raise error
+
+        if timed:
+            result, raw = result
+            timings.merge(raw)
+
+        return tag, result
+
+    def close(self):
+
+        """Shuts down the worker pool and removes the worker directories."""
+
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
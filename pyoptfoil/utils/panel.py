@@ -0,0 +1,357 @@
+import numpy as np
+from collections import deque
+from .timing import timings
+
+DEFAULT_PANELS = 120
+
+
+def contour(aerofoils: list, n_panels: int = DEFAULT_PANELS):
+
+    """
+    Builds panel node coordinates for a batch of aerofoils. Each surface is resampled along its arc length with
+    cosine spacing, clustering nodes at the leading and trailing edges. Nodes run from the lower surface trailing edge
+    round the leading edge to the upper surface trailing edge (the same order as write_dat).
+
+    Parameters
+    ----------
+    aerofoils : list
+        Aerofoil objects without constraint violations.
+    n_panels : int
+        Number of panels (even).
+
+    Returns
+    -------
+    Numpy arrays of node x and y coordinates, both of shape (len(aerofoils), n_panels + 1).
+    """
+
+    n = n_panels // 2
+    s_new = (1 - np.cos(np.linspace(0, np.pi, n + 1))) / 2
+
+    x = np.empty((len(aerofoils), 2 * n + 1))
+    y = np.empty((len(aerofoils), 2 * n + 1))
+    for k, aerofoil in enumerate(aerofoils):
+        surfaces = []
+        for xs, ys in ((aerofoil.x_l, aerofoil.y_l), (aerofoil.x_u, aerofoil.y_u)):
+            s = np.concatenate(([0], np.cumsum(np.hypot(np.diff(xs), np.diff(ys)))))
+            surfaces.append((np.interp(s_new * s[-1], s, xs), np.interp(s_new * s[-1], s, ys)))
+        (x_l, y_l), (x_u, y_u) = surfaces
+        x[k] = np.concatenate((np.flip(x_l), x_u[1:]))
+        y[k] = np.concatenate((np.flip(y_l), y_u[1:]))
+
+    return x, y
+
+
+def _influence(x: np.ndarray, y: np.ndarray):
+    # linear-strength vortex panel coefficients (Kuethe & Chow), for every geometry of the batch at once. Returns the
+    # normal and tangential influence matrices of the node vortex strengths on the panel midpoints, and the panel
+    # angles
+    dx = np.diff(x, axis=1)
+    dy = np.diff(y, axis=1)
+    theta = np.arctan2(dy, dx)
+    length = np.hypot(dx, dy)
+    xm = x[:, :-1] + dx / 2
+    ym = y[:, :-1] + dy / 2
+
+    # [geometry, control point i, panel j]
+    rx = xm[:, :, None] - x[:, None, :-1]
+    ry = ym[:, :, None] - y[:, None, :-1]
+    ti = theta[:, :, None]
+    tj = theta[:, None, :]
+    s = length[:, None, :]
+
+    a = -rx * np.cos(tj) - ry * np.sin(tj)
+    b = rx ** 2 + ry ** 2
+    c = np.sin(ti - tj)
+    d = np.cos(ti - tj)
+    e = rx * np.sin(tj) - ry * np.cos(tj)
+    f = np.log1p(s * (s + 2 * a) / b)
+    g = np.arctan2(e * s, b + a * s)
+    p = rx * np.sin(ti - 2 * tj) + ry * np.cos(ti - 2 * tj)
+    q = rx * np.cos(ti - 2 * tj) - ry * np.sin(ti - 2 * tj)
+
+    cn2 = d + (0.5 * q * f - (a * c + d * e) * g) / s
+    cn1 = 0.5 * d * f + c * g - cn2
+    ct2 = c + (0.5 * p * f + (a * d - c * e) * g) / s
+    ct1 = 0.5 * c * f - d * g - ct2
+
+    # self-induced coefficients
+    diag = np.arange(x.shape[1] - 1)
+    cn1[:, diag, diag] = -1
+    cn2[:, diag, diag] = 1
+    ct1[:, diag, diag] = np.pi / 2
+    ct2[:, diag, diag] = np.pi / 2
+
+    # node j collects the end of panel j - 1 and the start of panel j
+    n_nodes = x.shape[1]
+    an = np.zeros((len(x), n_nodes, n_nodes))
+    at = np.zeros((len(x), n_nodes - 1, n_nodes))
+    an[:, :-1, :-1] = cn1
+    an[:, :-1, 1:] += cn2
+    at[:, :, :-1] = ct1
+    at[:, :, 1:] += ct2
+
+    # Kutta condition
+    an[:, -1, 0] = 1
+    an[:, -1, -1] = 1
+
+    return an, at, theta
+
+
+class InviscidSolution:
+    def __init__(self, x: np.ndarray, y: np.ndarray):
+
+        """
+        Inviscid, incompressible linear-vorticity panel solution for a batch of aerofoils of unit chord. The vortex
+        strengths for zero and 90 degree incidence are solved once with batched linear solves, so the solution at any
+        incidence is their superposition.
+
+        Parameters
+        ----------
+        x : numpy array
+            Node x coordinates (see contour), shape (n_aerofoils, n_panels + 1).
+        y : numpy array
+            Node y coordinates.
+        """
+
+        self.x = x
+        self.y = y
+        self.xm = (x[:, 1:] + x[:, :-1]) / 2
+        self.length = np.hypot(np.diff(x, axis=1), np.diff(y, axis=1))
+
+        with timings.stage('panel_solve'):
+            an, at, theta = _influence(x, y)
+
+            rhs = np.zeros((len(x), x.shape[1], 2))
+            rhs[:, :-1, 0] = np.sin(theta)
+            rhs[:, :-1, 1] = -np.cos(theta)
+
+            # [geometry, node, basis incidence (0 and 90 degrees)]
+            self.gamma = np.linalg.solve(an, rhs)
+            self.velocity = at @ self.gamma
+            self.velocity[:, :, 0] += np.cos(theta)
+            self.velocity[:, :, 1] += np.sin(theta)
+
+        # lift coefficient of each basis solution from the total circulation (strengths are scaled by 2 pi V)
+        self._cl = 2 * np.pi * np.sum((self.gamma[:, 1:] + self.gamma[:, :-1]) * self.length[:, :, None],
+                                     axis=1)
+
+    def cl(self, alphas):
+
+        """Returns the lift coefficient of every aerofoil at the given incidences (degrees), shape (n_aerofoils, n)."""
+
+        a = np.radians(np.atleast_1d(alphas))
+
+        return np.outer(self._cl[:, 0], np.cos(a)) + np.outer(self._cl[:, 1], np.sin(a))
+
+    def cp(self, alphas):
+
+        """
+        Returns the pressure coefficient at the panel midpoints (xm) of every aerofoil at the given incidences
+        (degrees), shape (n_aerofoils, n, n_panels).
+        """
+
+        a = np.radians(np.atleast_1d(alphas))
+        v = self.velocity[:, None, :, 0] * np.cos(a)[:, None] + self.velocity[:, None, :, 1] * np.sin(a)[:, None]
+
+        return 1 - v ** 2
+
+    def cl_alpha(self):
+
+        """Returns the lift curve slope (per degree) and zero-lift incidence (degrees) of every aerofoil."""
+
+        alpha_0 = np.degrees(np.arctan2(-self._cl[:, 0], self._cl[:, 1]))
+
+        return np.radians(np.hypot(self._cl[:, 0], self._cl[:, 1])), alpha_0
+
+    def alpha(self, cl: float):
+
+        """Returns the incidence (degrees) at which each aerofoil reaches the given lift coefficient."""
+
+        amplitude = np.hypot(self._cl[:, 0], self._cl[:, 1])
+        phase = np.arctan2(self._cl[:, 1], self._cl[:, 0])
+
+        return np.degrees(phase - np.arccos(np.clip(cl / amplitude, -1, 1)))
+
+    def design_point(self, cl: float):
+
+        """
+        Returns the incidence (degrees) at which each aerofoil reaches the given lift coefficient and the minimum
+        pressure coefficient at that incidence.
+        """
+
+        alpha = self.alpha(cl)
+
+        return alpha, 1 - (self._speed(alpha) ** 2).max(axis=1)
+
+    def drag(self, alpha: np.ndarray, re: float):
+
+        """
+        Returns a rough profile drag estimate for every aerofoil at its own incidence alpha (degrees), from the
+        dissipation integral Cd = Cf * integral((V / V_inf) ** 3 ds) over both surfaces with turbulent flat plate skin
+        friction Cf = 0.074 Re ** -0.2. Compressibility and transition are ignored, so this is a stand-in for XFOIL
+        (e.g. for testing a run end to end) rather than a substitute.
+        """
+
+        return 0.074 * re ** -0.2 * np.sum(np.abs(self._speed(alpha)) ** 3 * self.length, axis=1)
+
+    def _speed(self, alpha):
+        # surface speed at the panel midpoints of every aerofoil at its own incidence
+        a = np.radians(alpha)[:, None]
+        return self.velocity[:, :, 0] * np.cos(a) + self.velocity[:, :, 1] * np.sin(a)
+
+
+def solve(aerofoils: list, n_panels: int = DEFAULT_PANELS, chunksize: int = 64):
+
+    """
+    Runs the panel solver for a batch of aerofoils.
+
+    Parameters
+    ----------
+    aerofoils : list
+        Aerofoil objects without constraint violations.
+    n_panels : int
+        Number of panels.
+    chunksize : int
+        Number of aerofoils solved together, which bounds the memory used by the influence matrices.
+
+    Returns
+    -------
+    List of InviscidSolution objects, one per chunk of aerofoils.
+    """
+
+    return [InviscidSolution(*contour(aerofoils[i:i + chunksize], n_panels))
+            for i in range(0, len(aerofoils), chunksize)]
+
+
+def design_point(aerofoils: list, cl_des: float, n_panels: int = DEFAULT_PANELS):
+
+    """
+    Returns the inviscid incidence (degrees) at which each aerofoil reaches cl_des and the minimum pressure coefficient
+    at that incidence. Both are nan for aerofoils with constraint violations.
+    """
+
+    alpha = np.full(len(aerofoils), np.nan)
+    cp_min = np.full(len(aerofoils), np.nan)
+
+    valid = [i for i, aerofoil in enumerate(aerofoils) if not aerofoil.parameterization.constraint_violation]
+    if valid:
+        points = [solution.design_point(cl_des) for solution in solve([aerofoils[i] for i in valid], n_panels)]
+        alpha[valid] = np.concatenate([a for a, _ in points])
+        cp_min[valid] = np.concatenate([c for _, c in points])
+
+    return alpha, cp_min
+
+
+class PanelFilterEvaluator:
+    def __init__(self, evaluator, cl_des: float, alpha_range: tuple, alpha_margin: float = 2.0, cp_min: float = None,
+                 fitness: float = -1e8, n_panels: int = DEFAULT_PANELS):
+
+        """
+        Evaluator which screens every batch of individuals with the inviscid panel solver and only passes shapes that
+        can plausibly reach cl_des on to the wrapped evaluator. Rejected individuals are given a fixed fitness without
+        being evaluated.
+
+        An individual is rejected if its inviscid design incidence lies more than alpha_margin outside alpha_range
+        (viscous effects increase the incidence needed for a given lift, so the margin is applied on both sides), or if
+        cp_min is given and its inviscid suction peak at that incidence is stronger than cp_min.
+
+        Parameters
+        ----------
+        evaluator : SerialEvaluator, ParallelEvaluator or CachedEvaluator
+            Evaluator used for the individuals that pass.
+        cl_des : float
+            Desired lift coefficient.
+        alpha_range : tuple
+            Incidence range (alpha_start, alpha_stop, alpha_increment).
+        alpha_margin : float
+            Incidence margin (degrees) around alpha_range.
+        cp_min : float
+            Most negative pressure coefficient allowed at the design point. Not checked if None.
+        fitness : float
+            Fitness given to rejected individuals. Defaults to the cl_des_out_of_range sentinel of the drag objective.
+        n_panels : int
+            Number of panels.
+        """
+
+        self.evaluator = evaluator
+        self.cl_des = cl_des
+        self.alpha_range = alpha_range
+        self.alpha_margin = alpha_margin
+        self.cp_min = cp_min
+        self.fitness = fitness
+        self.n_panels = n_panels
+
+        self.n_screened = 0
+        self.n_rejected = 0
+        self._ready = deque()
+
+    def accept(self, individuals: list):
+
+        """Returns a boolean mask of the individuals that pass the inviscid screen."""
+
+        alpha, cp_min = design_point(individuals, self.cl_des, self.n_panels)
+
+        # constraint violations are passed on, so they are reported by the wrapped fitness function
+        with np.errstate(invalid='ignore'):
+            accepted = ((alpha >= self.alpha_range[0] - self.alpha_margin) &
+                        (alpha <= self.alpha_range[1] + self.alpha_margin))
+            if self.cp_min is not None:
+                accepted &= cp_min >= self.cp_min
+        accepted |= np.isnan(alpha)
+
+        self.n_screened += len(individuals)
+        self.n_rejected += int((~accepted).sum())
+        timings.event('panel_rejected', int((~accepted).sum()))
+
+        return accepted
+
+    def evaluate(self, func, individuals: list):
+
+        """Returns the fitness of every individual in the given list, in order."""
+
+        accepted = self.accept(individuals)
+
+        fitnesses = [self.fitness] * len(individuals)
+        if accepted.any():
+            results = self.evaluator.evaluate(func, [ind for ind, a in zip(individuals, accepted) if a])
+            for i, fitness in zip(np.flatnonzero(accepted), results):
+                fitnesses[i] = fitness
+
+        return fitnesses
+
+    def submit(self, func, individual, tag=None):
+
+        """Starts evaluating a single individual unless it is rejected. The result is returned by next_result."""
+
+        if self.accept([individual])[0]:
+            self.evaluator.submit(func, individual, tag)
+        else:
+            self._ready.append((tag, self.fitness))
+
+    def next_result(self, timeout: float = None):
+
+        """Returns the (tag, fitness) pair of the next completed submission, rejected individuals first."""
+
+        if self._ready:
+            return self._ready.popleft()
+
+        return self.evaluator.next_result(timeout)
+
+    def stats(self):
+
+        """Returns the number of screened and rejected individuals."""
+
+        return {'n_screened': self.n_screened, 'n_rejected': self.n_rejected,
+                'rejection_rate': self.n_rejected / self.n_screened if self.n_screened else 0.0}
+
+    def close(self):
+
+        """Closes the wrapped evaluator."""
+
+        self.evaluator.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
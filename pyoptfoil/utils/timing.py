@@ -0,0 +1,173 @@
+import csv
+import json
+import time
+
+
+class _Stage:
+    __slots__ = ('registry', 'name', 'start')
+
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.registry.record(self.name, time.perf_counter() - self.start, exc_type is not None)
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class Timings:
+    def __init__(self):
+
+        """
+        Registry of per-stage durations, counts and failure events of the evaluation pipeline. Recording is disabled by
+        default, in which case stage() returns a shared no-op context manager and event() returns immediately.
+
+        Stage statistics are kept both as run totals and for the current window, which is closed by lap() (DE.optimize
+        closes one window per generation when recording is enabled).
+        """
+
+        self.enabled = False
+        self.laps = []
+        self._totals = ({}, {})
+        self._window = ({}, {})
+
+    def stage(self, name: str):
+
+        """Returns a context manager which records the duration of the enclosed block under the given stage name."""
+
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def record(self, name: str, duration: float, failed: bool = False):
+
+        """Records one execution of a stage."""
+
+        for stages, _ in (self._totals, self._window):
+            stat = stages.get(name)
+            if stat is None:
+                stat = stages[name] = [0, 0.0, 0.0, 0]
+            stat[0] += 1
+            stat[1] += duration
+            stat[2] = max(stat[2], duration)
+            stat[3] += failed
+
+    def event(self, name: str, count: int = 1):
+
+        """Counts an event, e.g. a failure category of the fitness function."""
+
+        if not self.enabled:
+            return
+        for _, events in (self._totals, self._window):
+            events[name] = events.get(name, 0) + count
+
+    def raw(self):
+
+        """Returns the raw window statistics, for merging into the registry of another process."""
+
+        return self._window
+
+    def merge(self, raw: tuple):
+
+        """Adds raw statistics from the registry of another process (e.g. a worker process)."""
+
+        stages, events = raw
+        for name, (count, total, longest, failed) in stages.items():
+            for own_stages, _ in (self._totals, self._window):
+                stat = own_stages.get(name)
+                if stat is None:
+                    stat = own_stages[name] = [0, 0.0, 0.0, 0]
+                stat[0] += count
+                stat[1] += total
+                stat[2] = max(stat[2], longest)
+                stat[3] += failed
+        for name, count in events.items():
+            for _, own_events in (self._totals, self._window):
+                own_events[name] = own_events.get(name, 0) + count
+
+    @staticmethod
+    def _summary(stages: dict, events: dict):
+        return {'stages': {name: {'count': count, 'total': total, 'mean': total / count, 'max': longest,
+                                  'failed': failed}
+                           for name, (count, total, longest, failed) in stages.items()},
+                'events': dict(events)}
+
+    def summary(self):
+
+        """Returns the run totals as a dict with 'stages' and 'events' entries."""
+
+        return self._summary(*self._totals)
+
+    def lap(self, **info):
+
+        """Closes the current window, appends its summary (together with the given info) to laps and returns it."""
+
+        lap = {**info, **self._summary(*self._window)}
+        self.laps.append(lap)
+        self._window = ({}, {})
+
+        return lap
+
+    def reset(self):
+
+        """Clears all recorded statistics."""
+
+        self.laps = []
+        self._totals = ({}, {})
+        self._window = ({}, {})
+
+    def to_json(self, path: str):
+
+        """Writes the run totals and the per-lap summaries to a JSON file."""
+
+        with open(path, 'w') as f:
+            json.dump({'totals': self.summary(), 'laps': self.laps}, f, indent=2)
+
+    def to_csv(self, path: str):
+
+        """Writes the run totals and the per-lap summaries to a CSV file with one row per stage or event."""
+
+        rows = [('total', self.summary())] + [(lap.get('generation', i), lap) for i, lap in enumerate(self.laps)]
+
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['lap', 'kind', 'name', 'count', 'total', 'mean', 'max', 'failed'])
+            for lap, summary in rows:
+                for name, stat in summary['stages'].items():
+                    writer.writerow([lap, 'stage', name, stat['count'], stat['total'], stat['mean'], stat['max'],
+                                     stat['failed']])
+                for name, count in summary['events'].items():
+                    writer.writerow([lap, 'event', name, count, '', '', '', ''])
+
+
+timings = Timings()
+
+
+def _timed_call(func, individual):
+    # runs in a worker process; returns the fitness together with the statistics recorded while computing it. Timing is
+    # switched back off afterwards, so later untimed runs in a long-lived worker record nothing
+    enabled = timings.enabled
+    timings.enabled = True
+    timings.reset()
+    try:
+        with timings.stage('fitness'):
+            fitness = func(individual)
+        return fitness, timings.raw()
+    finally:
+        timings.enabled = enabled
@@ -1,9 +1,17 @@
 import subprocess as sp
+from multiprocessing.util import Finalize
 import numpy as np
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
 from ..aerofoil import Aerofoil
+from .timing import timings
 
 
-def write_dat(aerofoil: Aerofoil):
+def write_dat(aerofoil: Aerofoil, datfile_path: str = 'xfoil.dat'):
 
     """
     Creates XFOIL labeled coordinate file for given aerofoil.
@@ -11,19 +19,38 @@ def write_dat(aerofoil: Aerofoil):
     ----------
     aerofoil : Aerofoil
         Aerofoil object for which to generate coordinate file
+    datfile_path : str
+        Path of the coordinate file.
     """
 
-    x = np.concatenate((np.flip(aerofoil.x_l), aerofoil.x_u[1:]))
-    y = np.concatenate((np.flip(aerofoil.y_l), aerofoil.y_u[1:]))
+    n = len(aerofoil.x_l) + len(aerofoil.x_u) - 1
+    xy = np.empty(2 * n)
+    xy[:n] = np.concatenate((np.flip(aerofoil.x_l), aerofoil.x_u[1:]))
+    xy[n:] = np.concatenate((np.flip(aerofoil.y_l), aerofoil.y_u[1:]))
+
+    # one formatting call for all points; %r of a Python float gives the same shortest representation as str()
+    text = aerofoil.name + '\n' + ('%r %r\n' * n) % tuple(xy.reshape(2, n).T.ravel().tolist())
+
+    with open(datfile_path, 'w') as f:
+        f.write(text)
+
 
-    lines = ['{0} {1}\n'.format(x[i], y[i]) for i in range(len(x))]
+def _solution_inputs(alfas: tuple, target: tuple = None):
+    # operating point commands: an incidence sweep, or a warm-start incidence followed by a prescribed-Cl solve
+    if target is None:
+        return ['aseq', str(alfas[0]), str(alfas[1]), str(alfas[2])]
+    return ['alfa', str(target[0]), 'cl', str(target[1])]
 
-    with open('xfoil.dat', 'w') as f:
-        f.write(aerofoil.name + '\n')
-        f.writelines(lines)
 
+def _executable(xfoil_path: str, workdir: str = None):
+    # a relative path would otherwise be looked up from the working directory of XFOIL on some platforms
+    if workdir is None:
+        return xfoil_path
+    return os.path.abspath(shutil.which(xfoil_path) or xfoil_path)
 
-def run_xfoil(xfoil_path: str, datfile_path: str, alfas: tuple, re: float, m: float, itermax: int):
+
+def run_xfoil(xfoil_path: str, datfile_path: str, alfas: tuple, re: float, m: float, itermax: int,
+              n_panels: int = None, target: tuple = None, workdir: str = None):
 
     """
     Runs XFOIL. Commands turn off graphics, load coordinate file, set panelling, and run incidence sweep at requested
@@ -43,30 +70,444 @@ def run_xfoil(xfoil_path: str, datfile_path: str, alfas: tuple, re: float, m: fl
         Mach number
     itermax : int
         XFOIL viscous solution iteration limit.
+    n_panels : int
+        Number of panel nodes. XFOIL's default paneling is used if None.
+    target : tuple
+        (alpha_start, cl). Instead of the incidence sweep, a point is converged at alpha_start and the solution is then
+        driven to the prescribed lift coefficient cl.
+    workdir : str
+        Working directory of XFOIL, to which the coordinate file path is relative and in which the polar save file
+        xfoil.out is written. Defaults to the current directory. A relative xfoil_path is still taken relative to the
+        current directory.
     """
 
-    inputs = ['plop', 'g', '', 'load', datfile_path, 'pane', 'oper', 'v', str(re), 'm', str(m), 'pacc',
-              'xfoil.out', ' ', 'iter', str(itermax), 'aseq', str(alfas[0]), str(alfas[1]), str(alfas[2]), ' ', 'quit']
+    inputs = ['plop', 'g', '', 'load', datfile_path, 'pane']
+    if n_panels is not None:
+        inputs += ['ppar', 'n', str(n_panels), '', '']
+    inputs += ['oper', 'v', str(re), 'm', str(m), 'pacc', 'xfoil.out', ' ', 'iter', str(itermax)]
+    inputs += _solution_inputs(alfas, target) + [' ', 'quit']
 
-    xfoil_proc = sp.run(xfoil_path, input='\n'.join(inputs), capture_output=True, text=True, timeout=10)
+    xfoil_proc = sp.run(_executable(xfoil_path, workdir), input='\n'.join(inputs), capture_output=True, text=True,
+                        timeout=10, cwd=workdir)
 
     return xfoil_proc
 
 
-def read_out():
+def _sweep_inputs(sweeps: list, itermax: int, settings: tuple = None):
+    # one block per (alfas, re, m, polar_path) sweep: flow conditions, boundary layer reset and an incidence sweep saved
+    # to its own polar file. settings are the (re, m, itermax) already set in the process, None before viscous mode is
+    # switched on
+    inputs = []
+    for alfas, re, m, polar_path in sweeps:
+        if settings is None:
+            inputs += ['v', str(re), 'm', str(m), 'iter', str(itermax)]
+        elif settings != (re, m, itermax):
+            inputs += ['re', str(re), 'm', str(m), 'iter', str(itermax)]
+        inputs += ['init', 'pacc', polar_path, ' '] + _solution_inputs(alfas) + ['pacc']
+        settings = (re, m, itermax)
+
+    return inputs
+
+
+def run_xfoil_sweeps(xfoil_path: str, datfile_path: str, sweeps: list, itermax: int, n_panels: int = None,
+                     workdir: str = None):
 
     """
-    Reads XFOIL polar save file.
+    Runs incidence sweeps at several flow conditions in a single XFOIL process. The coordinate file is loaded and
+    panelled once, and each sweep is saved to its own polar file.
+
+    Parameters
+    ----------
+    xfoil_path : str
+        Path to the XFOIL executable file.
+    datfile_path : str
+        Path to the aerofoil coordinate file.
+    sweeps : list
+        (alfas, re, m, polar_path) of every sweep: incidence range (alpha_start, alpha_stop, alpha_increment), Reynolds
+        number, Mach number and path of the polar save file.
+    itermax : int
+        XFOIL viscous solution iteration limit.
+    n_panels : int
+        Number of panel nodes. XFOIL's default paneling is used if None.
+    workdir : str
+        Working directory of XFOIL, to which the coordinate and polar file paths are relative. Defaults to the current
+        directory. A relative xfoil_path is still taken relative to the current directory.
+    """
+
+    inputs = ['plop', 'g', '', 'load', datfile_path, 'pane']
+    if n_panels is not None:
+        inputs += ['ppar', 'n', str(n_panels), '', '']
+    inputs += ['oper'] + _sweep_inputs(sweeps, itermax) + [' ', 'quit']
+
+    xfoil_proc = sp.run(_executable(xfoil_path, workdir), input='\n'.join(inputs), capture_output=True, text=True,
+                        timeout=10 * len(sweeps), cwd=workdir)
+
+    return xfoil_proc
+
+
+# leading columns of XFOIL polar save files
+POLAR_COLUMNS = ('alpha', 'cl', 'cd', 'cdp', 'cm', 'top_xtr', 'bot_xtr')
+
+
+def _polar_table(text: str):
+    # column names from the header line above the dashed rule, and the numbers below it as one (n_points, n_columns)
+    # array; raises ValueError if there is no table or it is not rectangular
+    head, rule, body = text.partition('------')
+    if not rule:
+        raise ValueError("No polar table found")
+
+    names = head.rstrip().rsplit('\n', 1)[-1].split()
+    values = np.array(body.split('\n', 1)[1].split() if '\n' in body else [], dtype=float)
+    if not names or values.size % len(names):
+        raise ValueError("Malformed polar table")
+
+    return names, values.reshape(-1, len(names))
+
+
+def parse_polar(text: str):
+
+    """
+    Parses the text of an XFOIL polar save file.
 
     Returns
     -------
-    Numpy array containing angle of attack, lift coefficient and drag coefficient data.
+    Dict of the columns of the polar keyed by their lower case header names: 'alpha', 'cl', 'cd', 'cdp', 'cm',
+    'top_xtr' and 'bot_xtr' (plus any further columns written by the XFOIL version, e.g. 'top_itr' and 'bot_itr').
+    """
+
+    names, arr = _polar_table(text)
+
+    return {name.lower(): arr[:, i] for i, name in enumerate(names)}
+
+
+def read_out(polar_path: str = 'xfoil.out', remove: bool = False):
+
+    """
+    Reads XFOIL polar save file in a single read.
+
+    Parameters
+    ----------
+    polar_path : str
+        Path of the polar save file.
+    remove : bool
+        Deletes the file once it has been read.
+
+    Returns
+    -------
+    Numpy array with one row per converged point and the columns of the file: angle of attack, lift, drag, pressure
+    drag and moment coefficients, and upper and lower surface transition locations (see parse_polar for the names).
+    """
+
+    with open(polar_path, 'r') as f:
+        text = f.read()
+    if remove:
+        os.remove(polar_path)
+
+    return _polar_table(text)[1]
+
+
+def read_polar(polar_path: str, remove: bool = False):
+
+    """Reads a polar save file (see read_out), returning None if it is missing or cannot be read."""
+
+    try:
+        return read_out(polar_path, remove)
+    except (OSError, ValueError):
+        return None
+
+
+def _discard(path):
+    # deletes a file which may not exist
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def scratch_root():
+
+    """
+    Returns the directory in which scratch directories for XFOIL files are created: the in-memory /dev/shm where it
+    is available, so coordinate and polar files never touch the disk, otherwise None (the system temporary directory).
     """
 
-    with open('xfoil.out', 'r') as f:
-        lines = f.readlines()
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        return '/dev/shm'
+    return None
+
+
+_scratch_dirs = {}
+
+
+def scratch_dir():
+
+    """
+    Returns the scratch directory of the current process for one-shot XFOIL runs, creating it in scratch_root if
+    needed. It is removed when the process exits.
+    """
+
+    pid = os.getpid()
+    if pid not in _scratch_dirs:
+        workdir = tempfile.mkdtemp(prefix='pyoptfoil_', dir=scratch_root())
+        Finalize(None, shutil.rmtree, args=(workdir, True), exitpriority=10)
+        _scratch_dirs[pid] = workdir
+
+    return _scratch_dirs[pid]
+
+
+# number of panel nodes XFOIL uses unless told otherwise
+DEFAULT_PANELS = 160
+
+# unrecognised command sent after every request; XFOIL echoes it back in its error message once all preceding commands
+# have been processed, which marks the end of the request's output
+_SYNC_COMMAND = 'zzzz'
+
+
+def _pump(stream, lines: queue.Queue):
+    for line in iter(stream.readline, ''):
+        lines.put(line)
+    lines.put(None)
+
+
+class XfoilSession:
+    def __init__(self, xfoil_path: str, timeout: float = 10, workdir: str = None):
+
+        """
+        Long-lived XFOIL process driven over stdin/stdout pipes. Graphics are switched off once when the process is
+        started, after which every call to run loads a new coordinate file, reinitialises the boundary layers and runs
+        an incidence sweep. A watchdog kills the process if a request does not complete within the timeout or if XFOIL
+        exits unexpectedly, and a new process is started on the next request.
+
+        Parameters
+        ----------
+        xfoil_path : str
+            Path to the XFOIL executable file.
+        timeout : float
+            Time limit in seconds for a single request.
+        workdir : str
+            Directory for the coordinate and polar files. Defaults to a new temporary directory (in memory where
+            possible, see scratch_root) which is removed when the session is closed.
+        """
+
+        self.xfoil_path = xfoil_path
+        self.timeout = timeout
+        self._own_workdir = workdir is None
+        self.workdir = tempfile.mkdtemp(prefix='pyoptfoil_', dir=scratch_root()) if workdir is None else workdir
+
+        self.n_runs = 0
+        self.n_restarts = 0
+
+        self._proc = None
+        self._lines = None
+        self._settings = None
+        self._n_panels = DEFAULT_PANELS
+
+    def _spawn(self):
+        if self._proc is not None:
+            self.n_restarts += 1
+
+        with timings.stage('xfoil_spawn'):
+            # stops the gfortran runtime from block buffering XFOIL's output to the pipe
+            env = dict(os.environ, GFORTRAN_UNBUFFERED_PRECONNECTED='y')
+            self._proc = sp.Popen(self.xfoil_path, stdin=sp.PIPE, stdout=sp.PIPE, stderr=sp.STDOUT, text=True,
+                                  cwd=self.workdir, env=env)
+            self._lines = queue.Queue()
+            threading.Thread(target=_pump, args=(self._proc.stdout, self._lines), daemon=True).start()
+            self._settings = None
+            self._n_panels = DEFAULT_PANELS
+
+            self._request(['plop', 'g', ''])
+
+    def _start(self):
+        # starts a new process if none is running; called before the inputs of a request are built, as they depend on
+        # the settings held by the running process
+        try:
+            if self._proc is None or self._proc.poll() is not None:
+                self._spawn()
+        except (RuntimeError, TimeoutError):
+            self.kill()
+            raise
+
+    def _request(self, inputs: list):
+        try:
+            self._proc.stdin.write('\n'.join(inputs + [_SYNC_COMMAND]) + '\n')
+            self._proc.stdin.flush()
+        except OSError:
+            raise RuntimeError('XFOIL session terminated unexpectedly')
+
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                line = self._lines.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                raise TimeoutError('XFOIL session did not respond within {} s'.format(self.timeout))
+
+            if line is None:
+                raise RuntimeError('XFOIL session terminated unexpectedly')
+            if _SYNC_COMMAND.upper() in line.upper():
+                return
+
+    def run(self, aerofoil: Aerofoil, alfas: tuple, re: float, m: float, itermax: int, n_panels: int = None,
+            target: tuple = None):
+
+        """
+        Loads the coordinates of the given aerofoil, resets the boundary layers and runs an incidence sweep at the
+        requested conditions.
+
+        Parameters
+        ----------
+        aerofoil : Aerofoil
+            Aerofoil to analyse.
+        alfas : tuple
+            Incidence range (alpha_start, alpha_stop, alpha_increment).
+        re : float
+            Reynolds number.
+        m: float
+            Mach number
+        itermax : int
+            XFOIL viscous solution iteration limit.
+        n_panels : int
+            Number of panel nodes. XFOIL's default paneling is used if None.
+        target : tuple
+            (alpha_start, cl). Instead of the incidence sweep, a point is converged at alpha_start and the solution is
+            then driven to the prescribed lift coefficient cl.
+
+        Returns
+        -------
+        Polar of the run (see read_out).
+        """
+
+        # polar files are deleted as they are read (or when a request fails), so XFOIL never appends to an old one
+        polar_path = os.path.join(self.workdir, 'xfoil.out')
+        with timings.stage('write_dat'):
+            write_dat(aerofoil, os.path.join(self.workdir, 'xfoil.dat'))
+
+        self._start()
+
+        # the panel count persists in the process, so it is only sent when it changes
+        n_panels = DEFAULT_PANELS if n_panels is None else n_panels
+        inputs = ['load', 'xfoil.dat', 'pane']
+        if n_panels != self._n_panels:
+            inputs += ['ppar', 'n', str(n_panels), '', '']
+        inputs += ['oper']
+        if self._settings is None:
+            inputs += ['v', str(re), 'm', str(m), 'iter', str(itermax)]
+        elif self._settings != (re, m, itermax):
+            inputs += ['re', str(re), 'm', str(m), 'iter', str(itermax)]
+        inputs += ['init', 'pacc', 'xfoil.out', ' '] + _solution_inputs(alfas, target) + ['pacc', ' ']
+
+        try:
+            with timings.stage('xfoil_solve'):
+                self._request(inputs)
+        except (RuntimeError, TimeoutError):
+            self.kill()
+            _discard(polar_path)
+            raise
+
+        self._settings = (re, m, itermax)
+        self._n_panels = n_panels
+        self.n_runs += 1
+
+        with timings.stage('read_out'):
+            return read_out(polar_path, remove=True)
+
+    def run_sweeps(self, aerofoil: Aerofoil, sweeps: list, itermax: int, n_panels: int = None):
+
+        """
+        Loads the coordinates of the given aerofoil once and runs an incidence sweep at each of the given flow
+        conditions, resetting the boundary layers before each one and saving each sweep to its own polar file.
+
+        Parameters
+        ----------
+        aerofoil : Aerofoil
+            Aerofoil to analyse.
+        sweeps : list
+            (alfas, re, m) of every sweep: incidence range (alpha_start, alpha_stop, alpha_increment), Reynolds number
+            and Mach number.
+        itermax : int
+            XFOIL viscous solution iteration limit.
+        n_panels : int
+            Number of panel nodes. XFOIL's default paneling is used if None.
+
+        Returns
+        -------
+        List with the polar of every sweep (see read_out), or None for a polar which could not be read.
+        """
+
+        polar_paths = [os.path.join(self.workdir, 'xfoil_{}.out'.format(i)) for i in range(len(sweeps))]
+        with timings.stage('write_dat'):
+            write_dat(aerofoil, os.path.join(self.workdir, 'xfoil.dat'))
+
+        self._start()
+        n_panels = DEFAULT_PANELS if n_panels is None else n_panels
+        inputs = ['load', 'xfoil.dat', 'pane']
+        if n_panels != self._n_panels:
+            inputs += ['ppar', 'n', str(n_panels), '', '']
+        inputs += ['oper'] + _sweep_inputs([(alfas, re, m, os.path.basename(polar_path)) for (alfas, re, m), polar_path
+                                            in zip(sweeps, polar_paths)], itermax, self._settings) + [' ']
+
+        try:
+            with timings.stage('xfoil_solve'):
+                self._request(inputs)
+        except (RuntimeError, TimeoutError):
+            self.kill()
+            for polar_path in polar_paths:
+                _discard(polar_path)
+            raise
+
+        self._settings = (sweeps[-1][1], sweeps[-1][2], itermax)
+        self._n_panels = n_panels
+        self.n_runs += 1
+
+        with timings.stage('read_out'):
+            return [read_polar(polar_path, remove=True) for polar_path in polar_paths]
+
+    def kill(self):
+
+        """Kills the XFOIL process. A new process is started on the next request."""
+
+        if self._proc is not None and self._proc.poll() is None:
+            self._proc.kill()
+            self._proc.wait()
+
+    def close(self):
+
+        """Stops the XFOIL process and removes the session's temporary directory."""
+
+        if self._proc is not None and self._proc.poll() is None:
+            try:
+                self._proc.stdin.write('\nquit\n')
+                self._proc.stdin.flush()
+                self._proc.wait(timeout=1)
+            except (OSError, sp.TimeoutExpired):
+                self.kill()
+        self._proc = None
+
+        if self._own_workdir:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+_sessions = {}
+
+
+def shared_session(xfoil_path: str):
+
+    """
+    Returns the XfoilSession for the given executable belonging to the current process, starting one if needed. Each
+    worker process of a ParallelEvaluator therefore keeps its own XFOIL process alive between evaluations. Sessions are
+    closed when the process exits.
+    """
 
-    skiprows = [i for i in range(len(lines)) if '------' in lines[i]][0] + 1
-    arr = np.loadtxt('xfoil.out', skiprows=skiprows)
+    key = (os.getpid(), xfoil_path)
+    if key not in _sessions:
+        session = XfoilSession(xfoil_path)
+        Finalize(None, session.close, exitpriority=10)
+        _sessions[key] = session
 
-    return arr
+    return _sessions[key]
@@ -0,0 +1,19 @@
+import numpy as np
+
+from pyoptfoil.parameterizations.bezier_parsec import _interp_rows
+
+
+def test_interp_rows_matches_np_interp():
+    rng = np.random.default_rng(0)
+    xp = np.sort(rng.uniform(0.1, 0.9, (50, 40)), axis=1)
+    xp[:, 3] = xp[:, 4]
+    fp = rng.normal(size=xp.shape)
+
+    # queries beyond both ends of each row, on nodes and a rounding step either side of them
+    x = rng.uniform(0, 1, (50, 60))
+    x[:, :5] = xp[:, :5]
+    x[:, 5:10] = np.nextafter(xp[:, 5:10], 0)
+    x[:, 10:15] = np.nextafter(xp[:, 5:10], 1)
+
+    expected = np.array([np.interp(*row) for row in zip(x, xp, fp)])
+    np.testing.assert_array_equal(_interp_rows(x, xp, fp), expected)
@@ -0,0 +1,68 @@
+import numpy as np
+
+from pyoptfoil.utils.cache import FitnessCache, CachedEvaluator
+from pyoptfoil.utils.evaluators import SerialEvaluator
+
+
+class _Individual:
+    def __init__(self, x):
+        self.position = {'x': x}
+
+
+class _Flaky:
+    # fitness function which fails like a timed-out XFOIL run on its first call for each shape
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, individual):
+        x = individual.position['x']
+        self.calls.append(x)
+        if self.calls.count(x) == 1:
+            return -1e12
+        return -x
+
+
+def test_transient_failures_are_evaluated_again(tmp_path):
+    path = str(tmp_path / 'fitness.db')
+    func = _Flaky()
+    individuals = [_Individual(0.1), _Individual(0.2)]
+
+    cache = FitnessCache(path)
+    evaluator = CachedEvaluator(SerialEvaluator(verbose=False), cache, ('context',))
+    assert evaluator.evaluate(func, individuals) == [-1e12, -1e12]
+    assert evaluator.evaluate(func, individuals) == [-0.1, -0.2]
+    assert evaluator.evaluate(func, individuals) == [-0.1, -0.2]
+    assert func.calls == [0.1, 0.2, 0.1, 0.2]
+    cache.close()
+
+    # only the valid results reached the database
+    cache = FitnessCache(path)
+    evaluator = CachedEvaluator(SerialEvaluator(verbose=False), cache, ('context',))
+    assert evaluator.evaluate(func, individuals) == [-0.1, -0.2]
+    assert len(func.calls) == 4
+    cache.close()
+
+
+def test_deterministic_failures_are_cached():
+    cache = FitnessCache()
+    evaluator = CachedEvaluator(SerialEvaluator(verbose=False), cache, ('context',))
+    calls = []
+
+    def func(individual):
+        calls.append(individual)
+        return -np.inf if individual.position['x'] > 0.5 else -1e9
+
+    individuals = [_Individual(0.1), _Individual(0.9)]
+    assert evaluator.evaluate(func, individuals) == [-1e9, -np.inf]
+    assert evaluator.evaluate(func, individuals) == [-1e9, -np.inf]
+    assert len(calls) == 2
+
+
+def test_transient_failures_are_evaluated_again_async():
+    func = _Flaky()
+    evaluator = CachedEvaluator(SerialEvaluator(verbose=False), FitnessCache(), ('context',))
+
+    for expected in (-1e12, -0.3, -0.3):
+        evaluator.submit(func, _Individual(0.3), 'tag')
+        assert evaluator.next_result() == ('tag', expected)
+    assert func.calls == [0.3, 0.3]
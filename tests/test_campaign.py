@@ -0,0 +1,36 @@
+import pytest
+
+from benchmarks.run_benchmarks import BOUNDS, fake_xfoil_executable
+from pyoptfoil.campaign import run_campaign
+from pyoptfoil.utils.cache import FitnessCache
+
+CASES = [(0.4, 5e5, 0), (0.5, 5e5, 0)]
+
+
+@pytest.mark.parametrize('n_concurrent', [1, 2])
+def test_campaign_with_disk_cache(tmp_path, n_concurrent):
+    xfoil_path = fake_xfoil_executable(str(tmp_path))
+    path = str(tmp_path / 'fitness.db')
+
+    def campaign():
+        cache = FitnessCache(path)
+        try:
+            results = run_campaign(CASES, BOUNDS, 6, 2, (0, 4, 1), xfoil_path, seed=1, n_workers=n_concurrent,
+                                   n_concurrent=n_concurrent, opt_options={'cache': cache})
+            return [result['fitness'] for result in results], cache.stats()
+        finally:
+            cache.close()
+
+    fitnesses, stats = campaign()
+    assert stats['misses'] > 0
+
+    # a second campaign finds the evaluations of the first one on disk
+    repeated, stats = campaign()
+    assert repeated == fitnesses
+    assert stats['disk_hits'] > 0
+
+
+@pytest.mark.parametrize('option', ['checkpoint', 'surrogate'])
+def test_campaign_rejects_per_run_state(tmp_path, option):
+    with pytest.raises(ValueError):
+        run_campaign(CASES, BOUNDS, 6, 2, (0, 4, 1), opt_options={option: str(tmp_path / 'run.npz')})
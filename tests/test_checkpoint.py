@@ -0,0 +1,41 @@
+import contextlib
+import io
+
+import numpy as np
+import pytest
+
+from benchmarks.run_benchmarks import BOUNDS
+from pyoptfoil.algorithms.de import DE
+from pyoptfoil.utils.evaluators import SerialEvaluator
+
+_CENTRE = np.mean(list(BOUNDS.values()), axis=1)
+_SPAN = np.ptp(list(BOUNDS.values()), axis=1) + 1e-12
+
+
+def _fitness(individual):
+    x = np.array([individual.position[k] for k in BOUNDS])
+    return -float(np.sum(((x - _CENTRE) / _SPAN) ** 2))
+
+
+def _optimizer(n_generations, history_path):
+    return DE(BOUNDS, 10, n_generations, 'BP3333', 0.85, 0.9, seed=4, adaptation='shade', history_path=history_path)
+
+
+@pytest.mark.parametrize('memmap', [False, True])
+def test_resumed_run_matches_uninterrupted_run(tmp_path, memmap):
+    with contextlib.redirect_stdout(io.StringIO()):
+        uninterrupted = _optimizer(6, str(tmp_path / 'full') if memmap else None)
+        uninterrupted.optimize(_fitness, SerialEvaluator(verbose=False))
+
+        checkpoint = str(tmp_path / 'run.npz')
+        history_path = str(tmp_path / 'resumed') if memmap else None
+        _optimizer(3, history_path).optimize(_fitness, SerialEvaluator(verbose=False), checkpoint=checkpoint)
+        resumed = _optimizer(6, history_path)
+        resumed.resume(checkpoint, _fitness, SerialEvaluator(verbose=False))
+
+    assert resumed.fitnesses.tolist() == uninterrupted.fitnesses.tolist()
+    assert resumed.positions.tolist() == uninterrupted.positions.tolist()
+    assert resumed.best_fitness_history == uninterrupted.best_fitness_history
+    assert resumed.rng.bit_generator.state == uninterrupted.rng.bit_generator.state
+    for column in ('positions', 'fitnesses', 'generations', 'failures'):
+        np.testing.assert_array_equal(getattr(resumed.history, column), getattr(uninterrupted.history, column))
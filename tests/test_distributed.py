@@ -0,0 +1,60 @@
+import contextlib
+import io
+from functools import partial
+
+import pytest
+
+from benchmarks.run_benchmarks import BOUNDS, fake_xfoil_executable
+from pyoptfoil.algorithms.de import DE
+from pyoptfoil.opt import _drag_reward
+from pyoptfoil.utils.distributed import Broker, start_workers
+from pyoptfoil.utils.evaluators import SerialEvaluator
+
+
+def test_broker_survives_a_killed_worker(tmp_path, monkeypatch):
+    optimizer = DE(BOUNDS, 12, 1, 'BP3333', 0.85, 0.9, seed=1)
+    with contextlib.redirect_stdout(io.StringIO()):
+        optimizer.initialise_population()
+    individuals = optimizer.population
+
+    func = partial(_drag_reward, 0.6, 5e5, 0, (-1, 5, 0.5), fake_xfoil_executable(str(tmp_path)), 100)
+    expected = SerialEvaluator(verbose=False).evaluate(func, individuals)
+
+    # slow evaluations keep tasks in flight on every worker when one of them is killed
+    monkeypatch.setenv('FAKE_XFOIL_DELAY', '0.01')
+    broker = Broker('127.0.0.1', batch_size=1, heartbeat_interval=0.2, heartbeat_timeout=5)
+    processes = start_workers(broker.address, 3, broker.authkey)
+    try:
+        broker.wait_for_workers(3, timeout=30)
+        for tag, individual in enumerate(individuals):
+            broker.submit(func, individual, tag)
+
+        results = dict([broker.next_result(timeout=60)])
+        processes[0].kill()
+        processes[0].join()
+        while len(results) < len(individuals):
+            tag, fitness = broker.next_result(timeout=60)
+            results[tag] = fitness
+
+        assert [results[tag] for tag in range(len(individuals))] == expected
+        assert broker.stats()['n_requeued'] > 0
+        assert broker.evaluate(func, individuals) == expected
+        # functions are forgotten once no task uses them
+        assert not broker._funcs
+    finally:
+        broker.close()
+        for process in processes:
+            process.join(10)
+
+
+def test_broker_gives_up_without_workers(tmp_path):
+    func = partial(_drag_reward, 0.6, 5e5, 0, (-1, 5, 0.5), fake_xfoil_executable(str(tmp_path)), 100)
+    broker = Broker('127.0.0.1', heartbeat_interval=0.1, worker_timeout=0.5)
+    try:
+        with pytest.raises(TimeoutError):
+            broker.evaluate(func, [[0.1] * len(BOUNDS)] * 3)
+
+        assert broker.stats()['n_pending'] == 0
+        assert not broker._funcs
+    finally:
+        broker.close()
@@ -0,0 +1,27 @@
+import contextlib
+import io
+
+import pytest
+
+from benchmarks.run_benchmarks import BOUNDS, fake_xfoil_executable
+from pyoptfoil.algorithms.de import DE
+from pyoptfoil.opt import opt
+
+
+def _run(xfoil_path, **kwargs):
+    optimizer = DE(BOUNDS, 10, 3, 'BP3333', 0.85, 0.9, seed=1)
+    with contextlib.redirect_stdout(io.StringIO()):
+        opt(optimizer, 0.6, 5e5, 0, (-1, 5, 0.5), xfoil_path, **kwargs)
+
+    return optimizer
+
+
+@pytest.mark.parametrize('persistent', [False, True])
+def test_parallel_matches_serial(tmp_path, persistent):
+    xfoil_path = fake_xfoil_executable(str(tmp_path))
+    serial = _run(xfoil_path)
+    parallel = _run(xfoil_path, n_workers=2, persistent=persistent)
+
+    assert parallel.best_fitness_history == serial.best_fitness_history
+    assert parallel.fitnesses.tolist() == serial.fitnesses.tolist()
+    assert parallel.positions.tolist() == serial.positions.tolist()
@@ -0,0 +1,29 @@
+import os
+
+import numpy as np
+
+from pyoptfoil.algorithms.history import History
+
+NAMES = ['a', 'b']
+
+
+def test_memmap_history_grows_past_capacity(tmp_path):
+    path = str(tmp_path / 'history')
+    history = History(NAMES, 'BP3333', capacity=4, path=path)
+    rng = np.random.default_rng(0)
+    positions = rng.random((11, 2))
+    fitnesses = np.append(-rng.random(10), -np.inf)
+
+    for start, stop, generation in ((0, 3, 0), (3, 7, 1), (7, 11, 2)):
+        rows = history.append(positions[start:stop], fitnesses[start:stop], generation)
+        assert rows.tolist() == list(range(start, stop))
+    history.flush()
+
+    assert sorted(os.listdir(path)) == ['failures.npy', 'fitnesses.npy', 'generations.npy', 'history.json',
+                                        'positions.npy']
+    for record in (history, History.open(path)):
+        np.testing.assert_array_equal(record.positions, positions)
+        np.testing.assert_array_equal(record.fitnesses, fitnesses)
+        assert record.generations.tolist() == [0] * 3 + [1] * 4 + [2] * 4
+        assert record.failures.tolist() == [0] * 10 + [1]
+    assert history.individual(5).fitness == fitnesses[5]
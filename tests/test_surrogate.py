@@ -0,0 +1,35 @@
+import contextlib
+import io
+
+import numpy as np
+
+from benchmarks.run_benchmarks import BOUNDS
+from pyoptfoil.algorithms.de import DE
+from pyoptfoil.algorithms.multifidelity import MultiFidelity
+from pyoptfoil.algorithms.surrogate import RBFSurrogate
+from pyoptfoil.utils.evaluators import SerialEvaluator
+
+_CENTRE = np.mean(list(BOUNDS.values()), axis=1)
+_SPAN = np.ptp(list(BOUNDS.values()), axis=1) + 1e-12
+
+
+def _fitness(individual):
+    x = np.array([individual.position[k] for k in BOUNDS])
+    return -float(np.sum(((x - _CENTRE) / _SPAN) ** 2))
+
+
+def test_surrogate_records_predictions_with_fidelity_screening():
+    optimizer = DE(BOUNDS, 20, 8, 'BP3333', 0.85, 0.9, seed=3)
+    surrogate = RBFSurrogate(optimizer.lb, optimizer.ub, fraction=0.5, exploration=0.2, min_archive=30)
+    # promotes only part of the trials the surrogate selects
+    fidelity = MultiFidelity(_fitness, rule=lambda trial_low, target_low, target_high: trial_low > target_low)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        optimizer.optimize(_fitness, SerialEvaluator(verbose=False), surrogate=surrogate, fidelity=fidelity)
+
+    state = surrogate.state()
+    assert surrogate.n_screened > 0
+    assert 0 < len(state['predicted']) == len(state['actual'])
+    assert np.isfinite(surrogate.stats()['rank_correlation'])
+    # every recorded result is an evaluation of the run
+    assert np.isin(state['actual'], optimizer.history.fitnesses).all()
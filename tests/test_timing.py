@@ -0,0 +1,28 @@
+import pytest
+
+from pyoptfoil.utils.timing import timings, _timed_call
+
+
+def _fitness(individual):
+    with timings.stage('xfoil'):
+        return individual
+
+
+def _failing(individual):
+    raise RuntimeError(individual)
+
+
+def test_timed_call_restores_enabled():
+    timings.enabled = False
+    try:
+        fitness, (stages, _) = _timed_call(_fitness, -0.01)
+        assert fitness == -0.01
+        assert set(stages) == {'fitness', 'xfoil'}
+        assert not timings.enabled
+
+        with pytest.raises(RuntimeError):
+            _timed_call(_failing, 'failed')
+        assert not timings.enabled
+    finally:
+        timings.enabled = False
+        timings.reset()
@@ -0,0 +1,33 @@
+import contextlib
+import io
+
+import pytest
+
+from benchmarks.run_benchmarks import BOUNDS, fake_xfoil_executable
+from pyoptfoil.algorithms.de import DE
+from pyoptfoil.utils.xfoil_tools import XfoilSession
+
+
+def test_session_restarts_after_hang(tmp_path, monkeypatch):
+    optimizer = DE(BOUNDS, 2, 1, 'BP3333', 0.85, 0.9, seed=1)
+    with contextlib.redirect_stdout(io.StringIO()):
+        optimizer.initialise_population()
+    aerofoil = optimizer.population[0]
+
+    session = XfoilSession(fake_xfoil_executable(str(tmp_path)), timeout=2)
+    try:
+        expected = session.run(aerofoil, (0, 2, 1), 5e5, 0, 100)
+
+        # a process started while every point takes far longer than the timeout hangs; the watchdog kills it
+        session.kill()
+        monkeypatch.setenv('FAKE_XFOIL_DELAY', '30')
+        with pytest.raises(TimeoutError):
+            session.run(aerofoil, (0, 2, 1), 5e5, 0, 100)
+
+        # the next request starts a new process and succeeds
+        monkeypatch.delenv('FAKE_XFOIL_DELAY')
+        polar = session.run(aerofoil, (0, 2, 1), 5e5, 0, 100)
+        assert polar.tolist() == expected.tolist()
+        assert session.n_restarts == 2
+    finally:
+        session.close()